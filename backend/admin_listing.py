@@ -0,0 +1,121 @@
+import io
+import csv
+import json
+import base64
+import binascii
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Characters buffered before an export chunk is handed to the server
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor for the row after last_id in a keyset-paginated listing."""
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Row id from a cursor produced by encode_cursor; None for the first page."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))['id']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+def parse_fields(value: Optional[str], allowed: Sequence[str], default: Sequence[str]) -> List[str]:
+    """Validate a comma separated ?fields= projection against the allowed columns."""
+    if not value:
+        return list(default)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+def parse_limit(value: Optional[str], default: int, maximum: int) -> int:
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit '{value}'")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+def parse_bool(value: Optional[str]) -> Optional[bool]:
+    if value is None or value == '':
+        return None
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Invalid boolean '{value}'")
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp; timezone-aware values are converted to naive UTC."""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp '{value}'")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def row_to_dict(row: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    return {name: _json_value(getattr(row, name)) for name in fields}
+
+def _chunked(lines: Iterable[str]) -> Iterator[str]:
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def _ndjson_lines(rows: Iterable[Any], fields: Sequence[str]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row_to_dict(row, fields)) + '\n'
+
+def _csv_lines(rows: Iterable[Any], fields: Sequence[str]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(row_to_dict(row, fields)[name] for name in fields)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+def export_rows(rows: Iterable[Any], fields: Sequence[str], export_format: str) -> Iterator[str]:
+    """
+    Serialize rows one at a time as NDJSON or CSV, yielding chunks of about
+    EXPORT_CHUNK_SIZE characters so memory stays flat however many rows the
+    (server-side) cursor produces.
+    """
+    if export_format == 'csv':
+        return _chunked(_csv_lines(rows, fields))
+    return _chunked(_ndjson_lines(rows, fields))
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+import time
+import logging
+from typing import Dict, Hashable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    version: int
+    expires_at: float
+
+class AnalyticsCache:
+    """
+    Short-TTL cache of serialized analytics responses.
+    Entries are tied to a write version, so committing new login attempts
+    invalidates every cached snapshot immediately instead of waiting for the TTL.
+    """
+
+    def __init__(self, ttl: float = 15.0):
+        self.ttl = ttl
+        self.version = 0
+        self._entries: Dict[Hashable, CachedResponse] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Return the live entry for key, counting a hit or a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.version == self.version and entry.expires_at > now:
+                self.hits += 1
+                return entry
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, body: bytes, version: int) -> CachedResponse:
+        """
+        Store a serialized body computed at the given version.
+        Bodies computed before a concurrent invalidation are returned but not cached.
+        """
+        entry = CachedResponse(
+            body=body,
+            etag=hashlib.sha1(body).hexdigest(),
+            version=version,
+            expires_at=time.monotonic() + self.ttl
+        )
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = entry
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate(self):
+        """Drop all snapshots; called after login attempts are committed."""
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'version': self.version,
+                'ttl': self.ttl
+            }
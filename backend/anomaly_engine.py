@@ -0,0 +1,127 @@
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional
+
+EARTH_RADIUS_KM = 6371.0
+
+class UserState(NamedTuple):
+    """Where and how a user last logged in successfully."""
+    timestamp: datetime
+    latitude: float
+    longitude: float
+    accuracy_km: float
+    country: Optional[str]
+    device: Optional[str]
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class AnomalyEngine:
+    """
+    Incremental login anomaly scoring against each user's last successful login.
+
+    Only the latest state per user is kept, in LRU order, bounded by max_users,
+    so scoring an attempt is one dictionary lookup and a distance calculation
+    with no history query. Scores are in [0, 1]:
+
+    - impossible travel: the distance from the previous login, less both
+      locations' accuracy radii, needs a speed above max_speed_kmh. Scores 0.6
+      at the limit, rising to 1.0 at twice the limit
+    - a different country than the previous login adds 0.2
+    - a different device adds 0.1
+
+    Failed attempts are scored but never become the user's state, so failures
+    from an attacker's location do not make the next real login look anomalous.
+    """
+
+    def __init__(self, max_users: int = 100000, max_speed_kmh: float = 900.0):
+        self.max_users = max_users
+        self.max_speed_kmh = max_speed_kmh
+        self._states: "OrderedDict[int, UserState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.scored = 0
+        self.flagged = 0
+        self.first_seen = 0
+        self.evictions = 0
+
+    def _remember(self, user_id: int, state: UserState):
+        current = self._states.pop(user_id, None)
+        # Enrichment can finish out of order; never replace newer state with older
+        self._states[user_id] = state if current is None or state.timestamp >= current.timestamp else current
+        while len(self._states) > self.max_users:
+            self._states.popitem(last=False)
+            self.evictions += 1
+
+    def score(self, user_id: int, timestamp: datetime, latitude: Optional[float], longitude: Optional[float],
+              success: bool, country: Optional[str] = None, device: Optional[str] = None,
+              accuracy_km: float = 0.0) -> Optional[float]:
+        """
+        Score an attempt and, when successful, make it the user's state.
+        None when the attempt has no location or the user has no known state.
+        """
+        if latitude is None or longitude is None:
+            return None
+        state = UserState(timestamp, float(latitude), float(longitude), float(accuracy_km or 0.0), country, device)
+        with self._lock:
+            previous = self._states.get(user_id)
+            if success:
+                self._remember(user_id, state)
+            if previous is None:
+                self.first_seen += 1
+                return None
+            score = self._score(previous, state)
+            self.scored += 1
+            if score >= 0.6:
+                self.flagged += 1
+            return score
+
+    def _score(self, previous: UserState, current: UserState) -> float:
+        score = 0.0
+        distance = distance_km(previous.latitude, previous.longitude, current.latitude, current.longitude)
+        distance = max(0.0, distance - previous.accuracy_km - current.accuracy_km)
+        if distance > 0:
+            hours = abs((current.timestamp - previous.timestamp).total_seconds()) / 3600
+            speed = distance / hours if hours else math.inf
+            if speed > self.max_speed_kmh:
+                score += 0.6 + 0.4 * min(1.0, speed / self.max_speed_kmh - 1)
+        if previous.country and current.country and previous.country != current.country:
+            score += 0.2
+        if previous.device and current.device and previous.device != current.device:
+            score += 0.1
+        return round(min(1.0, score), 3)
+
+    def warm(self, rows: Iterable) -> int:
+        """
+        Load state from successful attempts in ascending time order. Rows need
+        user_id, timestamp, latitude, longitude, accuracy_radius, country and device_info.
+        """
+        loaded = 0
+        with self._lock:
+            for row in rows:
+                if row.latitude is None or row.longitude is None:
+                    continue
+                self._remember(row.user_id, UserState(
+                    row.timestamp, float(row.latitude), float(row.longitude),
+                    float(row.accuracy_radius or 0), row.country, row.device_info
+                ))
+                loaded += 1
+        return loaded
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': len(self._states),
+                'max_users': self.max_users,
+                'max_speed_kmh': self.max_speed_kmh,
+                'scored': self.scored,
+                'flagged': self.flagged,
+                'first_seen': self.first_seen,
+                'evictions': self.evictions
+            }
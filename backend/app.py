@@ -1,37 +1,120 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import VARBINARY, and_, bindparam, case, event, func, inspect, or_, union_all
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import column_property
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from collections import Counter
 from datetime import datetime, timedelta
 import os
+import sys
 from dotenv import load_dotenv
 import jwt
-import requests
-import geoip2.database
-import geoip2.errors
 import os.path
+import re
+import atexit
+import ipaddress
+import math
 from functools import wraps
 from geolocation_service import GeolocationService
+from analytics_cache import AnalyticsCache
+from event_stream import EventPublisher, format_sse
+from enrichment_queue import EnrichmentQueue
+from attempt_writer import BufferedAttemptWriter
+from jwt_keyring import JWTKeyring, previous_keys_needed
+from identity_cache import Identity, IdentityCache
+from login_archive import LoginArchive
+from anomaly_engine import AnomalyEngine
+import geo_cells
+from password_hasher import HasherBusy, PasswordHasher
+from request_metrics import MetricsRegistry, RequestMetrics, bearer_authorized
+from rate_limiter import MemoryWindowStore, SQLiteWindowStore, SlidingWindowLimiter, ThrottleCounter
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+from db_engines import REPLICA_BIND, RoutingSession, engine_options, pool_stats
+from admin_listing import (EXPORT_FORMATS, decode_cursor, encode_cursor, export_rows, parse_bool,
+                           parse_fields, parse_limit, parse_timestamp, row_to_dict)
 import logging
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+# Reverse proxies in front of the app whose X-Forwarded-For/-Proto entries are trusted.
+# Only those rightmost entries are used, so clients cannot choose their own address
+TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# Optional read replica for analytics, admin listings and exports
+if os.getenv('DATABASE_REPLICA_URL'):
+    app.config['SQLALCHEMY_BINDS'] = {
+        REPLICA_BIND: {'url': os.getenv('DATABASE_REPLICA_URL'), **engine_options(os.getenv('DATABASE_REPLICA_URL'))}
+    }
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-route latency and SQL instrumentation, scraped from /metrics
+metrics = MetricsRegistry()
+request_metrics = RequestMetrics(
+    metrics,
+    query_warning=int(os.getenv('SQL_QUERY_WARNING', 20)),
+    profile_sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+    profile_slow_ms=float(os.getenv('PROFILE_SLOW_MS', 1000)),
+    profile_dir=os.getenv('PROFILE_DIR', 'profiles')
+)
+request_metrics.init_app(app)
+geolocation_seconds = metrics.histogram(
+    'geolocation_lookup_seconds', "Uncached IP geolocation lookups by source", ('source',))
+password_hash_seconds = metrics.histogram(
+    'password_hash_seconds', "Password hashing time by operation", ('operation',))
+password_hash_queue_seconds = metrics.histogram(
+    'password_hash_queue_seconds', "Time password hashing calls waited for a worker", ('operation',))
+
+def observe_password_hash(operation, queued, hashed):
+    password_hash_queue_seconds.observe(queued, operation=operation)
+    password_hash_seconds.observe(hashed, operation=operation)
+
 # Initialize geolocation service
 geo_service = GeolocationService()
+geo_service.observe_lookup = lambda source, seconds: geolocation_seconds.observe(seconds, source=source)
+
+# Serialized analytics snapshots, invalidated whenever login attempts are committed
+analytics_cache = AnalyticsCache(ttl=float(os.getenv('ANALYTICS_CACHE_TTL', 15)))
+# Per-user last login state for impossible travel scoring during enrichment
+anomaly_engine = AnomalyEngine(
+    max_users=int(os.getenv('ANOMALY_MAX_USERS', 100000)),
+    max_speed_kmh=float(os.getenv('ANOMALY_MAX_SPEED_KMH', 900))
+)
+# Locations only change when attempts are enriched, so map clusters can live longer
+geo_cluster_cache = AnalyticsCache(ttl=float(os.getenv('GEO_CLUSTER_CACHE_TTL', 60)))
+
+# Password hashing off the request threads; PASSWORD_HASH_WORKERS=0 hashes inline
+password_hasher = PasswordHasher(
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64)),
+    iterations=int(os.getenv('PASSWORD_HASH_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS)),
+    queue_timeout=float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0)),
+    observe=observe_password_hash
+)
+atexit.register(password_hasher.shutdown)
+
+# Login attempts moved out of the database by retention.py
+attempt_archive = LoginArchive(os.getenv('ATTEMPT_ARCHIVE_DIR', 'archive'))
+
+# Live login attempt events for /api/auth/analytics/stream subscribers
+event_publisher = EventPublisher()
+STREAM_HEARTBEAT_SECONDS = 15
 
 # Models
 class User(db.Model):
@@ -44,197 +127,665 @@ class User(db.Model):
     last_login = db.Column(db.DateTime)
 
 class LoginAttempt(db.Model):
+    # Indexes follow the hot queries; migrate.py creates them on existing databases
+    # and check_query_plans.py verifies the queries use them
+    __table_args__ = (
+        # Live analytics counts, rollup rebuilds and the recent attempts list
+        db.Index('idx_timestamp_success', 'timestamp', 'success', 'country'),
+        # Failed/successful attempts over a time range
+        db.Index('idx_success_timestamp', 'success', 'timestamp'),
+        # Per-user login history
+        db.Index('idx_user_timestamp', 'user_id', 'timestamp'),
+        # Enrichment: unenriched attempts from a set of IPs
+        db.Index('idx_ip_country', 'ip_address', 'country'),
+        # Exact IP and CIDR range lookups
+        db.Index('idx_ip_bin', 'ip_bin'),
+        # Map clusters: grouped by cell prefix, covering the summed coordinates
+        db.Index('idx_geo_cell', 'geo_cell', 'success', 'latitude', 'longitude'),
+    )
+
+    # On MySQL the table is partitioned by month (migrate.py), so its primary key is
+    # (id, timestamp) and the user_id foreign key is not enforced by the database
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     ip_address = db.Column(db.String(45), nullable=False)
+    # 4 or 16 byte packed form of ip_address, see pack_ip()
+    ip_bin = db.Column(VARBINARY(16))
+    user_agent = db.Column(db.String(512))
     location = db.Column(db.String(200))
     device_info = db.Column(db.String(200))
     browser_info = db.Column(db.String(200))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    success = db.Column(db.Boolean, default=False)
+    # Rollup key columns load their previous value on change so updates can move counts
+    timestamp = column_property(db.Column(db.DateTime, nullable=False, default=datetime.utcnow), active_history=True)
+    success = column_property(db.Column(db.Boolean, default=False), active_history=True)
     latitude = db.Column(db.Float(precision=10))
     longitude = db.Column(db.Float(precision=10))
+    # Z-order map tile of latitude/longitude, see geo_cells.py
+    geo_cell = db.Column(db.BigInteger)
     accuracy_radius = db.Column(db.Integer)
     city = db.Column(db.String(100))
-    country = db.Column(db.String(100))
+    country = column_property(db.Column(db.String(100)), active_history=True)
     timezone = db.Column(db.String(50))
     isp = db.Column(db.String(200))
     connection_type = db.Column(db.String(50))
+    # 0 to 1 versus the user's previous login, see anomaly_engine.py; None when unscored
+    anomaly_score = db.Column(db.Float)
 
-# Routes
-def download_geoip_database():
-    """Download the GeoLite2 City database if it doesn't exist."""
-    db_path = os.getenv('GEOIP_DB_PATH')
-    if not os.path.exists(db_path):
-        license_key = os.getenv('MAXMIND_LICENSE_KEY')
-        if not license_key:
-            raise ValueError("MAXMIND_LICENSE_KEY not set in environment")
-            
-        url = f"https://download.maxmind.com/app/geoip_download?edition_id=GeoLite2-City&license_key={license_key}&suffix=tar.gz"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            with open(f"{db_path}.tar.gz", 'wb') as f:
-                f.write(response.content)
-            
-            import tarfile
-            with tarfile.open(f"{db_path}.tar.gz", 'r:gz') as tar:
-                for member in tar.getmembers():
-                    if member.name.endswith('.mmdb'):
-                        member.name = os.path.basename(member.name)
-                        tar.extract(member, '.')
-            
-            os.remove(f"{db_path}.tar.gz")
+class LoginAttemptRollup(db.Model):
+    """Hourly login attempt counts, maintained incrementally as attempts are written."""
+    __tablename__ = 'login_attempt_rollup'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    success = db.Column(db.Boolean, primary_key=True)
+    country = db.Column(db.String(100), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class LoginThrottleRollup(db.Model):
+    """Per-minute counts of login attempts rejected by the rate limiter before any work."""
+    __tablename__ = 'login_throttle_rollup'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Rollup maintenance
+def rollup_key(timestamp, success, country):
+    """Rollup primary key for an attempt; unknown countries are stored as ''."""
+    return (
+        timestamp.replace(minute=0, second=0, microsecond=0),
+        bool(success),
+        (country or '')[:100]
+    )
+
+def upsert_counts(connection, table, key_columns, rows):
+    """Insert count rows, adding to the existing count where the key is already present."""
+    if connection.dialect.name == 'mysql':
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update(count=table.c['count'] + stmt.inserted['count'])
+    elif connection.dialect.name == 'sqlite':
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={'count': table.c['count'] + stmt.excluded['count']}
+        )
+    else:
+        raise NotImplementedError(f"Count upsert not supported for {connection.dialect.name}")
+    connection.execute(stmt, rows)
+
+def apply_rollup_deltas(connection, deltas):
+    """Add signed counts to rollup buckets with a single upsert statement."""
+    rows = [
+        {'bucket_start': key[0], 'success': key[1], 'country': key[2], 'count': delta}
+        for key, delta in deltas.items() if delta
+    ]
+    if rows:
+        upsert_counts(connection, LoginAttemptRollup.__table__, ['bucket_start', 'success', 'country'], rows)
+
+@event.listens_for(LoginAttempt, 'after_insert')
+def _rollup_after_insert(mapper, connection, target):
+    apply_rollup_deltas(connection, {rollup_key(target.timestamp, target.success, target.country): 1})
+
+@event.listens_for(LoginAttempt, 'after_update')
+def _rollup_after_update(mapper, connection, target):
+    state = inspect(target)
+    changed = False
+    old_values = {}
+    for name in ('timestamp', 'success', 'country'):
+        history = state.attrs[name].history
+        if history.has_changes():
+            changed = True
+            old_values[name] = history.deleted[0] if history.deleted else None
         else:
-            raise Exception(f"Failed to download GeoIP database: {response.status_code}")
-
-def get_location_from_ip(ip_address):
-    """Get location information using MaxMind GeoLite2 database."""
-    if ip_address in ('127.0.0.1', 'localhost', '::1'):
-        return {
-            'city': 'Local',
-            'country': 'Local',
-            'latitude': 0.0,  # Default to a valid coordinate for local access
-            'longitude': 0.0,
-            'accuracy_radius': 0,
-            'timezone': 'UTC'
-        }
+            old_values[name] = getattr(target, name)
+    if not changed:
+        return
+
+    deltas = Counter()
+    deltas[rollup_key(old_values['timestamp'], old_values['success'], old_values['country'])] -= 1
+    deltas[rollup_key(target.timestamp, target.success, target.country)] += 1
+    apply_rollup_deltas(connection, deltas)
+
+@event.listens_for(LoginAttempt, 'after_delete')
+def _rollup_after_delete(mapper, connection, target):
+    apply_rollup_deltas(connection, {rollup_key(target.timestamp, target.success, target.country): -1})
+
+def serialize_attempt(attempt):
+    """Attempt fields shown on the analytics dashboard."""
+    return {
+        'id': attempt.id,
+        'ip_address': attempt.ip_address,
+        'timestamp': attempt.timestamp.isoformat(),
+        'success': attempt.success,
+        'location': attempt.location,
+        'device_info': attempt.device_info,
+        'latitude': float(attempt.latitude) if attempt.latitude else None,
+        'longitude': float(attempt.longitude) if attempt.longitude else None
+    }
+
+@event.listens_for(db.session, 'after_flush')
+def _track_writes(session, flush_context):
+    if any(isinstance(obj, LoginAttempt) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['login_attempts_changed'] = True
+    new_attempts = [serialize_attempt(obj) for obj in session.new if isinstance(obj, LoginAttempt)]
+    if new_attempts:
+        session.info.setdefault('new_login_attempts', []).extend(new_attempts)
+    changed_users = [obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, User)]
+    if changed_users:
+        session.info.setdefault('changed_user_ids', set()).update(changed_users)
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_writes(session):
+    if session.info.pop('login_attempts_changed', False):
+        analytics_cache.invalidate()
+    for attempt in session.info.pop('new_login_attempts', []):
+        event_publisher.publish('attempt', attempt)
+    for user_id in session.info.pop('changed_user_ids', ()):
+        identity_cache.invalidate(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop('login_attempts_changed', None)
+    session.info.pop('new_login_attempts', None)
+    session.info.pop('changed_user_ids', None)
+
+def rebuild_rollups(since, until, archived_counts=None):
+    """
+    Recompute rollup buckets in [since, until) from raw login_attempt rows plus
+    any archived months, so rebuilding never loses counts for expired data.
+    Callers rebuilding a long range in chunks pass each chunk's share of
+    attempt_archive.hourly_counts() as archived_counts, so the archive files
+    are read once instead of once per chunk.
+    """
+    bucket_col = bucket_expression(LoginAttempt.timestamp, 'hour')
+    rows = db.session.query(
+        bucket_col.label('bucket_start'),
+        LoginAttempt.success,
+        LoginAttempt.country,
+        func.count(LoginAttempt.id).label('count')
+    ).filter(
+        LoginAttempt.timestamp >= since,
+        LoginAttempt.timestamp < until
+    ).group_by(bucket_col, LoginAttempt.success, LoginAttempt.country).all()
+
+    deltas = Counter()
+    for row in rows:
+        bucket_start = datetime.strptime(row.bucket_start, '%Y-%m-%d %H:%M:%S')
+        deltas[rollup_key(bucket_start, row.success, row.country)] += row.count
+    deltas.update(attempt_archive.hourly_counts(since, until) if archived_counts is None else archived_counts)
+
+    LoginAttemptRollup.query.filter(
+        LoginAttemptRollup.bucket_start >= since,
+        LoginAttemptRollup.bucket_start < until
+    ).delete(synchronize_session=False)
+    apply_rollup_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    analytics_cache.invalidate()
+    return sum(deltas.values())
+
+# Countries of the 0.0/0.0 placeholder results for local and unresolvable IPs
+PLACEHOLDER_COUNTRIES = ('Local', 'Unknown')
+
+def is_located(latitude, longitude, country=None):
+    """Whether coordinates are a real location, not missing or the 0.0/0.0 placeholder."""
+    if latitude is None or longitude is None or country in PLACEHOLDER_COUNTRIES:
+        return False
+    return not (latitude == 0 and longitude == 0)
+
+def placeholder_coordinates(columns):
+    """SQL condition for the 0.0/0.0 placeholder, on LoginAttempt or its table's columns."""
+    return and_(columns.latitude == 0, columns.longitude == 0)
+
+# Background geolocation enrichment
+ENRICHED_FIELDS = ('location', 'latitude', 'longitude', 'geo_cell', 'accuracy_radius', 'city', 'country',
+                   'timezone', 'isp', 'connection_type', 'device_info', 'browser_info', 'anomaly_score')
+
+def build_enrichment_updates(rows, results, score_anomalies=True):
+    """
+    Column updates and rollup count moves for attempt rows given {ip: location}.
+    Rows need id, ip_address, user_agent, timestamp, success and country, plus
+    user_id when score_anomalies is set. Historical backfills skip scoring,
+    since the engine only knows each user's latest login, and placeholder
+    locations are never scored or remembered as a user's last location.
+    """
+    updates = []
+    deltas = Counter()
+    # Score in time order so each attempt is compared with the login before it
+    for row in sorted(rows, key=lambda row: row.timestamp):
+        info = results.get(row.ip_address)
+        if info is None:
+            continue
+        device_info, browser_info = geo_service.parse_user_agent(row.user_agent) if row.user_agent else (None, None)
+        country = (info.get('country') or 'Unknown')[:100]
+        located = is_located(info.get('latitude'), info.get('longitude'), country)
+        anomaly_score = anomaly_engine.score(
+            row.user_id, row.timestamp, info.get('latitude'), info.get('longitude'), row.success,
+            country=country, device=device_info, accuracy_km=info.get('accuracy_radius') or 0
+        ) if score_anomalies and located else None
+        updates.append({
+            'attempt_id': row.id,
+            'location': f"{info.get('city')}, {country}",
+            'latitude': info.get('latitude'),
+            'longitude': info.get('longitude'),
+            # Placeholders get no cell, so they never form a cluster at 0,0
+            'geo_cell': geo_cells.cell_for(info.get('latitude'), info.get('longitude')) if located else None,
+            'accuracy_radius': info.get('accuracy_radius'),
+            'city': info.get('city'),
+            'country': country,
+            'timezone': info.get('timezone'),
+            'isp': (info.get('isp') or '')[:200],
+            'connection_type': info.get('connection_type'),
+            'device_info': device_info,
+            'browser_info': browser_info,
+            'anomaly_score': anomaly_score
+        })
+        deltas[rollup_key(row.timestamp, row.success, row.country)] -= 1
+        deltas[rollup_key(row.timestamp, row.success, country)] += 1
+    return updates, deltas
+
+def write_enrichment_updates(updates, deltas):
+    """Apply enrichment updates with one executemany UPDATE plus the rollup moves."""
+    if updates:
+        table = LoginAttempt.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('attempt_id')).values(
+                {name: bindparam(name) for name in ENRICHED_FIELDS}
+            ),
+            updates
+        )
+        apply_rollup_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    analytics_cache.invalidate()
+    if updates:
+        geo_cluster_cache.invalidate()
+        # Dashboards patch the attempts they already show instead of reloading
+        event_publisher.publish('enrichment', {'attempts': [{
+            'id': update['attempt_id'],
+            'location': update['location'],
+            'device_info': update['device_info'],
+            'latitude': float(update['latitude']) if update['latitude'] else None,
+            'longitude': float(update['longitude']) if update['longitude'] else None
+        } for update in updates]})
+
+def apply_enrichment(results):
+    """
+    Write resolved locations to every unenriched attempt from those IPs in one
+    transaction, moving their rollup counts from the unknown country bucket.
+    """
+    with app.app_context():
+        rows = db.session.query(
+            LoginAttempt.id,
+            LoginAttempt.user_id,
+            LoginAttempt.ip_address,
+            LoginAttempt.user_agent,
+            LoginAttempt.timestamp,
+            LoginAttempt.success,
+            LoginAttempt.country
+        ).filter(
+            LoginAttempt.ip_address.in_(list(results)),
+            LoginAttempt.country.is_(None)
+        ).with_for_update(skip_locked=True).all()
+        write_enrichment_updates(*build_enrichment_updates(rows, results))
+
+UA_WARMUP_LIMIT = int(os.getenv('UA_WARMUP_LIMIT', 1000))
+UA_WARMUP_DAYS = 7
+
+def warm_user_agent_cache():
+    """Pre-parse the most common user agents seen in recent login attempts."""
+    with app.app_context():
+        rows = db.session.query(LoginAttempt.user_agent).filter(
+            LoginAttempt.timestamp >= datetime.utcnow() - timedelta(days=UA_WARMUP_DAYS),
+            LoginAttempt.user_agent.isnot(None)
+        ).group_by(LoginAttempt.user_agent).order_by(
+            func.count(LoginAttempt.id).desc()
+        ).limit(UA_WARMUP_LIMIT).all()
+        db.session.commit()
+    warmed = geo_service.warm_user_agent_cache(row.user_agent for row in rows)
+    logger.info(f"Warmed user agent cache with {warmed} user agents")
+
+ANOMALY_WARMUP_DAYS = int(os.getenv('ANOMALY_WARMUP_DAYS', 30))
 
+def warm_anomaly_engine():
+    """Load each user's last successful located login from recent attempts."""
+    with app.app_context():
+        rows = db.session.query(
+            LoginAttempt.user_id,
+            LoginAttempt.timestamp,
+            LoginAttempt.latitude,
+            LoginAttempt.longitude,
+            LoginAttempt.accuracy_radius,
+            LoginAttempt.country,
+            LoginAttempt.device_info
+        ).filter(
+            LoginAttempt.success == True,
+            LoginAttempt.timestamp >= datetime.utcnow() - timedelta(days=ANOMALY_WARMUP_DAYS),
+            ~placeholder_coordinates(LoginAttempt),
+            LoginAttempt.country.notin_(PLACEHOLDER_COUNTRIES)
+        ).order_by(LoginAttempt.timestamp).yield_per(1000)
+        loaded = anomaly_engine.warm(rows)
+        db.session.commit()
+    logger.info(f"Warmed anomaly engine from {loaded} recent logins")
+
+def warm_enrichment():
+    warm_user_agent_cache()
+    warm_anomaly_engine()
+
+enrichment_queue = EnrichmentQueue(
+    resolve=geo_service.get_location_info,
+    apply_batch=apply_enrichment,
+    workers=int(os.getenv('ENRICHMENT_WORKERS', 4)),
+    max_pending=int(os.getenv('ENRICHMENT_MAX_PENDING', 10000)),
+    batch_size=int(os.getenv('ENRICHMENT_BATCH_SIZE', 100)),
+    flush_interval=float(os.getenv('ENRICHMENT_FLUSH_INTERVAL', 1.0)),
+    warmup=warm_enrichment
+)
+atexit.register(enrichment_queue.stop)
+
+def get_client_ip():
+    """
+    Client IP as seen by the first trusted proxy (ProxyFix, TRUSTED_PROXIES).
+    The leftmost X-Forwarded-For entry is whatever the client sent, so it is
+    never used: rate limiting keyed on it could be bypassed per request.
+    """
+    return request.remote_addr or ''
+
+def write_login_attempts(rows):
+    """
+    Insert buffered attempt rows with one multi-row INSERT. Bulk inserts skip
+    the ORM mapper events, so rollup counts, cache invalidation and live
+    events are handled here before the IPs are queued for enrichment.
+    """
+    with app.app_context():
+        db.session.execute(LoginAttempt.__table__.insert(), rows)
+        deltas = Counter(rollup_key(row['timestamp'], row['success'], None) for row in rows)
+        apply_rollup_deltas(db.session.connection(), deltas)
+        db.session.info['login_attempts_changed'] = True
+        db.session.info.setdefault('new_login_attempts', []).extend(
+            serialize_attempt(LoginAttempt(**row)) for row in rows
+        )
+        db.session.commit()
+    for ip_address in {row['ip_address'] for row in rows}:
+        enrichment_queue.submit(ip_address)
+
+attempt_writer = BufferedAttemptWriter(
+    write_batch=write_login_attempts,
+    max_pending=int(os.getenv('ATTEMPT_BUFFER_MAX_PENDING', 10000)),
+    batch_size=int(os.getenv('ATTEMPT_BUFFER_BATCH_SIZE', 500)),
+    flush_interval=float(os.getenv('ATTEMPT_BUFFER_FLUSH_INTERVAL', 0.5)),
+    max_retries=int(os.getenv('ATTEMPT_BUFFER_RETRIES', 3)),
+    retry_backoff=float(os.getenv('ATTEMPT_BUFFER_RETRY_BACKOFF', 0.1))
+)
+# Registered after the enrichment queue so it runs first at exit and its IPs still get enriched
+atexit.register(attempt_writer.stop)
+
+def pack_ip(value):
+    """Packed 4/16 byte form of an IP address (as MySQL INET6_ATON), None if unparseable."""
     try:
-        db_path = os.getenv('GEOIP_DB_PATH')
-        if not os.path.exists(db_path):
-            download_geoip_database()
-            
-        with geoip2.database.Reader(db_path) as reader:
-            response = reader.city(ip_address)
-            return {
-                'city': response.city.name or 'Unknown City',
-                'country': response.country.name or 'Unknown Country',
-                'latitude': float(response.location.latitude) if response.location.latitude else 0.0,
-                'longitude': float(response.location.longitude) if response.location.longitude else 0.0,
-                'accuracy_radius': response.location.accuracy_radius,
-                'timezone': str(response.location.time_zone)
-            }
-    except (geoip2.errors.AddressNotFoundError, FileNotFoundError, ValueError) as e:
-        print(f"Error getting location for IP {ip_address}: {str(e)}")
-        return {
-            'city': 'Unknown',
-            'country': 'Unknown',
-            'latitude': 0.0,  # Default to valid coordinates
-            'longitude': 0.0,
-            'accuracy_radius': 0,
-            'timezone': 'UTC'
-        }
-    except Exception as e:
-        print(f"Unexpected error getting location for IP {ip_address}: {str(e)}")
-        return {
-            'city': 'Error',
-            'country': 'Error',
-            'latitude': 0.0,
-            'longitude': 0.0,
-            'accuracy_radius': 0,
-            'timezone': 'UTC'
-        }
+        return ipaddress.ip_address(value).packed
+    except ValueError:
+        return None
+
+def record_login_attempt(user, success):
+    """Buffer an attempt with the raw IP and user agent; location is filled in later."""
+    ip_address = get_client_ip()[:45]
+    attempt_writer.submit({
+        'user_id': user.id,
+        'ip_address': ip_address,
+        'ip_bin': pack_ip(ip_address),
+        'user_agent': request.headers.get('User-Agent', '')[:512],
+        'success': success,
+        'timestamp': datetime.utcnow()
+    })
+
+# Failed login throttling, checked before any hashing or database work
+LOGIN_RATE_WINDOW = float(os.getenv('LOGIN_RATE_WINDOW', 300))
+# RATE_LIMIT_DB shares the counters between worker processes through a local SQLite file
+rate_limit_store = (SQLiteWindowStore(os.getenv('RATE_LIMIT_DB')) if os.getenv('RATE_LIMIT_DB')
+                    else MemoryWindowStore(max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))))
+login_ip_limiter = SlidingWindowLimiter(int(os.getenv('LOGIN_IP_LIMIT', 20)), LOGIN_RATE_WINDOW, rate_limit_store)
+login_user_limiter = SlidingWindowLimiter(int(os.getenv('LOGIN_USER_LIMIT', 10)), LOGIN_RATE_WINDOW, rate_limit_store)
+
+def write_throttled_counts(counts):
+    """Add per-minute throttled login counts so analytics still see shed traffic."""
+    with app.app_context():
+        rows = [{'bucket_start': minute, 'count': count} for minute, count in counts.items()]
+        upsert_counts(db.session.connection(), LoginThrottleRollup.__table__, ['bucket_start'], rows)
+        db.session.commit()
+    analytics_cache.invalidate()
+    event_publisher.publish('throttled', {'counts': [
+        {'bucket_start': minute.isoformat(), 'count': count} for minute, count in sorted(counts.items())
+    ]})
+
+throttle_counter = ThrottleCounter(
+    flush=write_throttled_counts,
+    flush_interval=float(os.getenv('THROTTLE_FLUSH_INTERVAL', 5.0))
+)
+atexit.register(throttle_counter.stop)
+
+def login_rate_keys(email):
+    return f"ip:{get_client_ip()}", f"user:{email.strip().lower()}"
 
 # Secret key management
-def get_current_secret_key():
-    """Get the current secret key from environment."""
-    load_dotenv()  # Reload environment variables
-    return os.getenv('SECRET_KEY')
-
-def create_token(user_id):
-    """Create a new JWT token with current secret key."""
-    secret_key = get_current_secret_key()
-    return jwt.encode(
-        {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=24)},
-        secret_key,
-        algorithm='HS256'
-    )
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+JWT_TOKEN_LIFETIME = timedelta(hours=float(os.getenv('JWT_TOKEN_LIFETIME_HOURS', 24)))
+# How often rotate_secret.py rotates SECRET_KEY; enough retired keys are kept to cover a token lifetime
+JWT_ROTATION_INTERVAL = timedelta(minutes=float(os.getenv('JWT_ROTATION_MINUTES', 3)))
+keyring = JWTKeyring(
+    ENV_PATH,
+    max_previous=int(os.getenv('JWT_PREVIOUS_KEYS', 0)) or previous_keys_needed(
+        JWT_TOKEN_LIFETIME.total_seconds(), JWT_ROTATION_INTERVAL.total_seconds()),
+    check_interval=float(os.getenv('JWT_KEY_CHECK_INTERVAL', 1.0)),
+    # Tokens from before key ids were added have all expired one token lifetime after deploy
+    legacy_window=JWT_TOKEN_LIFETIME.total_seconds()
+)
+
+# Analytics streams authenticate with a short-lived ticket instead of the session JWT,
+# since EventSource can only pass it in the URL, which ends up in access logs
+STREAM_TICKET_AUDIENCE = 'analytics-stream'
+STREAM_TICKET_LIFETIME = timedelta(seconds=float(os.getenv('STREAM_TICKET_SECONDS', 30)))
 
-def verify_token(token):
-    """Verify JWT token with current secret key."""
+def create_token(user_id, lifetime=JWT_TOKEN_LIFETIME, audience=None):
+    """
+    Create a new JWT token signed with the current key, identified by its kid.
+    Tokens with an audience, such as stream tickets, are not session tokens.
+    """
+    kid, secret_key = keyring.signing_key()
+    claims = {'user_id': user_id, 'exp': datetime.utcnow() + lifetime}
+    if audience:
+        claims['aud'] = audience
+    return jwt.encode(claims, secret_key, algorithm='HS256', headers={'kid': kid})
+
+def verify_token(token, audience=None):
+    """
+    Verify JWT token against the current or a recently rotated key.
+    Session tokens have no audience; a token verifies only for its own audience.
+    """
     try:
-        secret_key = get_current_secret_key()
-        return jwt.decode(token, secret_key, algorithms=['HS256'])
-    except jwt.ExpiredSignatureError:
-        return None
+        kid = jwt.get_unverified_header(token).get('kid')
     except jwt.InvalidTokenError:
-        # If invalid, try once more with reloaded secret key
+        return None
+
+    # Tokens issued before key ids were added carry no kid: try the newest keys only
+    secret_keys = [keyring.verification_key(kid)] if kid else keyring.legacy_verification_keys()
+    for secret_key in secret_keys:
+        if secret_key is None:
+            continue
         try:
-            load_dotenv()
-            secret_key = get_current_secret_key()
-            return jwt.decode(token, secret_key, algorithms=['HS256'])
-        except:
+            return jwt.decode(token, secret_key, algorithms=['HS256'], audience=audience)
+        except jwt.InvalidSignatureError:
+            continue
+        except jwt.InvalidTokenError:
+            return None
+    return None
+
+def is_event_stream_request():
+    return request.accept_mimetypes.best == 'text/event-stream'
+
+# Authenticated identities, so most requests skip the user lookup entirely
+identity_cache = IdentityCache(
+    ttl=float(os.getenv('IDENTITY_CACHE_TTL', 30)),
+    max_size=int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+)
+
+def load_identity(user_id):
+    """Identity for a user id from the cache, falling back to the database."""
+    identity = identity_cache.get(user_id)
+    if identity is None:
+        generation = identity_cache.generation
+        user = db.session.get(User, user_id)
+        if not user:
             return None
+        identity = Identity(user.id, bool(user.is_admin), generation)
+        identity_cache.put(identity)
+    return identity
+
+def authenticate_request(require_admin=False):
+    """
+    Shared fast path for the auth decorators.
+    Returns (identity, None) on success or (None, error response).
+    """
+    token = None
+    audience = None
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
+        try:
+            token = auth_header.split(" ")[1]
+        except IndexError:
+            return None, (jsonify({'message': 'Token is missing!'}), 401)
+    elif is_event_stream_request():
+        # EventSource cannot set headers, so streams pass a short-lived ticket in the query string
+        token = request.args.get('ticket')
+        audience = STREAM_TICKET_AUDIENCE
+
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+
+    try:
+        data = verify_token(token, audience)
+        if not data:
+            return None, (jsonify({'message': 'Token is invalid!'}), 401)
+
+        current_user = load_identity(data['user_id'])
+        if not current_user:
+            return None, (jsonify({'message': 'User not found!'}), 401)
+
+        if require_admin and not current_user.is_admin:
+            return None, (jsonify({'message': 'Admin privileges required!'}), 403)
+
+    except Exception as e:
+        return None, (jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401)
+
+    return current_user, None
 
 # Update token verification decorator
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({'message': 'Token is missing!'}), 401
-
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
+        current_user, error = authenticate_request()
+        if error:
+            return error
+        return f(current_user, *args, **kwargs)
 
-        try:
-            data = verify_token(token)
-            if not data:
-                return jsonify({'message': 'Token is invalid!'}), 401
-            
-            current_user = User.query.get(data['user_id'])
-            if not current_user:
-                return jsonify({'message': 'User not found!'}), 401
-                
-        except Exception as e:
-            return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
+    return decorated
 
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        current_user, error = authenticate_request(require_admin=True)
+        if error:
+            return error
         return f(current_user, *args, **kwargs)
 
     return decorated
 
-def admin_required(f):
+def replica_reads(f):
+    """Run the view's queries (and any streamed response) against the read replica, if configured."""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({'message': 'Token is missing!'}), 401
+        db.session.info['read_replica'] = True
+        return f(*args, **kwargs)
+    return decorated
 
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
+@app.teardown_request
+def _reset_read_routing(exc):
+    # The session outlives the request when an app context was already pushed (scripts, tests)
+    db.session.info.pop('read_replica', None)
 
-        try:
-            data = verify_token(token)
-            if not data:
-                return jsonify({'message': 'Token is invalid!'}), 401
-            
-            current_user = User.query.get(data['user_id'])
-            if not current_user:
-                return jsonify({'message': 'User not found!'}), 401
-            
-            if not current_user.is_admin:
-                return jsonify({'message': 'Admin privileges required!'}), 403
-
-        except Exception as e:
-            return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
+def read_engine():
+    """Engine for read-only work: the replica when configured, otherwise the primary."""
+    return db.engines.get(REPLICA_BIND, db.engine)
 
-        return f(current_user, *args, **kwargs)
+# Auth routes
+@app.route('/api/auth/register', methods=['POST'])
+def register():
+    data = request.json or {}
 
-    return decorated
+    if not all(data.get(k) for k in ['username', 'email', 'password']):
+        return jsonify({'message': 'Missing required fields'}), 400
+
+    if User.query.filter_by(username=data['username']).first():
+        return jsonify({'message': 'Username already exists'}), 400
+
+    if User.query.filter_by(email=data['email']).first():
+        return jsonify({'message': 'Email already exists'}), 400
+
+    new_user = User(
+        username=data['username'],
+        email=data['email'],
+        password=password_hasher.hash(data['password'])
+    )
+    db.session.add(new_user)
+    db.session.commit()
+
+    return jsonify({'message': 'User registered successfully'}), 201
+
+@app.route('/api/auth/login', methods=['POST'])
+def login():
+    data = request.json or {}
+
+    if not data.get('email') or not data.get('password'):
+        return jsonify({'message': 'Missing email or password'}), 400
+
+    ip_key, user_key = login_rate_keys(data['email'])
+    retry_after = max(login_ip_limiter.retry_after(ip_key), login_user_limiter.retry_after(user_key))
+    if retry_after:
+        throttle_counter.add()
+        response = jsonify({'message': 'Too many failed login attempts, please try again later'})
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+        return response, 429
+
+    user = User.query.filter_by(email=data['email']).first()
+    if not user:
+        login_ip_limiter.record(ip_key)
+        login_user_limiter.record(user_key)
+        return jsonify({'message': 'Invalid email or password'}), 401
+
+    if not password_hasher.verify(user.password, data['password']):
+        login_ip_limiter.record(ip_key)
+        login_user_limiter.record(user_key)
+        record_login_attempt(user, success=False)
+        return jsonify({'message': 'Invalid email or password'}), 401
+
+    # Upgrade hashes made with an older method or cost while the password is at hand
+    if password_hasher.needs_rehash(user.password):
+        user.password = password_hasher.hash(data['password'])
+        password_hasher.record_rehash()
+    user.last_login = datetime.utcnow()
+    db.session.commit()
+    record_login_attempt(user, success=True)
+
+    return jsonify({
+        'token': create_token(user.id),
+        'role': 'admin' if user.is_admin else 'user',
+        'username': user.username
+    })
+
+@app.errorhandler(HasherBusy)
+def handle_hasher_busy(e):
+    response = jsonify({'message': 'Server busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 # Admin routes
 @app.route('/api/admin/create', methods=['POST'])
 @admin_required
-def create_admin():
+def create_admin(current_user):
     data = request.json
     
     if not all(k in data for k in ['username', 'email', 'password']):
@@ -246,7 +797,7 @@ def create_admin():
     if User.query.filter_by(email=data['email']).first():
         return jsonify({'message': 'Email already exists'}), 400
         
-    hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+    hashed_password = password_hasher.hash(data['password'])
     new_admin = User(
         username=data['username'],
         email=data['email'],
@@ -259,90 +810,588 @@ def create_admin():
     
     return jsonify({'message': 'Admin user created successfully'}), 201
 
-@app.route('/api/admin/users', methods=['GET'])
-@admin_required
-def get_users():
-    users = User.query.all()
+# Admin listings: keyset pagination, projection and streaming export
+LISTING_PAGE_SIZE = 100
+LISTING_MAX_PAGE_SIZE = 1000
+EXPORT_YIELD_PER = 1000
+USER_FIELDS = ('id', 'username', 'email', 'is_admin', 'created_at', 'last_login')
+ATTEMPT_FIELDS = ('id', 'user_id', 'ip_address', 'user_agent', 'timestamp', 'success', 'location',
+                  'device_info', 'browser_info', 'latitude', 'longitude', 'accuracy_radius', 'city',
+                  'country', 'timezone', 'isp', 'connection_type', 'anomaly_score')
+ATTEMPT_DEFAULT_FIELDS = ('id', 'user_id', 'ip_address', 'timestamp', 'success', 'location', 'country')
+
+def keyset_listing(model, collection, fields, filters, descending=False):
+    """
+    One page of rows ordered by id, continuing after ?cursor=, or with
+    ?format=ndjson|csv every matching row streamed from a server-side cursor.
+    """
+    export_format = request.args.get('format')
+    if export_format and export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f"Unsupported format '{export_format}'"}), 400
+    try:
+        last_id = decode_cursor(request.args.get('cursor'))
+        limit = parse_limit(request.args.get('limit'), LISTING_PAGE_SIZE, LISTING_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    columns = [getattr(model, name) for name in dict.fromkeys(('id', *fields))]
+    query = db.session.query(*columns).filter(*filters)
+    if last_id is not None:
+        query = query.filter(model.id < last_id if descending else model.id > last_id)
+    query = query.order_by(model.id.desc() if descending else model.id.asc())
+
+    if export_format:
+        # The response outlives the request's session, so the export streams from
+        # its own connection with a server-side cursor where the driver has one
+        engine = read_engine() if db.session.info.get('read_replica') else db.engine
+        statement = query.statement
+
+        def stream():
+            with engine.connect() as connection:
+                rows = connection.execution_options(yield_per=EXPORT_YIELD_PER).execute(statement)
+                yield from export_rows(rows, fields, export_format)
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{collection}.{export_format}"'}
+        )
+
+    rows = query.limit(limit + 1).all()
+    page = rows[:limit]
     return jsonify({
-        'users': [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'is_admin': user.is_admin,
-            'created_at': user.created_at.isoformat(),
-            'last_login': user.last_login.isoformat() if user.last_login else None
-        } for user in users]
+        collection: [row_to_dict(row, fields) for row in page],
+        'next_cursor': encode_cursor(page[-1].id) if len(rows) > limit else None
     })
 
+def ip_filter(value):
+    """Match one address or a CIDR network such as 203.0.113.0/24 on the packed IP column."""
+    if '/' not in value:
+        packed = pack_ip(value)
+        return LoginAttempt.ip_bin == packed if packed else LoginAttempt.ip_address == value
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise ValueError(f"Invalid IP network '{value}'")
+    # IPv4 and IPv6 values share the column; the length check keeps the families apart
+    return db.and_(
+        LoginAttempt.ip_bin.between(network.network_address.packed, network.broadcast_address.packed),
+        func.length(LoginAttempt.ip_bin) == len(network.network_address.packed)
+    )
+
+@app.route('/api/admin/users', methods=['GET'])
+@admin_required
+@replica_reads
+def get_users(current_user):
+    args = request.args
+    try:
+        fields = parse_fields(args.get('fields'), USER_FIELDS, USER_FIELDS)
+        is_admin = parse_bool(args.get('is_admin'))
+        since = parse_timestamp(args.get('since'))
+        until = parse_timestamp(args.get('until'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    filters = []
+    if args.get('username'):
+        filters.append(User.username.startswith(args['username'], autoescape=True))
+    if is_admin is not None:
+        filters.append(User.is_admin == is_admin)
+    if since:
+        filters.append(User.created_at >= since)
+    if until:
+        filters.append(User.created_at < until)
+    return keyset_listing(User, 'users', fields, filters)
+
+@app.route('/api/admin/login-attempts', methods=['GET'])
+@admin_required
+@replica_reads
+def get_login_attempts(current_user):
+    """Login attempts, newest first."""
+    args = request.args
+    try:
+        fields = parse_fields(args.get('fields'), ATTEMPT_FIELDS, ATTEMPT_DEFAULT_FIELDS)
+        success = parse_bool(args.get('success'))
+        user_id = int(args['user_id']) if args.get('user_id') else None
+        ip_condition = ip_filter(args['ip_address']) if args.get('ip_address') else None
+        since = parse_timestamp(args.get('since'))
+        until = parse_timestamp(args.get('until'))
+        min_anomaly = float(args['min_anomaly']) if args.get('min_anomaly') else None
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    filters = []
+    if user_id is not None:
+        filters.append(LoginAttempt.user_id == user_id)
+    if min_anomaly is not None:
+        filters.append(LoginAttempt.anomaly_score >= min_anomaly)
+    if args.get('username'):
+        filters.append(LoginAttempt.user_id.in_(
+            db.session.query(User.id).filter(User.username == args['username'])
+        ))
+    if success is not None:
+        filters.append(LoginAttempt.success == success)
+    if args.get('country'):
+        filters.append(LoginAttempt.country == args['country'])
+    if ip_condition is not None:
+        filters.append(ip_condition)
+    if since:
+        filters.append(LoginAttempt.timestamp >= since)
+    if until:
+        filters.append(LoginAttempt.timestamp < until)
+    return keyset_listing(LoginAttempt, 'attempts', fields, filters, descending=True)
+
+@app.route('/api/admin/auth/anomalies', methods=['GET'])
+@admin_required
+def get_anomaly_stats(current_user):
+    return jsonify(anomaly_engine.stats())
+
+@app.route('/api/admin/auth/rate-limit', methods=['GET'])
+@admin_required
+def get_rate_limit_stats(current_user):
+    return jsonify({**rate_limit_store.stats(), 'throttled': throttle_counter.total})
+
+@app.route('/api/admin/auth/cache', methods=['GET'])
+@admin_required
+def get_identity_cache_stats(current_user):
+    return jsonify(identity_cache.stats())
+
+@app.route('/api/admin/db/pool', methods=['GET'])
+@admin_required
+def get_pool_stats(current_user):
+    return jsonify({bind or 'primary': pool_stats(engine) for bind, engine in db.engines.items()})
+
+@app.route('/api/admin/auth/hasher', methods=['GET'])
+@admin_required
+def get_password_hasher_stats(current_user):
+    return jsonify(password_hasher.stats())
+
+@app.route('/api/admin/geolocation/cache', methods=['GET'])
+@admin_required
+def get_geolocation_cache_stats(current_user):
+    return jsonify(geo_service.cache_stats())
+
+@app.route('/api/admin/login-attempts/buffer', methods=['GET'])
+@admin_required
+def get_attempt_buffer_stats(current_user):
+    return jsonify(attempt_writer.stats())
+
+@app.route('/api/admin/geolocation/queue', methods=['GET'])
+@admin_required
+def get_enrichment_queue_stats(current_user):
+    return jsonify(enrichment_queue.stats())
+
+# Analytics time-series configuration
+ANALYTICS_BUCKETS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+ANALYTICS_MAX_BUCKETS = 1440
+_RANGE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+_BUCKET_FORMATS = {
+    # (MySQL DATE_FORMAT, SQLite strftime) patterns that truncate a timestamp
+    'minute': ('%Y-%m-%d %H:%i:00', '%Y-%m-%d %H:%M:00'),
+    'hour': ('%Y-%m-%d %H:00:00', '%Y-%m-%d %H:00:00'),
+    'day': ('%Y-%m-%d 00:00:00', '%Y-%m-%d 00:00:00'),
+}
+_BUCKET_LABELS = {'minute': '%H:%M', 'hour': '%H:00', 'day': '%Y-%m-%d'}
+
+def bucket_label_format(starts, bucket):
+    """strftime format for bucket labels; times carry the date once the series spans more than a day."""
+    if bucket != 'day' and starts[-1] - starts[0] >= timedelta(days=1):
+        return f"%m-%d {_BUCKET_LABELS[bucket]}"
+    return _BUCKET_LABELS[bucket]
+
+def parse_analytics_range(value):
+    """Parse a range such as '24h', '7d' or '90m' into a timedelta."""
+    match = re.fullmatch(r'(\d+)([mhd])', (value or '').strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid range '{value}', expected e.g. 24h, 7d or 90m")
+    return timedelta(**{_RANGE_UNITS[match.group(2)]: int(match.group(1))})
+
+def truncate_to_bucket(moment, bucket):
+    """Truncate a datetime to the start of its minute, hour or day bucket."""
+    if bucket == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def bucket_expression(column, bucket):
+    """SQL expression truncating a timestamp column to a bucket start string."""
+    mysql_format, sqlite_format = _BUCKET_FORMATS[bucket]
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime(sqlite_format, column)
+    return func.date_format(column, mysql_format)
+
+def success_count(column):
+    """Conditional SUM counting the rows where the success column is true."""
+    return func.sum(case((column == True, 1), else_=0))
+
+def bucket_starts(now, span, bucket):
+    """Return the bucket start times covering the last `span` up to `now`."""
+    step = ANALYTICS_BUCKETS[bucket]
+    count = max(1, -(-span // step))
+    if count > ANALYTICS_MAX_BUCKETS:
+        raise ValueError(f"Range too large for '{bucket}' buckets (max {ANALYTICS_MAX_BUCKETS} buckets)")
+    current = truncate_to_bucket(now, bucket)
+    return [current - step * i for i in range(count - 1, -1, -1)]
+
+def get_attempt_totals(now):
+    """Overall (total, successful) counts: rollups for closed hours, raw rows for the current one."""
+    current_hour = truncate_to_bucket(now, 'hour')
+    rollup = LoginAttemptRollup
+    closed = db.select(
+        func.sum(rollup.count).label('total'),
+        func.sum(case((rollup.success == True, rollup.count), else_=0)).label('successful')
+    ).where(rollup.bucket_start < current_hour)
+    live = db.select(
+        func.count(LoginAttempt.id).label('total'),
+        success_count(LoginAttempt.success).label('successful')
+    ).where(LoginAttempt.timestamp >= current_hour)
+
+    total = successful = 0
+    for row in db.session.execute(union_all(closed, live)):
+        total += int(row.total or 0)
+        successful += int(row.successful or 0)
+    return total, successful
+
+def get_attempt_series(starts, bucket, now):
+    """Successful/failed attempt counts per bucket, oldest first.
+
+    Hour and day buckets are summed from the hourly rollups for closed hours and
+    from raw rows for the current partial hour; minute buckets always use raw rows.
+    """
+    if bucket == 'minute':
+        raw_since = starts[0]
+        selects = []
+    else:
+        raw_since = max(starts[0], truncate_to_bucket(now, 'hour'))
+        rollup = LoginAttemptRollup
+        rollup_bucket = bucket_expression(rollup.bucket_start, bucket)
+        selects = [db.select(
+            rollup_bucket.label('bucket_start'),
+            func.sum(case((rollup.success == True, rollup.count), else_=0)).label('successful'),
+            func.sum(rollup.count).label('total')
+        ).where(
+            rollup.bucket_start >= starts[0],
+            rollup.bucket_start < raw_since
+        ).group_by(rollup_bucket)]
+
+    raw_bucket = bucket_expression(LoginAttempt.timestamp, bucket)
+    selects.append(db.select(
+        raw_bucket.label('bucket_start'),
+        success_count(LoginAttempt.success).label('successful'),
+        func.count(LoginAttempt.id).label('total')
+    ).where(
+        LoginAttempt.timestamp >= raw_since
+    ).group_by(raw_bucket))
+
+    counts = Counter()
+    for row in db.session.execute(union_all(*selects) if len(selects) > 1 else selects[0]):
+        if row.bucket_start:
+            start = datetime.strptime(row.bucket_start, '%Y-%m-%d %H:%M:%S')
+            counts[(start, 'successful')] += int(row.successful or 0)
+            counts[(start, 'total')] += int(row.total or 0)
+
+    label_format = bucket_label_format(starts, bucket)
+    series = []
+    for start in starts:
+        successful, total = counts[(start, 'successful')], counts[(start, 'total')]
+        series.append({
+            'hour': start.strftime(label_format),
+            'bucket_start': start.isoformat(),
+            'successful': successful,
+            'failed': total - successful
+        })
+    return series
+
+def get_throttled_counts(starts, bucket):
+    """(all-time total, {bucket start: count}) of logins rejected by the rate limiter."""
+    table = LoginThrottleRollup
+    total = db.session.query(func.sum(table.count)).scalar() or 0
+    bucket_col = bucket_expression(table.bucket_start, bucket)
+    rows = db.session.query(bucket_col.label('bucket_start'), func.sum(table.count).label('count')).filter(
+        table.bucket_start >= starts[0]
+    ).group_by(bucket_col).all()
+    return int(total), {
+        datetime.strptime(row.bucket_start, '%Y-%m-%d %H:%M:%S'): int(row.count) for row in rows
+    }
+
 # Update analytics endpoint to require admin access
 @app.route('/api/auth/analytics', methods=['GET'])
 @admin_required
-def get_analytics():
+@replica_reads
+def get_analytics(current_user):
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ANALYTICS_BUCKETS:
+        return jsonify({'message': f"Invalid bucket '{bucket}', expected one of: minute, hour, day"}), 400
+    range_value = request.args.get('range', '24h')
+    now = datetime.utcnow()
     try:
-        # Verify JWT token
-        token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token:
-            return jsonify({'message': 'Missing token'}), 401
-        
-        try:
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            user_id = payload['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+        span = parse_analytics_range(range_value)
+        starts = bucket_starts(now, span, bucket)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Serve unchanged snapshots from memory, or a bare 304 when the client already has it
+    cache_key = (range_value, bucket)
+    cached = analytics_cache.get(cache_key)
+    if cached:
+        return analytics_response(cached, 'HIT')
 
-        # Get all login attempts
-        total_attempts = LoginAttempt.query.count()
-        successful_attempts = LoginAttempt.query.filter_by(success=True).count()
+    try:
+        version = analytics_cache.version
+
+        # Overall totals from the hourly rollups
+        total_attempts, successful_attempts = get_attempt_totals(now)
         failed_attempts = total_attempts - successful_attempts
 
         # Get recent attempts with coordinates
         recent_attempts = LoginAttempt.query.order_by(LoginAttempt.timestamp.desc()).limit(10).all()
         
-        # Get hourly statistics for the last 24 hours
-        now = datetime.utcnow()
-        hourly_attempts = []
-        
-        for hour in range(24):
-            start_time = now - timedelta(hours=hour+1)
-            end_time = now - timedelta(hours=hour)
-            
-            hourly_data = {
-                'hour': start_time.strftime('%H:00'),
-                'successful': LoginAttempt.query.filter(
-                    LoginAttempt.timestamp.between(start_time, end_time),
-                    LoginAttempt.success == True
-                ).count(),
-                'failed': LoginAttempt.query.filter(
-                    LoginAttempt.timestamp.between(start_time, end_time),
-                    LoginAttempt.success == False
-                ).count()
-            }
-            hourly_attempts.append(hourly_data)
-
-        return jsonify({
+        # Bucketed statistics for the requested range, oldest bucket first
+        hourly_attempts = get_attempt_series(starts, bucket, now)
+        throttled_attempts, throttled_series = get_throttled_counts(starts, bucket)
+        for entry in hourly_attempts:
+            entry['throttled'] = throttled_series.get(datetime.fromisoformat(entry['bucket_start']), 0)
+
+        body = jsonify({
             'total_attempts': total_attempts,
             'successful_attempts': successful_attempts,
             'failed_attempts': failed_attempts,
-            'recent_attempts': [{
-                'ip_address': attempt.ip_address,
-                'timestamp': attempt.timestamp.isoformat(),
-                'success': attempt.success,
-                'location': attempt.location,
-                'device_info': attempt.device_info,
-                'latitude': float(attempt.latitude) if attempt.latitude else None,
-                'longitude': float(attempt.longitude) if attempt.longitude else None
-            } for attempt in recent_attempts],
-            'hourly_attempts': hourly_attempts
-        })
+            'throttled_attempts': throttled_attempts,
+            'recent_attempts': [serialize_attempt(attempt) for attempt in recent_attempts],
+            'hourly_attempts': hourly_attempts,
+            'range': range_value,
+            'bucket': bucket
+        }).get_data()
+        return analytics_response(analytics_cache.put(cache_key, body, version), 'MISS')
     except Exception as e:
+        logger.error(f"Error fetching analytics data: {str(e)}")
         return jsonify({'message': 'Error fetching analytics data'}), 500
 
+def analytics_response(cached, cache_status, cache=analytics_cache):
+    """Build a response for a cached snapshot, answering 304 if the client's ETag matches."""
+    if request.if_none_match.contains(cached.etag):
+        cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        response = Response(cached.body, mimetype='application/json')
+    response.set_etag(cached.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Cache'] = cache_status
+    return response
+
+# Map clusters
+GEO_MAX_ZOOM = 18
+# Cells are this many zoom levels finer than the map, about 32 px on screen
+GEO_CLUSTER_DETAIL = 3
+# Up to this cell zoom (map zoom 5) responses cover the whole world
+GEO_CLUSTER_WORLD_ZOOM = 8
+GEO_MAX_CLUSTERS = int(os.getenv('GEO_MAX_CLUSTERS', 300))
+
+def parse_bbox(value):
+    """(south, west, north, east) from a Leaflet 'west,south,east,north' string."""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError("Invalid bbox, expected 'west,south,east,north'")
+    if not (-90 <= south <= north <= 90):
+        raise ValueError("Invalid bbox latitudes")
+    # Leaflet reports longitudes past ±180 once the map wraps around
+    if east - west >= 360:
+        west, east = -180.0, 180.0
+    else:
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+    return south, west, north, east
+
+def query_geo_cells(zoom, ranges=None):
+    """{(cell, success): [count, latitude sum, longitude sum]} for located attempts, from idx_geo_cell."""
+    cell = LoginAttempt.geo_cell.op('>>')(geo_cells.cell_shift(zoom))
+    query = db.session.query(
+        cell.label('cell'),
+        LoginAttempt.success,
+        func.count().label('count'),
+        func.sum(LoginAttempt.latitude).label('latitude'),
+        func.sum(LoginAttempt.longitude).label('longitude')
+    ).filter(LoginAttempt.geo_cell.isnot(None), ~placeholder_coordinates(LoginAttempt))
+    if ranges is not None:
+        query = query.filter(or_(*(LoginAttempt.geo_cell.between(low, high) for low, high in ranges)))
+    return {
+        (row.cell, bool(row.success)): [row.count, row.latitude or 0.0, row.longitude or 0.0]
+        for row in query.group_by(cell, LoginAttempt.success)
+    }
+
+def build_clusters(cells, zoom, rects):
+    """
+    Cluster list for the cells inside the tile rectangles, merging into parent
+    cells until there are at most GEO_MAX_CLUSTERS of them.
+    """
+    def inside(cell, level):
+        x, y = geo_cells.cell_tile(cell, level)
+        shift = zoom - level
+        return any(x0 >> shift <= x <= x1 >> shift and y0 >> shift <= y <= y1 >> shift
+                   for x0, y0, x1, y1 in rects)
+
+    level = zoom
+    merged = {}
+    for (cell, success), (count, latitude, longitude) in cells.items():
+        if inside(cell, level):
+            totals = merged.setdefault(cell, [0, 0, 0.0, 0.0])
+            totals[0 if success else 1] += count
+            totals[2] += latitude
+            totals[3] += longitude
+    while len(merged) > GEO_MAX_CLUSTERS and level > 0:
+        level -= 1
+        parents = {}
+        for cell, totals in merged.items():
+            parent = parents.setdefault(cell >> 2, [0, 0, 0.0, 0.0])
+            for i, value in enumerate(totals):
+                parent[i] += value
+        merged = parents
+
+    clusters = []
+    for cell, (successful, failed, latitude, longitude) in sorted(merged.items()):
+        count = successful + failed
+        clusters.append({
+            'lat': round(latitude / count, 4),
+            'lng': round(longitude / count, 4),
+            'successful': successful,
+            'failed': failed
+        })
+    return level, clusters
+
+@app.route('/api/auth/analytics/clusters', methods=['GET'])
+@admin_required
+@replica_reads
+def get_geo_clusters(current_user):
+    """
+    Login attempt counts per map cell for the visible map, so the dashboard can
+    show every located attempt with a payload of a few KB.
+    ?zoom= is the map zoom and ?bbox= the visible 'west,south,east,north'.
+    """
+    try:
+        map_zoom = int(request.args.get('zoom', 2))
+        if not 0 <= map_zoom <= GEO_MAX_ZOOM:
+            raise ValueError(f"zoom must be between 0 and {GEO_MAX_ZOOM}")
+        bbox = parse_bbox(request.args.get('bbox', '-180,-90,180,90'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    zoom = min(map_zoom + GEO_CLUSTER_DETAIL, geo_cells.CELL_ZOOM)
+    # Shallow zooms return the whole world, one snapshot per zoom that every
+    # pan reuses; deeper zooms query and cache the visible tiles only
+    world = zoom <= GEO_CLUSTER_WORLD_ZOOM
+    rects = [(0, 0, (1 << zoom) - 1, (1 << zoom) - 1)] if world else geo_cells.bbox_tiles(*bbox, zoom)
+    cache_key = (zoom,) if world else (zoom, tuple(rects))
+    cached = geo_cluster_cache.get(cache_key)
+    if cached:
+        return analytics_response(cached, 'HIT', geo_cluster_cache)
+
+    try:
+        version = geo_cluster_cache.version
+        cells = query_geo_cells(zoom, None if world else geo_cells.cell_ranges(rects, zoom))
+        cell_zoom, clusters = build_clusters(cells, zoom, rects)
+        body = jsonify({
+            'zoom': map_zoom,
+            'cell_zoom': cell_zoom,
+            'world': world,
+            'clusters': clusters
+        }).get_data()
+        return analytics_response(geo_cluster_cache.put(cache_key, body, version), 'MISS', geo_cluster_cache)
+    except Exception as e:
+        logger.error(f"Error fetching map clusters: {str(e)}")
+        return jsonify({'message': 'Error fetching map clusters'}), 500
+
+@app.route('/api/auth/analytics/stream/ticket', methods=['POST'])
+@admin_required
+def create_stream_ticket(current_user):
+    """Short-lived ticket for opening /api/auth/analytics/stream, passed as ?ticket=."""
+    ticket = create_token(current_user.id, STREAM_TICKET_LIFETIME, STREAM_TICKET_AUDIENCE)
+    return jsonify({'ticket': ticket, 'expires_in': int(STREAM_TICKET_LIFETIME.total_seconds())})
+
+@app.route('/api/auth/analytics/stream', methods=['GET'])
+@admin_required
+def stream_analytics(current_user):
+    """
+    Server-Sent Events feed for the analytics dashboard: new login attempts,
+    their enrichment once located, and throttled login counts.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = event_publisher.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                stream_event = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if stream_event is None:
+                    if subscription.overflowed:
+                        yield format_sse(event_publisher.reset_event())
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(stream_event)
+        finally:
+            event_publisher.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/auth/analytics/cache', methods=['GET'])
+@admin_required
+def get_analytics_cache_stats(current_user):
+    return jsonify(analytics_cache.stats())
+
+# Component stats as gauges next to the request metrics
+metrics.register_stats('analytics_cache', analytics_cache.stats)
+metrics.register_stats('geo_cluster_cache', geo_cluster_cache.stats)
+metrics.register_stats('geolocation_cache', geo_service.cache_stats)
+metrics.register_stats('geoip_database', geo_service.geoip_reader.stats)
+metrics.register_stats('identity_cache', identity_cache.stats)
+metrics.register_stats('enrichment_queue', enrichment_queue.stats)
+metrics.register_stats('attempt_buffer', attempt_writer.stats)
+metrics.register_stats('password_hasher', password_hasher.stats)
+metrics.register_stats('anomaly_engine', anomaly_engine.stats)
+metrics.register_stats('rate_limit', lambda: {**rate_limit_store.stats(), 'throttled': throttle_counter.total})
+metrics.register_stats('db_pool', lambda: pool_stats(db.engine))
+if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+    metrics.register_stats('db_replica_pool', lambda: pool_stats(db.engines[REPLICA_BIND]))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition; requires METRICS_TOKEN as a bearer token and is disabled without it."""
+    token = os.getenv('METRICS_TOKEN')
+    if not token:
+        return jsonify({'message': 'Metrics are disabled until METRICS_TOKEN is set'}), 403
+    if not bearer_authorized(request.headers.get('Authorization'), token):
+        return jsonify({'message': 'Invalid metrics token'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/geolocation/reload', methods=['POST'])
+def reload_geoip_database():
+    """Reopen the GeoIP reader now, called by update_geoip.py --notify after installing a new file."""
+    token = os.getenv('GEOIP_RELOAD_TOKEN')
+    if not token:
+        return jsonify({'message': 'Reloading is disabled until GEOIP_RELOAD_TOKEN is set'}), 403
+    if not bearer_authorized(request.headers.get('Authorization'), token):
+        return jsonify({'message': 'Invalid reload token'}), 401
+    geo_service.geoip_reader.reload()
+    geo_service.geoip_reader.get_reader()
+    return jsonify(geo_service.geoip_reader.stats())
+
 # Vercel serverless function handler
 def handler(event, context):
     return app(event, context)
 
 if __name__ == "__main__":
-    # Only run the app directly when in development
-    app.run(host='0.0.0.0', port=5000)
+    # Only run the app directly when in development. Serve it through `flask run`
+    # rather than from this __main__ module: spawned password hashing workers
+    # re-import the __main__ script, which would repeat all of the setup above in each
+    os.execv(sys.executable, [sys.executable, '-m', 'flask', '--app', os.path.abspath(__file__),
+                              'run', '--host', '0.0.0.0', '--port', '5000'])
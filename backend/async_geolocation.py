@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+import aiohttp
+from geolocation_service import GeolocationService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_URL = "http://ip-api.com/batch?fields=status,message,country,city,lat,lon,timezone,isp,query"
+# ip-api accepts at most 100 IPs per batch request
+MAX_BATCH_SIZE = 100
+# Batch latencies kept for the hedge delay, and how many are needed before it adapts
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.02
+# Seconds to back off after a 429 without an X-Ttl header, doubled per retry
+RATE_LIMIT_BACKOFF = 1.0
+
+class RateLimited(Exception):
+    """IP-API answered 429; retry_after is its X-Ttl in seconds, if sent."""
+
+    def __init__(self, retry_after: Optional[float]):
+        super().__init__(f"rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class AsyncGeolocationService(GeolocationService):
+    """
+    asyncio variant of GeolocationService for resolving many IPs at once,
+    with the same caches, MaxMind reader and settings.
+
+    lookup_many() answers what it can locally (cache, loopback addresses,
+    MaxMind) and sends only the misses to IP-API's batch endpoint, up to
+    batch_size IPs per request and max_concurrency requests at a time over
+    one pooled aiohttp session. A batch request still running after the
+    hedge delay is sent a second time and the first answer wins, so one
+    slow upstream request does not set the latency of the whole call. The
+    delay is the p95 of recent batch latencies, capped at hedge_delay so a
+    tail heavier than 5% still gets hedged. Hedges do not wait for a
+    concurrency slot, so at most 2 * max_concurrency requests are in
+    flight. Every request is bounded by request_timeout; hedge_delay=0
+    disables hedging.
+
+    IP-API's rate limit is honoured: X-Rl (requests left in the window) and
+    X-Ttl (seconds until it resets) are tracked from every response, no
+    request is hedged while fewer than max_concurrency requests are left,
+    and when none are left, or after a 429, new requests wait for the window
+    to reset. A rate limited batch is retried up to rate_limit_retries times.
+
+    Batches that still fail are not cached and their IPs map to None in
+    lookup_many(), so callers can tell "could not ask" from "IP-API has no
+    location for this IP" and try again later.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, batch_size: Optional[int] = None,
+                 request_timeout: Optional[float] = None, hedge_delay: Optional[float] = None,
+                 rate_limit_retries: int = 3):
+        super().__init__()
+        self.batch_url = os.getenv('IP_API_BATCH_URL', DEFAULT_BATCH_URL)
+        self.max_concurrency = max_concurrency or int(os.getenv('GEO_MAX_CONCURRENCY', 8))
+        self.batch_size = min(MAX_BATCH_SIZE, batch_size or int(os.getenv('GEO_BATCH_SIZE', MAX_BATCH_SIZE)))
+        self.request_timeout = request_timeout or float(os.getenv('GEO_REQUEST_TIMEOUT', 5.0))
+        # Longest wait before hedging, and the wait until enough batches were timed
+        self.max_hedge_delay = (hedge_delay if hedge_delay is not None
+                                else float(os.getenv('GEO_HEDGE_DELAY_MS', 500)) / 1000)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.rate_limit_retries = rate_limit_retries
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        # Requests left in IP-API's rate limit window, and when new requests may start again
+        self._rate_remaining: Optional[int] = None
+        self._resume_at = 0.0
+        self.batches = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.failed_batches = 0
+        self.rate_limited = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Pooled session, created in the running event loop on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=2 * self.max_concurrency, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds before a slow batch request is duplicated, None when hedging is off."""
+        if not self.max_hedge_delay:
+            return None
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return self.max_hedge_delay
+        ordered = sorted(self._latencies)
+        return min(self.max_hedge_delay, max(MIN_HEDGE_DELAY, ordered[int(len(ordered) * 0.95)]))
+
+    def _note_rate_limit(self, response: aiohttp.ClientResponse) -> Optional[float]:
+        """Track X-Rl/X-Ttl from a response; returns X-Ttl in seconds, if sent."""
+        try:
+            remaining = int(response.headers['X-Rl'])
+        except (KeyError, ValueError):
+            remaining = None
+        try:
+            ttl = float(response.headers['X-Ttl'])
+        except (KeyError, ValueError):
+            ttl = None
+        if remaining is not None:
+            self._rate_remaining = remaining
+            if remaining <= 0 and ttl is not None:
+                self._resume_at = max(self._resume_at, time.monotonic() + ttl)
+        return ttl
+
+    async def _wait_for_rate_limit(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            self._rate_remaining = None
+
+    def _can_hedge(self) -> bool:
+        """Whether the window has room for a duplicate besides every primary that may be in flight."""
+        return self._rate_remaining is None or self._rate_remaining > self.max_concurrency
+
+    async def _post_batch(self, session: aiohttp.ClientSession, ip_addresses: List[str]) -> List:
+        async with session.post(self.batch_url, json=ip_addresses) as response:
+            ttl = self._note_rate_limit(response)
+            if response.status == 429:
+                raise RateLimited(ttl)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        if not isinstance(data, list) or len(data) != len(ip_addresses):
+            raise ValueError(f"Unexpected batch response for {len(ip_addresses)} IPs")
+        return data
+
+    async def _fetch_batch(self, ip_addresses: List[str]) -> List:
+        """POST one batch, retrying after rate limiting; raises the last error when it still failed."""
+        session = self._get_session()
+        async with self._semaphore:
+            for attempt in range(self.rate_limit_retries + 1):
+                await self._wait_for_rate_limit()
+                try:
+                    return await self._hedged_post(session, ip_addresses)
+                except RateLimited as e:
+                    self.rate_limited += 1
+                    if attempt == self.rate_limit_retries:
+                        raise
+                    backoff = e.retry_after or RATE_LIMIT_BACKOFF * 2 ** attempt
+                    logger.warning(f"IP-API rate limited, retrying batch of {len(ip_addresses)} IPs in {backoff}s")
+                    self._resume_at = max(self._resume_at, time.monotonic() + backoff)
+
+    async def _hedged_post(self, session: aiohttp.ClientSession, ip_addresses: List[str]) -> List:
+        """POST one batch, hedged; raises the last error when every attempt failed."""
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self._post_batch(session, ip_addresses))
+        pending = {primary}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                # A duplicate would only spend the rate limit window faster
+                if not done and self._can_hedge():
+                    self.hedged += 1
+                    pending.add(asyncio.ensure_future(self._post_batch(session, ip_addresses)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        self._latencies.append(time.perf_counter() - start)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _resolve_batch(self, ip_addresses: List[str]) -> Optional[List[Optional[Dict]]]:
+        """
+        Location info per IP from one IP-API batch, None for IPs it has no
+        location for; None instead of a list when the batch request failed.
+        """
+        start = time.perf_counter()
+        self.batches += 1
+        try:
+            results = [self._parse_ip_api(item) for item in await self._fetch_batch(ip_addresses)]
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"IP-API batch lookup of {len(ip_addresses)} IPs timed out")
+            results = None
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"IP-API batch lookup of {len(ip_addresses)} IPs failed: {str(e)}")
+            results = None
+        if self.observe_lookup:
+            self.observe_lookup('ip_api_batch', time.perf_counter() - start)
+        return results
+
+    async def lookup_many(self, ip_addresses: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Location info for each distinct IP, without the per-request device
+        fields. IPs whose IP-API batch failed (error, timeout, rate limit) map
+        to None and are not cached, so a later call asks again.
+        """
+        results: Dict[str, Optional[Dict]] = {}
+        # Cache key -> IPs waiting on it; with prefix reuse one lookup answers the whole network
+        misses: Dict[str, List[str]] = {}
+        for ip_address in dict.fromkeys(ip_addresses):
+            location_info = self._local_result(ip_address)
+            if location_info is not None:
+                results[ip_address] = location_info
+                continue
+            cache_key = self._cache_key(ip_address)
+            if cache_key in misses:
+                misses[cache_key].append(ip_address)
+                continue
+            location_info = self.cache.get(cache_key)
+            if location_info is None:
+                start = time.perf_counter()
+                location_info = self._get_from_maxmind(ip_address)
+                if location_info is None:
+                    misses[cache_key] = [ip_address]
+                    continue
+                if self.observe_lookup:
+                    self.observe_lookup('maxmind', time.perf_counter() - start)
+                self.cache.set(cache_key, location_info)
+            results[ip_address] = dict(location_info)
+
+        keys = list(misses)
+        batches = [keys[offset:offset + self.batch_size] for offset in range(0, len(keys), self.batch_size)]
+        answers = await asyncio.gather(*(
+            self._resolve_batch([misses[cache_key][0] for cache_key in batch]) for batch in batches
+        ))
+        for batch, infos in zip(batches, answers):
+            if infos is None:
+                for cache_key in batch:
+                    for ip_address in misses[cache_key]:
+                        results[ip_address] = None
+                continue
+            for cache_key, location_info in zip(batch, infos):
+                if location_info is None:
+                    # Neither service has a location for it: cache the default values briefly
+                    location_info = self._get_unknown_info()
+                    self.cache.set(cache_key, location_info, ttl=self.negative_cache_ttl)
+                else:
+                    self.cache.set(cache_key, location_info)
+                for ip_address in misses[cache_key]:
+                    results[ip_address] = dict(location_info)
+        return results
+
+    async def lookup(self, ip_address: str) -> Optional[Dict]:
+        return (await self.lookup_many([ip_address]))[ip_address]
+
+    def stats(self) -> Dict:
+        """Batch, hedging and failure counters plus batch latency percentiles."""
+        ordered = sorted(self._latencies)
+        delay = self.hedge_delay()
+        return {
+            'batches': self.batches,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'timeouts': self.timeouts,
+            'failed_batches': self.failed_batches,
+            'rate_limited': self.rate_limited,
+            'rate_limit_remaining': self._rate_remaining,
+            'hedge_delay_ms': round(delay * 1000, 1) if delay is not None else None,
+            'p50_batch_ms': round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+            'p99_batch_ms': round(ordered[int(len(ordered) * 0.99)] * 1000, 1) if ordered else None,
+        }
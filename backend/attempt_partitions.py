@@ -0,0 +1,80 @@
+"""
+Monthly RANGE partitions of login_attempt on MySQL.
+
+Partitions are named pYYYYMM and hold the rows with timestamp in that month;
+a trailing pmax partition catches anything beyond the last month created.
+Future months are split off pmax ahead of time (while it is still empty) so
+reorganizing it never has to copy rows.
+"""
+from datetime import date, datetime
+from typing import List, Optional
+from sqlalchemy import text
+
+TABLE = 'login_attempt'
+# Empty partitions kept ready beyond the current month
+MONTHS_AHEAD = 3
+
+def month_start(moment) -> date:
+    return date(moment.year, moment.month, 1)
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+def partition_month(name: str) -> Optional[date]:
+    """Month held by a pYYYYMM partition; None for pmax or foreign names."""
+    try:
+        return datetime.strptime(name, 'p%Y%m').date()
+    except ValueError:
+        return None
+
+def partition_clause(month: date) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{add_months(month, 1):%Y-%m-%d}'))"
+
+def is_supported(connection) -> bool:
+    return connection.dialect.name == 'mysql'
+
+def partitioned_months(connection) -> List[date]:
+    """Months with a partition, oldest first; empty when the table is not partitioned."""
+    if not is_supported(connection):
+        return []
+    rows = connection.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+    ), {'table': TABLE}).all()
+    return sorted(month for month in (partition_month(row[0]) for row in rows) if month)
+
+def partition_table(connection, first_month: date, last_month: date):
+    """Rebuild the table as monthly partitions from first_month through last_month plus pmax."""
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = add_months(month, 1)
+    clauses = ',\n'.join([partition_clause(month) for month in months] +
+                         ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+    connection.execute(text(f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(timestamp)) (\n{clauses}\n)"))
+    return months
+
+def add_partitions(connection, through_month: date) -> List[date]:
+    """Split months up to through_month off pmax; returns the months added."""
+    existing = partitioned_months(connection)
+    if not existing:
+        return []
+    months = []
+    month = add_months(existing[-1], 1)
+    while month <= through_month:
+        months.append(month)
+        month = add_months(month, 1)
+    if months:
+        clauses = ', '.join([partition_clause(month) for month in months] +
+                            ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        connection.execute(text(f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO ({clauses})"))
+    return months
+
+def drop_partition(connection, month: date):
+    """Remove a month of rows at once; far cheaper than deleting them row by row."""
+    connection.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {partition_name(month)}"))
@@ -0,0 +1,159 @@
+import time
+import queue
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class BufferedAttemptWriter:
+    """
+    Write-behind buffer for login attempt rows.
+    Rows submitted on the request path are collected by a flusher thread and
+    handed to write_batch([row, ...]) once batch_size rows are waiting or
+    flush_interval seconds have passed, so the database sees one multi-row
+    insert per batch instead of one transaction per attempt. When the buffer
+    is full (or max_pending is 0) the row is written synchronously on the
+    caller's thread instead of being dropped. stop() writes whatever is
+    still buffered.
+
+    A batch that fails is retried up to max_retries times, waiting
+    retry_backoff seconds and doubling it each time, so a deadlock or a lost
+    connection does not lose audit rows. If it still fails its rows are
+    written one by one, and only rows that fail on their own are dropped
+    and counted as failed.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Dict]], None], max_pending: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 0.5, max_retries: int = 3,
+                 retry_backoff: float = 0.1):
+        self.write_batch = write_batch
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.submitted = 0
+        self.synchronous = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="attempt-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Dict) -> bool:
+        """
+        Buffer a row for the next batch. Returns False when it had to be
+        written synchronously because the buffer was full or disabled.
+        """
+        with self._lock:
+            self.submitted += 1
+        if self.max_pending > 0 and not self._stopping.is_set():
+            if self._thread is None:
+                self.start()
+            try:
+                self._queue.put_nowait(row)
+                return True
+            except queue.Full:
+                pass
+        with self._lock:
+            self.synchronous += 1
+        self._write([row])
+        return False
+
+    def _flush_loop(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    break
+                batch.append(row)
+            if batch:
+                self._write(batch)
+
+    def _write(self, rows: List[Dict]):
+        start = time.perf_counter()
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.write_batch(rows)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Failed to write batch of {len(rows)} login attempts, "
+                                 f"writing them one by one: {str(e)}")
+                    self._write_rows(rows)
+                    return
+                logger.warning(f"Retrying batch of {len(rows)} login attempts in {delay:.2f}s: {str(e)}")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                delay *= 2
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.written += len(rows)
+            self.batches += 1
+            self.write_seconds += elapsed
+
+    def _write_rows(self, rows: List[Dict]):
+        """Last resort for a failing batch: one write per row, so one bad row only loses itself."""
+        for row in rows:
+            try:
+                self.write_batch([row])
+            except Exception as e:
+                logger.error(f"Dropped login attempt for user {row.get('user_id')} "
+                             f"from {row.get('ip_address')}: {str(e)}")
+                with self._lock:
+                    self.failed += 1
+                continue
+            with self._lock:
+                self.written += 1
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Write every buffered row and stop the flusher thread."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        try:
+            # Wake the flusher so it does not wait out the flush interval
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'buffered': self._queue.qsize(),
+                'submitted': self.submitted,
+                'synchronous': self.synchronous,
+                'written': self.written,
+                'failed': self.failed,
+                'retries': self.retries,
+                'batches': self.batches,
+                'avg_batch_rows': round(self.written / max(1, self.batches), 1),
+                'avg_write_ms': round(self.write_seconds * 1000 / max(1, self.batches), 2)
+            }
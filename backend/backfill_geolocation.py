@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from sqlalchemy import and_, func, or_
+from app import app, db, LoginAttempt, build_enrichment_updates, write_enrichment_updates
+from async_geolocation import AsyncGeolocationService
+
+DEFAULT_CHECKPOINT = 'backfill_geolocation.checkpoint.json'
+
+def missing_coordinates():
+    """Attempts with no coordinates, or the 0.0/0.0 placeholder from failed lookups."""
+    return or_(
+        LoginAttempt.latitude.is_(None),
+        and_(LoginAttempt.latitude == 0, LoginAttempt.longitude == 0)
+    )
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically so an interrupted run never leaves it truncated."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def backfill_chunk(loop, geo_lookup, last_id, max_id, chunk_size):
+    """
+    Resolve and update one keyset page of attempts after last_id.
+    Returns (rows scanned, rows updated, unique IPs, failed lookups, next last_id).
+    When a lookup fails, next last_id stops just before the first row with that
+    IP, so a rerun retries it instead of skipping past it.
+    """
+    columns = (
+        LoginAttempt.id,
+        LoginAttempt.ip_address,
+        LoginAttempt.user_agent,
+        LoginAttempt.timestamp,
+        LoginAttempt.success,
+        LoginAttempt.country
+    )
+    rows = db.session.query(*columns).filter(
+        LoginAttempt.id > last_id,
+        LoginAttempt.id <= max_id,
+        missing_coordinates()
+    ).order_by(LoginAttempt.id).limit(chunk_size).all()
+    # End the read transaction before the slow lookups so no locks are held meanwhile
+    db.session.commit()
+    if not rows:
+        return 0, 0, 0, 0, max_id
+
+    # MaxMind answers locally; the misses go to IP-API in concurrent batch requests
+    results = loop.run_until_complete(geo_lookup.lookup_many(sorted({row.ip_address for row in rows})))
+    failed_ips = {ip for ip, info in results.items() if info is None}
+    if failed_ips:
+        first_failed_id = min(row.id for row in rows if row.ip_address in failed_ips)
+        # Rows past the first failure are still written; the rerun skips them as they have coordinates
+        scanned_rows = [row for row in rows if row.id < first_failed_id]
+        next_last_id = scanned_rows[-1].id if scanned_rows else last_id
+    else:
+        scanned_rows = rows
+        next_last_id = rows[-1].id
+
+    # Re-read the page under short row locks, skipping rows enriched in the meantime
+    locked_rows = db.session.query(*columns).filter(
+        LoginAttempt.id.in_([row.id for row in rows]),
+        missing_coordinates()
+    ).with_for_update(skip_locked=True).all()
+    # Rows whose lookup failed keep their missing coordinates for the rerun
+    locked_rows = [row for row in locked_rows if row.ip_address not in failed_ips]
+    updates, deltas = build_enrichment_updates(locked_rows, results, score_anomalies=False)
+    write_enrichment_updates(updates, deltas)
+    return len(scanned_rows), len(updates), len(results), len(failed_ips), next_last_id
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill geolocation for login_attempt rows with missing or 0.0 coordinates."
+    )
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per keyset page and UPDATE batch (default: 1000)")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent IP-API batch requests (default: 8)")
+    parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks to limit load")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help=f"Checkpoint file (default: {DEFAULT_CHECKPOINT})")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start from the first row")
+    args = parser.parse_args()
+
+    with app.app_context():
+        checkpoint = None if args.restart else load_checkpoint(args.checkpoint)
+        if checkpoint:
+            print(f"Resuming after id {checkpoint['last_id']} (up to id {checkpoint['max_id']})")
+        else:
+            # Rows inserted after the run starts are enriched by the application itself
+            max_id = db.session.query(func.max(LoginAttempt.id)).scalar() or 0
+            checkpoint = {'last_id': 0, 'max_id': max_id, 'scanned': 0, 'updated': 0}
+            save_checkpoint(args.checkpoint, checkpoint)
+
+        # One event loop for the whole run so HTTP connections are reused across chunks
+        loop = asyncio.new_event_loop()
+        geo_lookup = AsyncGeolocationService(max_concurrency=args.workers)
+        started = time.perf_counter()
+        scanned_this_run = 0
+        try:
+            while checkpoint['last_id'] < checkpoint['max_id']:
+                chunk_started = time.perf_counter()
+                scanned, updated, unique_ips, failed, last_id = backfill_chunk(
+                    loop, geo_lookup, checkpoint['last_id'], checkpoint['max_id'], args.chunk_size
+                )
+                checkpoint['last_id'] = last_id
+                checkpoint['scanned'] += scanned
+                checkpoint['updated'] += updated
+                save_checkpoint(args.checkpoint, checkpoint)
+                scanned_this_run += scanned
+
+                if scanned:
+                    chunk_rate = scanned / max(time.perf_counter() - chunk_started, 1e-9)
+                    overall_rate = scanned_this_run / max(time.perf_counter() - started, 1e-9)
+                    print(f"{datetime.now()}: up to id {last_id}: {updated}/{scanned} rows updated, "
+                          f"{unique_ips} unique IPs, {chunk_rate:.0f} rows/s (overall {overall_rate:.0f} rows/s)")
+                if failed:
+                    print(f"{datetime.now()}: {failed} IP lookups failed, checkpoint kept at id {last_id}; "
+                          f"run again to retry from there")
+                    sys.exit(1)
+                if args.sleep:
+                    time.sleep(args.sleep)
+        finally:
+            loop.run_until_complete(geo_lookup.close())
+            loop.close()
+
+        print(f"Backfill complete: {checkpoint['updated']} of {checkpoint['scanned']} rows updated")
+        os.remove(args.checkpoint)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Interrupted, run again to resume from the checkpoint")
+        sys.exit(1)
@@ -0,0 +1,135 @@
+"""
+Anomaly scoring replay over a synthetic login history.
+
+Generates attempts for many users in time order: most from each user's home
+city, some from trips with realistic flight times, and failed attempts from attacker
+cities. Replays them through the in-memory AnomalyEngine and, for a prefix of
+the history, through the per-login history query it replaces (last successful
+login per user from an indexed SQLite table), and reports attempts/second,
+per-attempt latency and how many attempts were flagged.
+
+Usage: python benchmarks/bench_anomaly_engine.py [--attempts N] [--users N]
+                                                 [--max-users N] [--baseline-attempts N]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from statistics import quantiles
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from anomaly_engine import AnomalyEngine
+
+CITIES = [
+    ('London', 'United Kingdom', 51.51, -0.13), ('Paris', 'France', 48.86, 2.35),
+    ('New York', 'United States', 40.71, -74.01), ('San Francisco', 'United States', 37.77, -122.42),
+    ('Tokyo', 'Japan', 35.68, 139.69), ('Sydney', 'Australia', -33.87, 151.21),
+    ('Sao Paulo', 'Brazil', -23.55, -46.63), ('Mumbai', 'India', 19.08, 72.88),
+    ('Lagos', 'Nigeria', 6.52, 3.38), ('Berlin', 'Germany', 52.52, 13.40),
+    ('Moscow', 'Russia', 55.76, 37.62), ('Singapore', 'Singapore', 1.35, 103.82),
+]
+DEVICES = ['Windows 10 Desktop', 'Mac OS X 14 Desktop', 'iOS 17 iPhone', 'Android 14 Samsung']
+
+def generate(attempts, users, seed=7):
+    """Yield (user_id, timestamp, latitude, longitude, success, country, device) in time order."""
+    rng = random.Random(seed)
+    homes = [rng.randrange(len(CITIES)) for _ in range(users)]
+    devices = [rng.choice(DEVICES) for _ in range(users)]
+    # user -> (city, arrival, departure, back home); nobody logs in while flying
+    trips = {}
+    flight = timedelta(hours=20)
+    moment = datetime(2024, 1, 1)
+    produced = 0
+    while produced < attempts:
+        moment += timedelta(seconds=rng.expovariate(1 / 2.0))
+        user = rng.randrange(users)
+        roll = rng.random()
+        if roll < 0.03:
+            # Attacker: failed login from a random city
+            city = CITIES[rng.randrange(len(CITIES))]
+            produced += 1
+            yield user, moment, city[2], city[3], False, city[1], rng.choice(DEVICES)
+            continue
+        if roll < 0.04 and user not in trips:
+            arrival = moment + flight
+            departure = arrival + timedelta(days=rng.randint(2, 10))
+            trips[user] = (rng.randrange(len(CITIES)), arrival, departure, departure + flight)
+        trip = trips.get(user)
+        if trip and trip[3] <= moment:
+            trips.pop(user)
+            trip = None
+        if trip and (moment < trip[1] or trip[2] <= moment):
+            continue
+        city = CITIES[trip[0] if trip else homes[user]]
+        jitter = rng.uniform(-0.2, 0.2)
+        produced += 1
+        yield user, moment, city[2] + jitter, city[3] + jitter, rng.random() < 0.9, city[1], devices[user]
+
+def replay_engine(history, max_users):
+    engine = AnomalyEngine(max_users=max_users)
+    latencies = []
+    start = time.perf_counter()
+    for user, moment, latitude, longitude, success, country, device in history:
+        began = time.perf_counter()
+        engine.score(user, moment, latitude, longitude, success, country=country, device=device, accuracy_km=20)
+        latencies.append(time.perf_counter() - began)
+    return time.perf_counter() - start, latencies, engine.stats()
+
+def replay_history_query(history):
+    """Score each attempt by querying the user's last successful login, as a per-login lookup would."""
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE attempt (user_id INT, timestamp TEXT, latitude REAL, longitude REAL, "
+                       "success INT, country TEXT, device TEXT)")
+    connection.execute("CREATE INDEX idx_user_success_timestamp ON attempt (user_id, success, timestamp)")
+    # Holds only the state loaded from the query for the attempt being scored
+    engine = AnomalyEngine(max_users=1)
+    latencies = []
+    start = time.perf_counter()
+    for user, moment, latitude, longitude, success, country, device in history:
+        began = time.perf_counter()
+        row = connection.execute(
+            "SELECT timestamp, latitude, longitude, country, device FROM attempt "
+            "WHERE user_id = ? AND success = 1 ORDER BY timestamp DESC LIMIT 1", (user,)
+        ).fetchone()
+        if row:
+            previous = datetime.fromisoformat(row[0])
+            engine.score(user, previous, row[1], row[2], True, country=row[3], device=row[4], accuracy_km=20)
+            engine.score(user, moment, latitude, longitude, success, country=country, device=device, accuracy_km=20)
+        connection.execute("INSERT INTO attempt VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (user, moment.isoformat(), latitude, longitude, int(success), country, device))
+        latencies.append(time.perf_counter() - began)
+    return time.perf_counter() - start, latencies
+
+def report(label, elapsed, latencies):
+    cuts = quantiles(latencies, n=100)
+    print(f"{label:<24} {len(latencies) / elapsed:12.0f} {cuts[49] * 1e6:9.1f} {cuts[98] * 1e6:9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--max-users', type=int, default=100000, help="Engine state capacity")
+    parser.add_argument('--baseline-attempts', type=int, default=50000,
+                        help="Attempts replayed through the history query baseline (0 to skip)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    history = list(generate(args.attempts, args.users))
+    print(f"Generated {len(history)} attempts for {args.users} users in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'':<24} {'attempts/s':>12} {'p50 us':>9} {'p99 us':>9}")
+    elapsed, latencies, stats = replay_engine(history, args.max_users)
+    report('engine', elapsed, latencies)
+    if args.baseline_attempts:
+        elapsed, latencies = replay_history_query(history[:args.baseline_attempts])
+        report(f'history query ({args.baseline_attempts})', elapsed, latencies)
+
+    print(f"\nScored {stats['scored']}, flagged {stats['flagged']} "
+          f"({stats['flagged'] / max(1, stats['scored']):.2%}), {stats['first_seen']} first logins, "
+          f"{stats['users']} users in memory, {stats['evictions']} evictions")
+
+if __name__ == "__main__":
+    main()
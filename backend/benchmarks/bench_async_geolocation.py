@@ -0,0 +1,116 @@
+"""
+Bulk IP geolocation, one lookup per IP on a thread pool versus the async
+service's batched lookup_many, offline.
+
+Half of the IPs (--maxmind-share) are covered by a synthetic MaxMind
+database from offline_fixtures, the rest fall through to the local fake
+ip-api server, where --slow-rate of the requests take --slow-ms. IPs are
+resolved in calls of --call-size distinct IPs, as the geolocation backfill
+does per chunk, and the benchmark reports IPs/second, fallback HTTP
+requests and p50/p99 latency per call for the thread pool, the async
+service without hedging and with hedging.
+
+Usage: python benchmarks/bench_async_geolocation.py [--ips N] [--call-size N] [--concurrency N]
+                                                    [--latency-ms MS] [--slow-rate R] [--slow-ms MS]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from statistics import quantiles
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from fake_ip_api import FakeIPAPIServer
+from offline_fixtures import write_geoip_db
+
+def test_ips(count, maxmind_share, seed=5):
+    """Public IPv4 addresses the fixture covers, and 10.0.0.0/8 ones it does not."""
+    rng = random.Random(seed)
+    ips = set()
+    while len(ips) < count:
+        if rng.random() < maxmind_share:
+            first = rng.choice([octet for octet in range(1, 224) if octet not in (10, 127)])
+        else:
+            first = 10
+        ips.add(f"{first}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}")
+    return sorted(ips, key=lambda ip_address: rng.random())
+
+def run_thread_pool(calls, concurrency):
+    from geolocation_service import GeolocationService
+    service = GeolocationService()
+    latencies = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for call in calls:
+            started = time.perf_counter()
+            list(executor.map(service.get_location_info, call))
+            latencies.append(time.perf_counter() - started)
+    return latencies, None
+
+def run_async(calls, concurrency, hedge_delay):
+    from async_geolocation import AsyncGeolocationService
+    service = AsyncGeolocationService(max_concurrency=concurrency, hedge_delay=hedge_delay)
+
+    async def resolve_all():
+        latencies = []
+        try:
+            for call in calls:
+                started = time.perf_counter()
+                await service.lookup_many(call)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            await service.close()
+        return latencies
+
+    return asyncio.run(resolve_all()), service.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ips', type=int, default=5000)
+    parser.add_argument('--call-size', type=int, default=250, help="Distinct IPs per lookup call")
+    parser.add_argument('--maxmind-share', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=30.0, help="Fake ip-api response latency")
+    parser.add_argument('--slow-rate', type=float, default=0.05, help="Share of fallback requests that are slow")
+    parser.add_argument('--slow-ms', type=float, default=1000.0)
+    args = parser.parse_args()
+
+    server = FakeIPAPIServer(latency=args.latency_ms / 1000, slow_rate=args.slow_rate,
+                             slow_latency=args.slow_ms / 1000).start()
+    directory = tempfile.mkdtemp()
+    os.environ['GEOIP_DB_PATH'] = os.path.join(directory, 'GeoLite2-City.mmdb')
+    write_geoip_db(os.environ['GEOIP_DB_PATH'])
+    os.environ['IP_API_URL'] = server.url_template
+    os.environ['IP_API_BATCH_URL'] = server.batch_url
+    logging.getLogger('geolocation_service').setLevel(logging.ERROR)
+
+    ips = test_ips(args.ips, args.maxmind_share)
+    calls = [ips[offset:offset + args.call_size] for offset in range(0, len(ips), args.call_size)]
+    print(f"{len(ips)} IPs in {len(calls)} calls, {args.maxmind_share:.0%} in the MaxMind fixture, "
+          f"fallback {args.latency_ms:.0f} ms with {args.slow_rate:.0%} at {args.slow_ms:.0f} ms\n")
+    print(f"{'':<24} {'IPs/s':>9} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9}")
+
+    runs = [
+        (f'thread pool ({args.concurrency})', lambda: run_thread_pool(calls, args.concurrency)),
+        ('async batch', lambda: run_async(calls, args.concurrency, hedge_delay=0)),
+        ('async batch + hedging', lambda: run_async(calls, args.concurrency, hedge_delay=None)),
+    ]
+    for label, run in runs:
+        requests_before = server.requests
+        started = time.perf_counter()
+        latencies, stats = run()
+        elapsed = time.perf_counter() - started
+        cuts = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(f"{label:<24} {len(ips) / elapsed:9.0f} {server.requests - requests_before:9d} "
+              f"{cuts[49] * 1000:9.1f} {cuts[98] * 1000:9.1f}")
+        if stats and stats['hedged']:
+            print(f"{'':<24} hedged {stats['hedged']} batches, {stats['hedge_wins']} hedges won, "
+                  f"delay {stats['hedge_delay_ms']} ms")
+
+if __name__ == "__main__":
+    main()
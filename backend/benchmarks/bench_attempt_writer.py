@@ -0,0 +1,114 @@
+"""
+Login attempt insert throughput: one INSERT + COMMIT per attempt vs the
+BufferedAttemptWriter's batched multi-row inserts.
+
+Runs against a throwaway SQLite file by default; pass --database-url to
+measure a real server (e.g. mysql+mysqlconnector://user:pw@localhost/bench).
+The table is created and dropped by the benchmark.
+
+Usage: python benchmarks/bench_attempt_writer.py [--attempts N] [--threads N]
+                                                 [--batch-size N] [--database-url URL]
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import threading
+from datetime import datetime
+
+from sqlalchemy import (create_engine, MetaData, Table, Column, Integer, String,
+                        Boolean, DateTime, func, select)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from attempt_writer import BufferedAttemptWriter
+
+metadata = MetaData()
+attempts = Table(
+    'bench_login_attempt', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('ip_address', String(45), nullable=False),
+    Column('user_agent', String(512)),
+    Column('timestamp', DateTime),
+    Column('success', Boolean)
+)
+
+def make_row(i):
+    return {
+        'user_id': i % 1000 + 1,
+        'ip_address': f"198.51.{i // 256 % 256}.{i % 256}",
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) bench',
+        'timestamp': datetime.utcnow(),
+        'success': i % 10 == 0
+    }
+
+def run_threads(threads, work):
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent request threads")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    parser.add_argument('--database-url', help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(url, pool_size=args.threads + 1)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    per_thread = args.attempts // args.threads
+    total = per_thread * args.threads
+    print(f"{total} attempts from {args.threads} threads on {engine.dialect.name}\n")
+
+    def per_row(index):
+        for i in range(per_thread):
+            with engine.begin() as connection:
+                connection.execute(attempts.insert(), make_row(index * per_thread + i))
+
+    elapsed = run_threads(args.threads, per_row)
+    print(f"per-row commit:  {total / elapsed:10,.0f} inserts/s ({elapsed:.2f} s)")
+
+    def write_batch(rows):
+        with engine.begin() as connection:
+            connection.execute(attempts.insert(), rows)
+
+    writer = BufferedAttemptWriter(write_batch, max_pending=total, batch_size=args.batch_size,
+                                   flush_interval=args.flush_interval)
+
+    def buffered(index):
+        for i in range(per_thread):
+            writer.submit(make_row(index * per_thread + i))
+
+    start = time.perf_counter()
+    submit_elapsed = run_threads(args.threads, buffered)
+    writer.stop(timeout=300)
+    drain_elapsed = time.perf_counter() - start
+    stats = writer.stats()
+    print(f"buffered submit: {total / submit_elapsed:10,.0f} attempts/s on the request path "
+          f"({submit_elapsed / total * 1e6:.1f} us each)")
+    print(f"buffered write:  {total / drain_elapsed:10,.0f} inserts/s end to end ({drain_elapsed:.2f} s, "
+          f"{stats['batches']} batches, avg {stats['avg_batch_rows']} rows, {stats['avg_write_ms']} ms each)")
+
+    with engine.connect() as connection:
+        stored = connection.execute(select(func.count()).select_from(attempts)).scalar()
+    print(f"\nrows stored: {stored} (expected {2 * total}), synchronous fallbacks: {stats['synchronous']}")
+    metadata.drop_all(engine)
+    engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
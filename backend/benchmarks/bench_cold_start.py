@@ -0,0 +1,111 @@
+"""
+Cold start cost of the backend, as a fresh serverless instance pays it.
+
+Each trial runs in a new interpreter: it imports app, then serves one first
+request through the Flask test client (a login for an unknown email, which
+touches the rate limiter and the database) against a SQLite file prepared
+once up front. Reports import time, first-request latency and the whole
+process time (median and max over the trials), and which of the libraries
+meant to load on first use were already imported. --eager imports those
+libraries before app, as startup used to, for comparison.
+
+Exits non-zero when one of the lazily loaded libraries is imported at
+startup or a median exceeds --max-import-ms or --max-first-request-ms, so it
+can run as a startup regression check in CI.
+
+Usage: python benchmarks/bench_cold_start.py [--trials N] [--eager] [--database-url URL]
+                                             [--max-import-ms MS] [--max-first-request-ms MS]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import subprocess
+from statistics import median
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only needed by the enrichment workers, never at import or on the request path
+LAZY_MODULES = ('geoip2', 'maxminddb', 'requests', 'user_agents')
+
+def trial(eager):
+    """Runs in the child interpreter; prints one JSON line of timings."""
+    started = time.perf_counter()
+    if eager:
+        import geoip2.database, requests, user_agents
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    imported = time.perf_counter()
+    loaded = [name for name in LAZY_MODULES if name in sys.modules]
+    response = app.app.test_client().post(
+        '/api/auth/login', json={'email': 'cold-start@example.com', 'password': 'not-a-password'}
+    )
+    served = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'first_request_ms': (served - imported) * 1000,
+        'status': response.status_code,
+        'lazy_modules_loaded': loaded,
+    }))
+
+def run_trial(env, eager):
+    started = time.perf_counter()
+    command = [sys.executable, os.path.abspath(__file__), '--trial'] + (['--eager'] if eager else [])
+    output = subprocess.run(command, env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+def prepare_database(env):
+    subprocess.run(
+        [sys.executable, '-c', "from app import app, db\nwith app.app_context(): db.create_all()"],
+        env=env, cwd=BACKEND_DIR, capture_output=True, check=True
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trials', type=int, default=10)
+    parser.add_argument('--eager', action='store_true', help="Import geoip2, requests and user_agents up front")
+    parser.add_argument('--database-url', help="Already migrated database (default: a temporary SQLite file)")
+    parser.add_argument('--max-import-ms', type=float, help="Fail when the median import time is above this")
+    parser.add_argument('--max-first-request-ms', type=float,
+                        help="Fail when the median first-request latency is above this")
+    parser.add_argument('--trial', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial:
+        trial(args.eager)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(directory, 'cold_start.db')}"
+        env.setdefault('SECRET_KEY', 'cold-start-benchmark')
+        if not args.database_url:
+            prepare_database(env)
+        results = [run_trial(env, args.eager) for _ in range(args.trials)]
+
+    print(f"{args.trials} cold starts{' with eager imports' if args.eager else ''}, first request: "
+          f"POST /api/auth/login -> {results[0]['status']}\n")
+    print(f"{'':<20} {'median ms':>10} {'max ms':>10}")
+    for key, label in (('import_ms', 'import app'), ('first_request_ms', 'first request'),
+                       ('process_ms', 'whole process')):
+        values = [result[key] for result in results]
+        print(f"{label:<20} {median(values):10.1f} {max(values):10.1f}")
+
+    failures = []
+    loaded = sorted({name for result in results for name in result['lazy_modules_loaded']})
+    if loaded and not args.eager:
+        failures.append(f"imported at startup: {', '.join(loaded)}")
+    import_ms = median(result['import_ms'] for result in results)
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"median import {import_ms:.1f} ms > {args.max_import_ms} ms")
+    first_request_ms = median(result['first_request_ms'] for result in results)
+    if args.max_first_request_ms is not None and first_request_ms > args.max_first_request_ms:
+        failures.append(f"median first request {first_request_ms:.1f} ms > {args.max_first_request_ms} ms")
+    if failures:
+        sys.exit("\nFAILED: " + "; ".join(failures))
+
+if __name__ == "__main__":
+    main()
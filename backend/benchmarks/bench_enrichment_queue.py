@@ -0,0 +1,75 @@
+"""
+Throughput and backpressure of the background enrichment queue, offline.
+
+Resolves IPs through GeolocationService against the local fake ip-api
+server (no MaxMind database), with a no-op batch writer, and reports
+attempts/second, lookups saved by deduplication and rejected submissions.
+
+Usage: python benchmarks/bench_enrichment_queue.py [--attempts N] [--ips N] [--workers N]
+                                                   [--latency-ms MS] [--max-pending N]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_ip_api import FakeIPAPIServer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=20000)
+    parser.add_argument('--ips', type=int, default=2000, help="Distinct IPs among the attempts")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Fake ip-api response latency")
+    parser.add_argument('--max-pending', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    server = FakeIPAPIServer(latency=args.latency_ms / 1000).start()
+    os.environ['IP_API_URL'] = server.url_template
+    os.environ['GEOIP_DB_PATH'] = os.path.join(os.path.dirname(__file__), 'missing.mmdb')
+
+    from geolocation_service import GeolocationService
+    from enrichment_queue import EnrichmentQueue
+    logging.getLogger('geolocation_service').setLevel(logging.ERROR)
+
+    applied = []
+    service = GeolocationService()
+    enrichment = EnrichmentQueue(
+        resolve=service.get_location_info,
+        apply_batch=lambda batch: applied.append(len(batch)),
+        workers=args.workers,
+        max_pending=args.max_pending,
+        batch_size=args.batch_size,
+        flush_interval=0.2
+    )
+
+    # Skewed traffic: a few IPs account for most attempts
+    rng = random.Random(7)
+    ips = [f"203.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(args.ips)]
+    weights = [1 / (rank + 1) for rank in range(args.ips)]
+    attempts = rng.choices(ips, weights=weights, k=args.attempts)
+
+    start = time.perf_counter()
+    for ip_address in attempts:
+        enrichment.submit(ip_address)
+    submit_elapsed = time.perf_counter() - start
+    enrichment.stop(timeout=300)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    stats = enrichment.stats()
+    print(f"{args.attempts} attempts over {args.ips} IPs, {args.workers} workers, "
+          f"{args.latency_ms:.0f} ms fallback latency")
+    print(f"submit: {args.attempts / submit_elapsed:,.0f} attempts/s on the request path "
+          f"({submit_elapsed / args.attempts * 1e6:.1f} us each)")
+    print(f"drain:  {args.attempts / elapsed:,.0f} attempts/s end to end, {elapsed:.2f} s total")
+    print(f"lookups: {stats['resolved'] + stats['failed']} resolved, {server.requests} fallback requests, "
+          f"{stats['deduplicated']} deduplicated, {stats['rejected']} rejected (queue full)")
+    print(f"batches: {len(applied)}, avg {sum(applied) / max(1, len(applied)):.1f} IPs per batch update")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Per-lookup latency of opening a GeoIP reader for every lookup (the old
+behaviour) versus the shared memory-mapped reader.
+
+Usage: python benchmarks/bench_geoip_reader.py [--db PATH] [--lookups N]
+Defaults to GEOIP_DB_PATH, or the GeoLite2 database bundled with
+maxminddb-geolite2 when that is not set.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import geoip2.database
+import geoip2.errors
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geoip_reader import SharedGeoIPReader
+
+def default_db_path():
+    if os.getenv('GEOIP_DB_PATH') and os.path.exists(os.getenv('GEOIP_DB_PATH')):
+        return os.getenv('GEOIP_DB_PATH')
+    from _maxminddb_geolite2 import geolite2_database
+    return geolite2_database()
+
+def random_ips(count, seed=42):
+    rng = random.Random(seed)
+    return [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(count)]
+
+def timed_lookups(ips, lookup):
+    timings = []
+    for ip in ips:
+        start = time.perf_counter()
+        try:
+            lookup(ip)
+        except geoip2.errors.AddressNotFoundError:
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def report(name, timings):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:<28} mean {statistics.mean(timings) * 1e6:9.1f} us   "
+          f"p50 {statistics.median(timings) * 1e6:9.1f} us   p99 {p99 * 1e6:9.1f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=None, help="Path to a GeoLite2-City.mmdb file")
+    parser.add_argument('--lookups', type=int, default=2000, help="Lookups per variant (default: 2000)")
+    args = parser.parse_args()
+
+    db_path = args.db or default_db_path()
+    ips = random_ips(args.lookups)
+    print(f"Database: {db_path} ({os.path.getsize(db_path) / 1e6:.1f} MB), {len(ips)} lookups\n")
+
+    def open_per_lookup(ip):
+        with geoip2.database.Reader(db_path) as reader:
+            return reader.city(ip)
+
+    # The per-lookup variant is slow, so it runs on a sample
+    report("reader per lookup", timed_lookups(ips[:max(100, len(ips) // 10)], open_per_lookup))
+
+    shared = SharedGeoIPReader(db_path)
+    shared.get_reader()
+    report("shared mmap reader", timed_lookups(ips, shared.city))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+GeoIP update cost against the local MaxMind stand-in (fake_maxmind.py):
+install time and peak Python memory of update_geoip.update_database versus
+the old download, which read the whole archive through response.content.
+The updater's behaviour (resume, checksum, atomic swap, reload on notify)
+is covered by tests/test_update_geoip.py.
+
+Usage: python benchmarks/bench_geoip_update.py
+"""
+import os
+import sys
+import time
+import tarfile
+import argparse
+import tempfile
+import tracemalloc
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from fake_maxmind import FakeMaxMindServer, build_archive
+import update_geoip
+
+def legacy_download(url, db_path):
+    """The previous updater: whole archive in memory, extracted over the live file."""
+    response = requests.get(url)
+    with open(f"{db_path}.tar.gz", 'wb') as f:
+        f.write(response.content)
+    with tarfile.open(f"{db_path}.tar.gz", 'r:gz') as tar:
+        for member in tar.getmembers():
+            if member.name.endswith('.mmdb'):
+                with open(db_path, 'wb') as out:
+                    out.write(tar.extractfile(member).read())
+    os.remove(f"{db_path}.tar.gz")
+
+def measured(fn, *args):
+    """(result, seconds, peak traced MB) of fn(*args)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    archive = build_archive(build_epoch=1700000000)
+    server = FakeMaxMindServer(archive).start()
+    url = server.url
+    print(f"Fixture archive {len(archive) / 1e6:.1f} MB\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'GeoLite2-City.mmdb')
+
+        _, legacy_seconds, legacy_peak = measured(legacy_download, url, os.path.join(directory, 'legacy.mmdb'))
+        _, seconds, peak = measured(update_geoip.update_database, db_path, url)
+        print(f"{'':<22} {'seconds':>8} {'peak MB':>8}")
+        print(f"{'response.content':<22} {legacy_seconds:8.2f} {legacy_peak:8.1f}")
+        print(f"{'streaming':<22} {seconds:8.2f} {peak:8.1f}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Login password verification throughput at several process pool sizes.
+
+Simulates a burst of concurrent logins (one request thread per client)
+verifying PBKDF2 hashes, inline on the request threads (workers=0) and in
+PasswordHasher's process pool, and reports logins/second, verify latency
+and the time calls spent queued for a hashing slot.
+
+Usage: python benchmarks/bench_password_hasher.py [--logins N] [--threads N]
+                                                  [--workers 0,1,2,4] [--iterations N]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from statistics import quantiles
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from password_hasher import PasswordHasher
+
+def run_burst(hasher, pwhash, logins, threads):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = logins // threads
+
+    def client():
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            hasher.verify(pwhash, 'correct horse battery staple')
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent login requests")
+    parser.add_argument('--workers', default='0,1,2,4', help="Comma separated pool sizes; 0 hashes inline")
+    parser.add_argument('--iterations', type=int, default=100000, help="PBKDF2 iterations")
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins from {args.threads} threads, pbkdf2:sha256:{args.iterations}, "
+          f"{os.cpu_count()} CPUs\n")
+    print(f"{'workers':>8} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'avg queue ms':>13}")
+    for workers in [int(value) for value in args.workers.split(',')]:
+        hasher = PasswordHasher(workers=workers, max_pending=args.threads, iterations=args.iterations)
+        pwhash = hasher.hash('correct horse battery staple')
+        # Start every pool process before timing
+        run_burst(hasher, pwhash, max(workers, 1) * 2, max(workers, 1))
+        baseline = hasher.stats()
+        elapsed, latencies = run_burst(hasher, pwhash, args.logins, args.threads)
+        stats = hasher.stats()
+        completed = stats['completed'] - baseline['completed']
+        queue_ms = (stats['avg_queue_ms'] * stats['completed'] - baseline['avg_queue_ms'] * baseline['completed'])
+        cuts = quantiles(latencies, n=100)
+        label = 'inline' if workers == 0 else str(workers)
+        print(f"{label:>8} {len(latencies) / elapsed:10.1f} {cuts[49] * 1000:9.1f} {cuts[94] * 1000:9.1f} "
+              f"{cuts[98] * 1000:9.1f} {max(0.0, queue_ms / max(1, completed)):13.1f}")
+        hasher.shutdown()
+
+if __name__ == "__main__":
+    main()
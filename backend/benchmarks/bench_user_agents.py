@@ -0,0 +1,62 @@
+"""
+Per-request user agent parsing cost, uncached vs the memoized
+GeolocationService.parse_user_agent.
+
+Requests are drawn from a corpus of real user agent strings
+(fixtures/user_agents.txt by default) with a skewed, Zipf-like popularity.
+
+Usage: python benchmarks/bench_user_agents.py [--corpus FILE] [--requests N]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geolocation_service import GeolocationService
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'user_agents.txt')
+
+def load_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def per_request_us(parse, traffic):
+    start = time.perf_counter()
+    for user_agent in traffic:
+        parse(user_agent)
+    return (time.perf_counter() - start) / len(traffic) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="File with one user agent per line")
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    rng = random.Random(3)
+    traffic = rng.choices(corpus, weights=[1 / (rank + 1) for rank in range(len(corpus))], k=args.requests)
+    print(f"{len(corpus)} distinct user agents, {len(traffic)} requests\n")
+
+    service = GeolocationService()
+    # The first parse in a process also pays for compiling the parser's regexes
+    start = time.perf_counter()
+    service._parse_user_agent(corpus[0])
+    print(f"first parse:           {(time.perf_counter() - start) * 1e6:8.1f} us")
+
+    # Distinct strings defeat any cache inside the parser library itself
+    unique_traffic = [f"{user_agent} bench/{i}" for i, user_agent in enumerate(traffic)]
+    print(f"unique strings:        {per_request_us(service._parse_user_agent, unique_traffic):8.1f} us/request")
+    print(f"repeated strings:      {per_request_us(service._parse_user_agent, traffic):8.1f} us/request (parser library cache only)")
+
+    service.user_agent_cache.clear()
+    print(f"memoized, cold start:  {per_request_us(service.parse_user_agent, traffic):8.1f} us/request")
+
+    service.user_agent_cache.clear()
+    service.warm_user_agent_cache(corpus)
+    print(f"memoized, warmed:      {per_request_us(service.parse_user_agent, traffic):8.1f} us/request")
+    print(f"\ncache: {service.user_agent_cache.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Local stand-in for the ip-api.com JSON endpoint, for offline benchmarks.
+
+Serves GET /json/<ip> with a deterministic fake location derived from the
+IP, and POST /batch with a JSON list of IPs (or {"query": ip} objects) like
+ip-api's batch endpoint, after an optional artificial latency. slow_rate of
+the requests take slow_latency instead, to model a slow upstream tail. With
+rate_limit set, the batch endpoint allows that many requests per
+rate_window seconds, sends X-Rl/X-Ttl like ip-api and answers 429 past it. Point
+the backend at it with IP_API_URL=http://127.0.0.1:<port>/json/{} and
+IP_API_BATCH_URL=http://127.0.0.1:<port>/batch
+
+Usage: python benchmarks/fake_ip_api.py [--port 8765] [--latency-ms 50] [--failure-rate 0.0]
+                                        [--slow-rate 0.0] [--slow-ms 1000]
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COUNTRIES = [
+    ('United States', 'New York', 40.71, -74.01, 'America/New_York'),
+    ('Germany', 'Berlin', 52.52, 13.40, 'Europe/Berlin'),
+    ('India', 'Mumbai', 19.08, 72.88, 'Asia/Kolkata'),
+    ('Brazil', 'Sao Paulo', -23.55, -46.63, 'America/Sao_Paulo'),
+    ('Japan', 'Tokyo', 35.68, 139.69, 'Asia/Tokyo'),
+    ('Russia', 'Moscow', 55.76, 37.62, 'Europe/Moscow'),
+    ('China', 'Beijing', 39.90, 116.41, 'Asia/Shanghai'),
+    ('Nigeria', 'Lagos', 6.52, 3.38, 'Africa/Lagos'),
+]
+
+def fake_location(ip_address):
+    """Deterministic fake ip-api response body for an IP."""
+    digest = hashlib.md5(ip_address.encode()).digest()
+    country, city, lat, lon, timezone = COUNTRIES[digest[0] % len(COUNTRIES)]
+    return {
+        'status': 'success',
+        'query': ip_address,
+        'country': country,
+        'city': city,
+        'lat': lat + (digest[1] - 128) / 256,
+        'lon': lon + (digest[2] - 128) / 256,
+        'timezone': timezone,
+        'isp': f"Fake ISP {digest[3] % 16}"
+    }
+
+class FakeIPAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, failure_rate=0.0, slow_rate=0.0, slow_latency=1.0,
+                 rate_limit=None, rate_window=60.0):
+        super().__init__(('127.0.0.1', port), FakeIPAPIHandler)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rate_limited = 0
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self.batch_requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url_template(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/json/{{}}"
+
+    @property
+    def batch_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/batch"
+
+    def delay(self):
+        latency = self.slow_latency if random.random() < self.slow_rate else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def take_rate_limit(self):
+        """(allowed, X-Rl/X-Ttl headers) for one batch request, or (True, {}) without a limit."""
+        if self.rate_limit is None:
+            return True, {}
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.rate_window:
+                self._window_start, self._window_requests = now, 0
+            self._window_requests += 1
+            allowed = self._window_requests <= self.rate_limit
+            if not allowed:
+                self.rate_limited += 1
+            ttl = max(0.0, self.rate_window - (now - self._window_start))
+            remaining = max(0, self.rate_limit - self._window_requests)
+        return allowed, {'X-Rl': str(remaining), 'X-Ttl': f"{ttl:.2f}"}
+
+    def result(self, ip_address):
+        if random.random() < self.failure_rate:
+            return {'status': 'fail', 'message': 'reserved range', 'query': ip_address}
+        return fake_location(ip_address)
+
+    def start(self):
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class FakeIPAPIHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server._lock:
+            self.server.requests += 1
+        self.server.delay()
+        self._send(self.server.result(self.path.rsplit('/', 1)[-1]))
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/batch':
+            self.send_error(404)
+            return
+        queries = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        with self.server._lock:
+            self.server.requests += 1
+            self.server.batch_requests += 1
+        allowed, headers = self.server.take_rate_limit()
+        if not allowed:
+            self._send({'message': 'rate limited'}, 429, headers)
+            return
+        self.server.delay()
+        ips = [query['query'] if isinstance(query, dict) else query for query in queries]
+        self._send([self.server.result(ip_address) for ip_address in ips], headers=headers)
+
+    def _send(self, body, status=200, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. a hedged request that lost the race
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Share of requests answered after --slow-ms")
+    parser.add_argument('--slow-ms', type=float, default=1000.0)
+    args = parser.parse_args()
+
+    server = FakeIPAPIServer(args.port, args.latency_ms / 1000, args.failure_rate,
+                             args.slow_rate, args.slow_ms / 1000)
+    print(f"Fake ip-api listening on {server.url_template}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
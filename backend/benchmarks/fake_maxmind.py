@@ -0,0 +1,149 @@
+"""
+Local stand-in for the MaxMind GeoIP download endpoint, for offline checks
+of update_geoip.py.
+
+Serves a fixture archive (GeoLite2-City_<date>/GeoLite2-City.mmdb built by
+offline_fixtures.write_geoip_db) at /GeoLite2-City.tar.gz, with ETag and
+Range / If-Range support, and its checksum at /GeoLite2-City.tar.gz.sha256.
+drop_after=N cuts the next archive response off after N bytes, like a
+dropped connection. POSTs to /reload are recorded as worker notifications.
+Point the updater at it with
+GEOIP_DOWNLOAD_URL=http://127.0.0.1:<port>/GeoLite2-City.tar.gz
+
+Usage: python benchmarks/fake_maxmind.py [--port 8766]
+"""
+import io
+import os
+import json
+import time
+import hashlib
+import tarfile
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from offline_fixtures import write_geoip_db
+
+ARCHIVE_PATH = '/GeoLite2-City.tar.gz'
+
+def build_archive(build_epoch=None) -> bytes:
+    """tar.gz laid out like a GeoLite2-City release, holding a synthetic database."""
+    build_epoch = build_epoch or int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'GeoLite2-City.mmdb')
+        write_geoip_db(db_path, build_epoch)
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            release = f"GeoLite2-City_{datetime.utcfromtimestamp(build_epoch):%Y%m%d}"
+            tar.add(db_path, arcname=f"{release}/GeoLite2-City.mmdb")
+    return buffer.getvalue()
+
+class FakeMaxMindServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, archive: bytes, port=0):
+        super().__init__(('127.0.0.1', port), FakeMaxMindHandler)
+        self.set_archive(archive)
+        self.drop_after = None
+        self.on_notify = None
+        self.archive_requests = 0
+        self.checksum_requests = 0
+        self.bytes_sent = 0
+        self.notifications = []
+        self._lock = threading.Lock()
+
+    def set_archive(self, archive: bytes, checksum: str = None):
+        """Publish a release; checksum overrides the published SHA-256, e.g. to simulate corruption."""
+        self.archive = archive
+        self.checksum = checksum or hashlib.sha256(archive).hexdigest()
+        self.etag = f'"{hashlib.sha256(archive).hexdigest()[:16]}"'
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}{ARCHIVE_PATH}"
+
+    @property
+    def notify_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/reload"
+
+    def start(self):
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class FakeMaxMindHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        if self.path == f"{ARCHIVE_PATH}.sha256":
+            with server._lock:
+                server.checksum_requests += 1
+            self._send(200, f"{server.checksum}  GeoLite2-City.tar.gz\n".encode(), 'text/plain')
+        elif self.path == ARCHIVE_PATH:
+            self._send_archive()
+        else:
+            self._send(404, b'', 'text/plain')
+
+    def _send_archive(self):
+        server = self.server
+        archive, etag = server.archive, server.etag
+        with server._lock:
+            server.archive_requests += 1
+            drop_after, server.drop_after = server.drop_after, None
+        start = 0
+        requested = self.headers.get('Range', '')
+        if requested.startswith('bytes=') and self.headers.get('If-Range', etag) == etag:
+            start = int(requested[len('bytes='):].split('-')[0])
+            if start >= len(archive):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(archive)}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        body = archive[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f"bytes {start}-{len(archive) - 1}/{len(archive)}")
+        self.send_header('Content-Type', 'application/gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if drop_after is not None:
+            body = body[:drop_after]
+            self.close_connection = True
+        self.wfile.write(body)
+        with server._lock:
+            server.bytes_sent += len(body)
+
+    def do_POST(self):
+        if self.path != '/reload':
+            self._send(404, b'', 'text/plain')
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.notifications.append(payload)
+        if self.server.on_notify:
+            self.server.on_notify(payload)
+        self._send(200, b'{}', 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    server = FakeMaxMindServer(build_archive(), args.port)
+    print(f"Fake MaxMind download at {server.url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
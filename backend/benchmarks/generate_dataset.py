@@ -0,0 +1,161 @@
+"""
+Synthetic user and login_attempt data for load testing.
+
+Creates --users users (plus an admin) and --attempts login attempts spread
+over the last --days days, with skewed distributions: a few IPs and users
+account for most attempts, the busiest IPs behave like attackers (almost
+only failures), user agents follow benchmarks/fixtures/user_agents.txt with
+a long tail, and countries follow offline_fixtures.COUNTRIES. Attempts are
+written already enriched from the offline fixtures, in multi-row inserts,
+and the hourly rollups are rebuilt at the end.
+
+Every user's password is PASSWORD; the admin is ADMIN_EMAIL. Runs against a
+SQLite file under benchmarks/data by default; pass --database-url for MySQL
+(run migrate.py against it first to get the partitioned production schema).
+
+Usage: python benchmarks/generate_dataset.py [--users N] [--attempts N] [--days N]
+                                             [--database-url URL] [--reset]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from offline_fixtures import ip_location
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BENCH_DIR, 'data', 'loadtest.db')}"
+PASSWORD = 'loadtest-password'
+ADMIN_EMAIL = 'admin@loadtest.local'
+INSERT_CHUNK = 10000
+# Share of the busiest IPs that behave like credential stuffing sources
+ATTACKER_SHARE = 0.005
+
+def user_email(index):
+    return f"user{index}@loadtest.local"
+
+def ip_pool(size, seed=11):
+    """Distinct public IPv4 addresses, most frequent first."""
+    rng = random.Random(seed)
+    addresses = set()
+    while len(addresses) < size:
+        first = rng.randrange(1, 224)
+        if first in (10, 127):
+            continue
+        addresses.add(f"{first}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}")
+    return sorted(addresses, key=lambda address: rng.random())
+
+def zipf_weights(size, exponent=1.1):
+    """Cumulative weights where item i is chosen in proportion to 1 / (i + 1) ** exponent."""
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+def skewed_choice(rng, items, cum_weights):
+    return items[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+def load_user_agents():
+    with open(os.path.join(BENCH_DIR, 'fixtures', 'user_agents.txt')) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--attempts', type=int, default=1000000, help="Login attempts (1M to 10M for release checks)")
+    parser.add_argument('--days', type=int, default=90, help="Attempts are spread over this many days up to now")
+    parser.add_argument('--ips', type=int, help="Distinct IPs (default: attempts / 20)")
+    parser.add_argument('--database-url', default=os.getenv('LOADTEST_DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--reset', action='store_true', help="Drop and recreate the tables first")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.database_url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(args.database_url[len('sqlite:///'):]) or '.', exist_ok=True)
+    os.environ['DATABASE_URL'] = args.database_url
+    # Hash the shared password inline; one hash serves every user
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    from app import (app, db, User, LoginAttempt, geo_service, pack_ip, password_hasher, rebuild_rollups)
+    import geo_cells
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(User.id).first() is not None:
+            sys.exit(f"{args.database_url} already has users; pass --reset to regenerate")
+
+        started = time.perf_counter()
+        pwhash = password_hasher.hash(PASSWORD)
+        oldest = datetime.utcnow() - timedelta(days=args.days)
+        users = [{'username': 'loadtest-admin', 'email': ADMIN_EMAIL, 'password': pwhash,
+                  'is_admin': True, 'created_at': oldest}]
+        users += [{'username': f"user{index}", 'email': user_email(index), 'password': pwhash,
+                   'is_admin': False, 'created_at': oldest + timedelta(seconds=rng.randrange(args.days * 86400))}
+                  for index in range(args.users)]
+        for offset in range(0, len(users), INSERT_CHUNK):
+            db.session.execute(User.__table__.insert(), users[offset:offset + INSERT_CHUNK])
+            db.session.commit()
+        user_ids = db.session.query(User.id).filter(User.is_admin == False).order_by(User.id).all()
+        user_ids = [row.id for row in user_ids]
+        db.session.commit()
+        print(f"Created {len(users)} users in {time.perf_counter() - started:.1f}s")
+
+        ips = ip_pool(args.ips or max(100, args.attempts // 20), args.seed)
+        ip_weights = zipf_weights(len(ips))
+        attackers = set(ips[:max(1, int(len(ips) * ATTACKER_SHARE))])
+        user_agents = load_user_agents()
+        ua_weights = zipf_weights(len(user_agents), exponent=1.5)
+        user_weights = zipf_weights(len(user_ids), exponent=0.8)
+        parsed_agents = {ua: geo_service.parse_user_agent(ua) for ua in user_agents}
+
+        started = time.perf_counter()
+        moment = oldest
+        step = args.days * 86400 / args.attempts
+        written = 0
+        while written < args.attempts:
+            rows = []
+            for _ in range(min(INSERT_CHUNK, args.attempts - written)):
+                moment += timedelta(seconds=rng.expovariate(1 / step))
+                ip_address = skewed_choice(rng, ips, ip_weights)
+                attacker = ip_address in attackers
+                user_agent = skewed_choice(rng, user_agents, ua_weights)
+                device_info, browser_info = parsed_agents[user_agent]
+                location = ip_location(ip_address)
+                rows.append({
+                    # Attackers spray accounts evenly; real users log in with a skew
+                    'user_id': rng.choice(user_ids) if attacker else skewed_choice(rng, user_ids, user_weights),
+                    'ip_address': ip_address,
+                    'ip_bin': pack_ip(ip_address),
+                    'user_agent': user_agent,
+                    'timestamp': moment,
+                    'success': rng.random() < (0.02 if attacker else 0.9),
+                    'location': f"{location['city']}, {location['country']}",
+                    'device_info': device_info,
+                    'browser_info': browser_info,
+                    'latitude': location['latitude'],
+                    'longitude': location['longitude'],
+                    'geo_cell': geo_cells.cell_for(location['latitude'], location['longitude']),
+                    'accuracy_radius': location['accuracy_radius'],
+                    'city': location['city'],
+                    'country': location['country'],
+                    'timezone': location['time_zone'],
+                    'isp': location['isp'],
+                })
+            db.session.execute(LoginAttempt.__table__.insert(), rows)
+            db.session.commit()
+            written += len(rows)
+            elapsed = time.perf_counter() - started
+            print(f"\r{written}/{args.attempts} attempts, {written / elapsed:.0f} rows/s", end='', flush=True)
+        print()
+
+        # Bulk inserts skip the rollup listeners
+        started = time.perf_counter()
+        counted = rebuild_rollups(oldest.replace(minute=0, second=0, microsecond=0), moment + timedelta(hours=1))
+        print(f"Rebuilt rollups for {counted} attempts in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
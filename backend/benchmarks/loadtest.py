@@ -0,0 +1,315 @@
+"""
+Load test for the auth and analytics API, fully offline.
+
+Starts the backend against a database filled by generate_dataset.py, with
+GeoIP lookups served from a synthetic MaxMind DB (offline_fixtures.py) and
+ip-api replaced by the local stand-in (fake_ip_api.py), then drives
+/api/auth/login, /api/auth/analytics and /api/admin/users from concurrent
+clients for --duration seconds. Logins come from skewed client IPs, with a
+share of wrong passwords, so throttling and enrichment run as in production.
+
+The backend trusts one proxy hop (TRUSTED_PROXIES=1), so each client's
+X-Forwarded-For address is its IP for rate limiting and geolocation. The run
+fails when more than --max-throttled-share of logins were throttled.
+
+Reports requests/second and p50/p95/p99 latency per route, and saves the
+results with the commit they were measured on to benchmarks/results/, so
+runs can be compared with --compare (a results file, or 'latest').
+
+Login latency is mostly PBKDF2 cost. Generate the dataset and run the load
+test with the same PASSWORD_HASH_ITERATIONS, or every login also rehashes.
+
+Usage: python benchmarks/loadtest.py [--duration S] [--concurrency N] [--mix login=6,analytics=2,users=2]
+                                     [--database-url URL] [--base-url URL] [--compare FILE|latest]
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import platform
+import tempfile
+import argparse
+import threading
+import subprocess
+from collections import Counter, defaultdict
+from datetime import datetime
+from statistics import quantiles
+
+import requests
+from sqlalchemy import create_engine, func, select, table
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+from fake_ip_api import FakeIPAPIServer
+from offline_fixtures import write_geoip_db
+from generate_dataset import (ADMIN_EMAIL, DEFAULT_DATABASE_URL, PASSWORD, ip_pool, load_user_agents,
+                              skewed_choice, user_email, zipf_weights)
+
+SERVER_CODE = "import sys, app; app.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"
+ANALYTICS_QUERIES = [{'range': '24h', 'bucket': 'hour'}, {'range': '7d', 'bucket': 'hour'},
+                     {'range': '30d', 'bucket': 'day'}, {'range': '60m', 'bucket': 'minute'}]
+# Statuses that are expected outcomes rather than failures
+EXPECTED_STATUSES = {'login': {200, 401, 429}, 'analytics': {200, 304}, 'users': {200}}
+WRONG_PASSWORD_SHARE = 0.15
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def git_revision():
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], cwd=BACKEND_DIR) != 0
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def dataset_size(database_url):
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        users = connection.execute(select(func.count()).select_from(table('user'))).scalar()
+        attempts = connection.execute(select(func.count()).select_from(table('login_attempt'))).scalar()
+    engine.dispose()
+    return users, attempts
+
+def start_server(database_url, workdir):
+    """Run the backend on a free port with offline geolocation; returns (process, base URL, log path)."""
+    geoip_path = os.path.join(workdir, 'GeoLite2-City.mmdb')
+    networks, _ = write_geoip_db(geoip_path)
+    ip_api = FakeIPAPIServer().start()
+    port = free_port()
+    log_path = os.path.join(workdir, 'server.log')
+    # Clients are told apart by X-Forwarded-For, as if behind one reverse proxy
+    env = dict(os.environ, DATABASE_URL=database_url, GEOIP_DB_PATH=geoip_path, IP_API_URL=ip_api.url_template,
+               TRUSTED_PROXIES='1')
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(port)], cwd=BACKEND_DIR, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"Backend exited with status {process.returncode}, see {log_path}")
+        try:
+            requests.get(f"{base_url}/api/auth/analytics", timeout=1)
+            print(f"Backend on {base_url} (GeoIP fixture with {networks} networks, log: {log_path})")
+            return process, base_url, log_path
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"Backend did not start within 60s, see {log_path}")
+
+class LoadClient(threading.Thread):
+    """One simulated client issuing a weighted mix of requests until the deadline."""
+
+    def __init__(self, base_url, token, routes, weights, users, ips, ip_weights, user_agents, seed, record):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.admin_headers = {'Authorization': f"Bearer {token}"}
+        self.routes = routes
+        self.weights = weights
+        self.users = users
+        self.ips = ips
+        self.ip_weights = ip_weights
+        self.user_agents = user_agents
+        self.rng = random.Random(seed)
+        self.record = record
+        self.session = requests.Session()
+        self.users_cursor = None
+        self.deadline = 0.0
+
+    def login(self):
+        index = self.rng.randrange(self.users)
+        wrong = self.rng.random() < WRONG_PASSWORD_SHARE
+        return self.session.post(f"{self.base_url}/api/auth/login", json={
+            'email': user_email(index), 'password': 'wrong-password' if wrong else PASSWORD
+        }, headers={
+            'X-Forwarded-For': skewed_choice(self.rng, self.ips, self.ip_weights),
+            'User-Agent': self.rng.choice(self.user_agents),
+        }, timeout=30)
+
+    def analytics(self):
+        return self.session.get(f"{self.base_url}/api/auth/analytics", params=self.rng.choice(ANALYTICS_QUERIES),
+                                headers=self.admin_headers, timeout=30)
+
+    def users_page(self):
+        # Either start over or keep paging, as an admin scrolling the user list would
+        params = {'cursor': self.users_cursor} if self.users_cursor and self.rng.random() < 0.8 else {}
+        response = self.session.get(f"{self.base_url}/api/admin/users", params=params,
+                                    headers=self.admin_headers, timeout=30)
+        if response.status_code == 200:
+            self.users_cursor = response.json().get('next_cursor')
+        return response
+
+    def run(self):
+        actions = {'login': self.login, 'analytics': self.analytics, 'users': self.users_page}
+        while time.perf_counter() < self.deadline:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                response = actions[route]()
+                status, cache = response.status_code, response.headers.get('X-Cache')
+            except requests.RequestException as e:
+                status, cache = type(e).__name__, None
+            self.record(route, started, time.perf_counter() - started, status, cache)
+
+def summarize(samples, routes, elapsed):
+    summary = {}
+    for route in routes:
+        entries = samples.get(route, [])
+        latencies = sorted(latency for latency, _, _ in entries)
+        statuses = Counter(str(status) for _, status, _ in entries)
+        errors = sum(count for status, count in statuses.items()
+                     if not status.isdigit() or int(status) not in EXPECTED_STATUSES[route])
+        cuts = quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0] if latencies else 0.0] * 99
+        summary[route] = {
+            'requests': len(entries),
+            'errors': errors,
+            'rps': round(len(entries) / elapsed, 2),
+            'p50_ms': round(cuts[49] * 1000, 2),
+            'p95_ms': round(cuts[94] * 1000, 2),
+            'p99_ms': round(cuts[98] * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            'statuses': dict(statuses),
+            'cache': dict(Counter(cache for _, _, cache in entries if cache)),
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"\n{'route':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for route, stats in summary.items():
+        statuses = ' '.join(f"{status}:{count}" for status, count in sorted(stats['statuses'].items()))
+        print(f"{route:<10} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9.1f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}  {statuses}")
+
+def print_comparison(previous, summary):
+    print(f"\nCompared with {previous['meta']['revision'][:12]} ({previous['meta']['started_at']}):")
+    print(f"{'route':<10} {'req/s':>16} {'p95 ms':>18} {'p99 ms':>18}")
+    for route, stats in summary.items():
+        before = previous['routes'].get(route)
+        if not before:
+            continue
+
+        def change(key):
+            if not before[key]:
+                return f"{stats[key]:.1f}"
+            return f"{before[key]:.1f}->{stats[key]:.1f} ({(stats[key] / before[key] - 1) * 100:+.0f}%)"
+        print(f"{route:<10} {change('rps'):>16} {change('p95_ms'):>18} {change('p99_ms'):>18}")
+
+def latest_result(exclude=None):
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    paths = sorted(os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR) if name.endswith('.json'))
+    paths = [path for path in paths if path != exclude]
+    return paths[-1] if paths else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Seconds of traffic before measuring")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--mix', default='login=6,analytics=2,users=2', help="Relative weight of each route")
+    parser.add_argument('--database-url', default=os.getenv('LOADTEST_DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--base-url', help="Drive an already running backend instead of starting one")
+    parser.add_argument('--compare', help="Results file to compare with, or 'latest'")
+    parser.add_argument('--no-save', action='store_true', help="Do not write a results file")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--max-throttled-share', type=float, default=0.5,
+                        help="Fail when more than this share of logins got 429 (default: 0.5)")
+    args = parser.parse_args()
+
+    mix = dict(part.split('=') for part in args.mix.split(','))
+    unknown = set(mix) - set(EXPECTED_STATUSES)
+    if unknown:
+        parser.error(f"Unknown routes in --mix: {', '.join(sorted(unknown))}")
+    routes, weights = list(mix), [float(weight) for weight in mix.values()]
+
+    users, attempts = dataset_size(args.database_url)
+    if not users:
+        sys.exit(f"No users in {args.database_url}; run benchmarks/generate_dataset.py first")
+    print(f"Dataset: {users} users, {attempts} login attempts")
+
+    process = None
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    base_url = args.base_url
+    if base_url is None:
+        process, base_url, _ = start_server(args.database_url, workdir)
+    try:
+        response = requests.post(f"{base_url}/api/auth/login",
+                                 json={'email': ADMIN_EMAIL, 'password': PASSWORD}, timeout=60)
+        if response.status_code != 200:
+            sys.exit(f"Admin login failed with HTTP {response.status_code}: {response.text[:200]}")
+        token = response.json()['token']
+
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        measure_from = time.perf_counter() + args.warmup
+
+        def record(route, started, latency, status, cache):
+            if started >= measure_from:
+                with lock:
+                    samples[route].append((latency, status, cache))
+
+        ips = ip_pool(max(100, attempts // 20), args.seed)
+        ip_weights = zipf_weights(len(ips))
+        user_agents = load_user_agents()
+        clients = [LoadClient(base_url, token, routes, weights, users - 1, ips, ip_weights, user_agents,
+                              args.seed + index, record) for index in range(args.concurrency)]
+        for client in clients:
+            client.deadline = measure_from + args.duration
+            client.start()
+        print(f"{args.concurrency} clients, {args.warmup:.0f}s warmup + {args.duration:.0f}s measured, mix {args.mix}")
+        for client in clients:
+            client.join()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    summary = summarize(samples, routes, args.duration)
+    print_summary(summary)
+    result = {
+        'meta': {
+            'revision': git_revision(),
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': args.database_url.split('://')[0],
+            'users': users,
+            'login_attempts': attempts,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'mix': mix,
+            'password_hash_iterations': os.getenv('PASSWORD_HASH_ITERATIONS', 'default'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'routes': summary,
+    }
+    path = None
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{result['meta']['revision'][:8]}.json")
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {path}")
+    if args.compare:
+        previous_path = latest_result(exclude=path) if args.compare == 'latest' else args.compare
+        if previous_path:
+            with open(previous_path) as f:
+                print_comparison(json.load(f), summary)
+        else:
+            print("\nNo earlier results to compare with")
+
+    # Mostly 429s means the run measured the throttling fast path, not logins
+    login = summary.get('login')
+    if login and login['requests']:
+        throttled = login['statuses'].get('429', 0) / login['requests']
+        if throttled > args.max_throttled_share:
+            sys.exit(f"\nFAILED: {throttled:.0%} of logins were throttled (max {args.max_throttled_share:.0%}); "
+                     f"check TRUSTED_PROXIES and the LOGIN_*_LIMIT settings of the backend")
+
+if __name__ == "__main__":
+    main()
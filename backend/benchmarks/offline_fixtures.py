@@ -0,0 +1,173 @@
+"""
+Offline stand-ins for the external geolocation data used by the load test.
+
+network_location() gives every IPv4 /16 network a deterministic synthetic
+location, and write_geoip_db() writes those locations as a GeoLite2-City
+shaped MaxMind DB, so the backend's memory-mapped reader serves real lookups
+without a license key or a download. The writer covers only what the reader
+needs: an IPv4 search tree with 32-bit records, and strings, doubles,
+unsigned integers, maps and arrays in the data section.
+
+Usage: python benchmarks/offline_fixtures.py OUTPUT.mmdb
+"""
+import sys
+import time
+import struct
+import hashlib
+from typing import Dict, Optional, Tuple
+
+# (country, ISO code, city, latitude, longitude, time zone, weight): weights skew traffic
+COUNTRIES = [
+    ('United States', 'US', 'New York', 40.71, -74.01, 'America/New_York', 30),
+    ('Germany', 'DE', 'Berlin', 52.52, 13.40, 'Europe/Berlin', 10),
+    ('India', 'IN', 'Mumbai', 19.08, 72.88, 'Asia/Kolkata', 12),
+    ('Brazil', 'BR', 'Sao Paulo', -23.55, -46.63, 'America/Sao_Paulo', 8),
+    ('Japan', 'JP', 'Tokyo', 35.68, 139.69, 'Asia/Tokyo', 6),
+    ('Russia', 'RU', 'Moscow', 55.76, 37.62, 'Europe/Moscow', 9),
+    ('China', 'CN', 'Beijing', 39.90, 116.41, 'Asia/Shanghai', 14),
+    ('Nigeria', 'NG', 'Lagos', 6.52, 3.38, 'Africa/Lagos', 4),
+    ('United Kingdom', 'GB', 'London', 51.51, -0.13, 'Europe/London', 5),
+    ('Australia', 'AU', 'Sydney', -33.87, 151.21, 'Australia/Sydney', 2),
+]
+_COUNTRY_SLOTS = [index for index, country in enumerate(COUNTRIES) for _ in range(country[6])]
+
+def network_location(first_octet: int, second_octet: int) -> Dict:
+    """Deterministic location for the /16 network first_octet.second_octet.0.0."""
+    digest = hashlib.md5(bytes((first_octet, second_octet))).digest()
+    country, iso_code, city, latitude, longitude, time_zone, _ = COUNTRIES[
+        _COUNTRY_SLOTS[digest[0] % len(_COUNTRY_SLOTS)]
+    ]
+    return {
+        'country': country,
+        'iso_code': iso_code,
+        'city': city,
+        'latitude': round(latitude + (digest[1] - 128) / 64, 4),
+        'longitude': round(longitude + (digest[2] - 128) / 64, 4),
+        'accuracy_radius': 5 + digest[3] % 100,
+        'time_zone': time_zone,
+        'isp': f"Synthetic ISP {digest[4] % 32}",
+    }
+
+def ip_location(ip_address: str) -> Dict:
+    first, second = (int(part) for part in ip_address.split('.')[:2])
+    return network_location(first, second)
+
+# MaxMind DB data section encoding
+def _control(type_number: int, size: int) -> bytes:
+    if size < 29:
+        size_bits, extra = size, b''
+    elif size < 285:
+        size_bits, extra = 29, bytes((size - 29,))
+    elif size < 65821:
+        size_bits, extra = 30, struct.pack('>H', size - 285)
+    else:
+        size_bits, extra = 31, struct.pack('>I', size - 65821)[1:]
+    if type_number <= 7:
+        return bytes(((type_number << 5) | size_bits,)) + extra
+    return bytes((size_bits, type_number - 7)) + extra
+
+class Uint(int):
+    """Unsigned integer encoded as a specific type: 16, 32 or 64 bits."""
+
+    def __new__(cls, value: int, bits: int):
+        instance = super().__new__(cls, value)
+        instance.bits = bits
+        return instance
+
+_UINT_TYPES = {16: 5, 32: 6, 64: 9}
+
+def encode(value) -> bytes:
+    if isinstance(value, str):
+        data = value.encode()
+        return _control(2, len(data)) + data
+    if isinstance(value, float):
+        return _control(3, 8) + struct.pack('>d', value)
+    if isinstance(value, int):
+        if value < 0:
+            raise ValueError("Only unsigned integers are supported")
+        data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+        if isinstance(value, Uint):
+            type_number = _UINT_TYPES[value.bits]
+        else:
+            type_number = 5 if value < 1 << 16 else 6 if value < 1 << 32 else 9
+        return _control(type_number, len(data)) + data
+    if isinstance(value, dict):
+        return _control(7, len(value)) + b''.join(encode(k) + encode(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return _control(11, len(value)) + b''.join(encode(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+def city_record(location: Dict) -> Dict:
+    """GeoIP2 City record for a network_location() result."""
+    return {
+        'city': {'names': {'en': location['city']}},
+        'country': {'iso_code': location['iso_code'], 'names': {'en': location['country']}},
+        'location': {
+            'accuracy_radius': location['accuracy_radius'],
+            'latitude': location['latitude'],
+            'longitude': location['longitude'],
+            'time_zone': location['time_zone'],
+        },
+    }
+
+def write_geoip_db(path: str, build_epoch: Optional[int] = None) -> Tuple[int, int]:
+    """Write a City database with one record per public IPv4 /16; returns (networks, bytes)."""
+    data = bytearray()
+    offsets = {}
+    for first in range(1, 224):
+        if first in (10, 127):
+            continue
+        for second in range(256):
+            offsets[(first, second)] = len(data)
+            data += encode(city_record(network_location(first, second)))
+
+    # Binary trie over the first 16 address bits; node 0 is the root
+    nodes = [[None, None]]
+    for (first, second), offset in offsets.items():
+        prefix = (first << 8) | second
+        node = 0
+        for depth in range(15, 0, -1):
+            bit = (prefix >> depth) & 1
+            if nodes[node][bit] is None:
+                nodes.append([None, None])
+                nodes[node][bit] = ('node', len(nodes) - 1)
+            node = nodes[node][bit][1]
+        nodes[node][prefix & 1] = ('data', offset)
+
+    node_count = len(nodes)
+    tree = bytearray()
+    for node in nodes:
+        for record in node:
+            if record is None:
+                value = node_count
+            elif record[0] == 'node':
+                value = record[1]
+            else:
+                value = node_count + 16 + record[1]
+            tree += struct.pack('>I', value)
+
+    # libmaxminddb insists on the exact metadata integer types
+    metadata = {
+        'binary_format_major_version': Uint(2, 16),
+        'binary_format_minor_version': Uint(0, 16),
+        'build_epoch': Uint(build_epoch or int(time.time()), 64),
+        'database_type': 'GeoLite2-City',
+        'description': {'en': 'Synthetic load test fixture'},
+        'ip_version': Uint(4, 16),
+        'languages': ['en'],
+        'node_count': Uint(node_count, 32),
+        'record_size': Uint(32, 16),
+    }
+    with open(path, 'wb') as f:
+        f.write(tree)
+        f.write(b'\x00' * 16)
+        f.write(data)
+        f.write(b'\xab\xcd\xefMaxMind.com')
+        f.write(encode(metadata))
+    return len(offsets), len(tree) + 16 + len(data)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    networks, size = write_geoip_db(sys.argv[1])
+    print(f"Wrote {networks} networks ({size / 1e6:.1f} MB) to {sys.argv[1]}")
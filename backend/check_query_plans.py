@@ -0,0 +1,98 @@
+"""
+Check that the hot login_attempt queries use an index.
+
+Drives the analytics, listing and enrichment code paths in-process against the
+configured database, captures every SELECT they issue, and runs EXPLAIN on
+each one. A query that reads login_attempt with a full table scan fails the
+check (exit status 1). Run it after migrate.py, ideally on a database with
+realistic volume: on a near-empty table MySQL may prefer a scan regardless.
+
+Usage: python check_query_plans.py
+"""
+import re
+import sys
+from sqlalchemy import event
+from app import (app, db, User, LoginAttempt, create_token, apply_enrichment, warm_anomaly_engine,
+                 warm_user_agent_cache)
+
+HOT_REQUESTS = (
+    '/api/auth/analytics?range=24h&bucket=hour',
+    '/api/auth/analytics?range=60m&bucket=minute',
+    '/api/auth/analytics?range=30d&bucket=day',
+    '/api/admin/login-attempts?user_id={user_id}',
+    '/api/admin/login-attempts?user_id={user_id}&since=2000-01-01T00:00:00',
+    '/api/admin/login-attempts?success=false&since=2000-01-01T00:00:00',
+    '/api/admin/login-attempts?ip_address={ip_address}',
+    '/api/admin/login-attempts?ip_address=10.0.0.0/8',
+    '/api/auth/analytics/clusters?zoom=2',
+    '/api/auth/analytics/clusters?zoom=9&bbox=-0.5,51.3,0.3,51.7',
+    '/api/auth/analytics/clusters?zoom=9&bbox=179.5,-17,-179.5,-16',
+)
+
+def capture_selects(engine, run):
+    """Run a callable and return the (statement, parameters) of each SELECT on login_attempt."""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'login_attempt' in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        run()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+def full_scans(connection, statement, parameters):
+    """Plan lines that read login_attempt without an index; empty when the plan is fine."""
+    if connection.dialect.name == 'sqlite':
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        details = [row[-1] for row in plan]
+        return details, [d for d in details if re.match(r'SCAN login_attempt\b', d) and 'USING' not in d]
+    plan = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+    details = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in plan]
+    return details, [d for row, d in zip(plan, details)
+                     if row['table'] == 'login_attempt' and row['type'] == 'ALL']
+
+def main():
+    with app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+        if admin is None:
+            print("No admin user found; create one with create_admin.py first")
+            sys.exit(1)
+        sample = LoginAttempt.query.first()
+        token = create_token(admin.id)
+        user_id = sample.user_id if sample else admin.id
+        ip_address = sample.ip_address if sample else '203.0.113.7'
+        engine = db.engine
+        db.session.commit()
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def run_requests():
+        for path in HOT_REQUESTS:
+            response = client.get(path.format(user_id=user_id, ip_address=ip_address), headers=headers)
+            if response.status_code != 200:
+                print(f"{path}: HTTP {response.status_code}")
+
+    queries = capture_selects(engine, run_requests)
+    queries += capture_selects(engine, lambda: apply_enrichment({ip_address: None}))
+    queries += capture_selects(engine, warm_user_agent_cache)
+    queries += capture_selects(engine, warm_anomaly_engine)
+
+    failures = 0
+    with engine.connect() as connection:
+        for statement, parameters in queries:
+            details, scans = full_scans(connection, statement, parameters)
+            status = "FULL SCAN" if scans else "ok"
+            failures += bool(scans)
+            print(f"[{status}] {' '.join(statement.split())[:160]}")
+            for detail in details:
+                print(f"    {detail}")
+    print(f"\n{len(queries)} queries checked, {failures} full table scan(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import time
+import queue
+import threading
+import logging
+from typing import Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class EnrichmentQueue:
+    """
+    Background geolocation enrichment for login attempts.
+    IPs are resolved by a pool of worker threads via resolve(ip); results are
+    collected and handed to apply_batch({ip: info}) in batches so the database
+    sees one bulk update instead of one transaction per attempt. An IP that is
+    already queued or being resolved is not queued again. The optional
+    warmup callable runs once on the flusher thread before the first batch.
+    """
+
+    def __init__(self, resolve: Callable[[str], Dict], apply_batch: Callable[[Dict[str, Dict]], None],
+                 workers: int = 4, max_pending: int = 10000, batch_size: int = 100,
+                 flush_interval: float = 1.0, warmup: Optional[Callable[[], None]] = None):
+        self.resolve = resolve
+        self.apply_batch = apply_batch
+        self.warmup = warmup
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._results: queue.Queue = queue.Queue()
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = False
+        self._stopping = threading.Event()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.resolved = 0
+        self.failed = 0
+        self.batches = 0
+        self.resolve_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._stopping.clear()
+            for index in range(self.workers):
+                self._spawn(self._work, f"enrichment-worker-{index}")
+            self._spawn(self._flush_loop, "enrichment-flusher")
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, ip_address: str) -> bool:
+        """
+        Queue an IP for enrichment without blocking. Returns False when the
+        queue is full; those rows stay unenriched until a backfill picks them up.
+        """
+        if not self._started:
+            self.start()
+        with self._lock:
+            self.submitted += 1
+            if ip_address in self._pending:
+                self.deduplicated += 1
+                return True
+            try:
+                self._queue.put_nowait(ip_address)
+            except queue.Full:
+                self.rejected += 1
+                return False
+            self._pending.add(ip_address)
+            return True
+
+    def _work(self):
+        while True:
+            ip_address = self._queue.get()
+            if ip_address is None:
+                return
+            start = time.perf_counter()
+            try:
+                info = self.resolve(ip_address)
+            except Exception as e:
+                logger.error(f"Enrichment lookup failed for IP {ip_address}: {str(e)}")
+                info = None
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.resolve_seconds += elapsed
+                if info is None:
+                    self.failed += 1
+                else:
+                    self.resolved += 1
+            self._results.put((ip_address, info))
+
+    def _flush_loop(self):
+        if self.warmup:
+            try:
+                self.warmup()
+            except Exception as e:
+                logger.error(f"Enrichment warmup failed: {str(e)}")
+        while not (self._stopping.is_set() and self._results.empty()
+                   and self._queue.empty() and not self._pending):
+            batch: Dict[str, Dict] = {}
+            finished = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(finished) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    ip_address, info = self._results.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                finished.append(ip_address)
+                if info is not None:
+                    batch[ip_address] = info
+            if finished:
+                self._flush(finished, batch)
+
+    def _flush(self, finished, batch: Dict[str, Dict]):
+        # Release the IPs before applying: attempts committed after this point
+        # queue their IP again instead of being missed by the batch update
+        with self._lock:
+            self._pending.difference_update(finished)
+        if not batch:
+            return
+        try:
+            self.apply_batch(batch)
+            with self._lock:
+                self.batches += 1
+        except Exception as e:
+            logger.error(f"Failed to apply enrichment batch of {len(batch)} IPs: {str(e)}")
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Finish queued lookups, apply the last batch and stop all threads."""
+        if not self._started:
+            return
+        self._stopping.set()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._started = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'pending_ips': len(self._pending),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'resolved': self.resolved,
+                'failed': self.failed,
+                'batches': self.batches,
+                'avg_resolve_ms': round(self.resolve_seconds * 1000 / max(1, self.resolved + self.failed), 2)
+            }
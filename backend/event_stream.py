@@ -0,0 +1,111 @@
+import json
+import queue
+import secrets
+import threading
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class StreamEvent(NamedTuple):
+    id: str
+    type: str
+    data: Dict[str, Any]
+
+def format_sse(event: StreamEvent) -> str:
+    """Serialize an event in text/event-stream format."""
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+class Subscription:
+    """A single stream consumer with its own bounded queue."""
+
+    def __init__(self, max_pending: int):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def offer(self, event: StreamEvent):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Too slow to keep up: stop queueing and tell the client to reload
+            self.overflowed = True
+
+    def get(self, timeout: float) -> Optional[StreamEvent]:
+        """Next event, or None when nothing arrived within timeout."""
+        if self.overflowed:
+            return None
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventPublisher:
+    """
+    In-process fan-out of analytics events to all stream subscribers.
+    Keeps a short history so reconnecting clients can resume from their
+    Last-Event-ID instead of reloading the full analytics payload.
+    """
+
+    RESET = 'reset'
+
+    def __init__(self, history_size: int = 1000, max_pending: int = 500):
+        self.max_pending = max_pending
+        # Event ids are "<epoch>:<seq>" so ids from a previous process are detected
+        self.epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._history: Deque[StreamEvent] = deque(maxlen=history_size)
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> StreamEvent:
+        with self._lock:
+            self._seq += 1
+            event = StreamEvent(f"{self.epoch}:{self._seq}", event_type, data)
+            self._history.append(event)
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(event)
+        return event
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Register a subscriber. Events after last_event_id are replayed from
+        history; if they are no longer available a reset event is queued first.
+        """
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            if last_event_id:
+                for event in self._replay(last_event_id):
+                    subscription.offer(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def _replay(self, last_event_id: str) -> List[StreamEvent]:
+        epoch, _, seq = last_event_id.partition(':')
+        try:
+            last_seq = int(seq)
+        except ValueError:
+            last_seq = -1
+        oldest_seq = self._seq - len(self._history) + 1
+        if epoch != self.epoch or last_seq < oldest_seq - 1 or last_seq > self._seq:
+            return [self.reset_event()]
+        return [event for event in self._history if int(event.id.partition(':')[2]) > last_seq]
+
+    def reset_event(self) -> StreamEvent:
+        """Event telling a client its local state is stale and must be reloaded."""
+        return StreamEvent(f"{self.epoch}:{self._seq}", self.RESET, {})
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'history': len(self._history)
+            }
@@ -0,0 +1,121 @@
+import math
+from typing import List, Optional, Tuple
+
+# Every located attempt stores the Web Mercator tile containing it at this zoom
+# (about 600 m wide at the equator) as one integer. The tile's x and y bits are
+# interleaved (Morton / Z-order), so the tile at any lower zoom z is the stored
+# value shifted right by 2 * (CELL_ZOOM - z), and every tile at a lower zoom is
+# one contiguous range of stored values.
+CELL_ZOOM = 16
+MAX_LATITUDE = 85.05112878
+
+def _spread(value: int) -> int:
+    """Put the bits of value at the even bit positions."""
+    result = 0
+    for bit in range(CELL_ZOOM):
+        result |= ((value >> bit) & 1) << (2 * bit)
+    return result
+
+def _compact(value: int) -> int:
+    result = 0
+    for bit in range(CELL_ZOOM):
+        result |= ((value >> (2 * bit)) & 1) << bit
+    return result
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> Tuple[int, int]:
+    """Web Mercator tile (x, y) containing a point."""
+    n = 1 << zoom
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def cell_for(latitude: Optional[float], longitude: Optional[float]) -> Optional[int]:
+    """Stored cell value for a location, or None when it has no coordinates."""
+    if latitude is None or longitude is None:
+        return None
+    x, y = tile_xy(float(latitude), float(longitude), CELL_ZOOM)
+    return _spread(x) | (_spread(y) << 1)
+
+def cell_tile(cell: int, zoom: int) -> Tuple[int, int]:
+    """(x, y) of a cell value already shifted down to zoom."""
+    return _compact(cell), _compact(cell >> 1)
+
+def cell_shift(zoom: int) -> int:
+    """Right shift turning stored cell values into cells at zoom."""
+    return 2 * (CELL_ZOOM - zoom)
+
+def tile_center(x: int, y: int, zoom: int) -> Tuple[float, float]:
+    """(latitude, longitude) of a tile's center."""
+    n = 1 << zoom
+    longitude = (x + 0.5) / n * 360.0 - 180.0
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+    return latitude, longitude
+
+def bbox_tiles(south: float, west: float, north: float, east: float, zoom: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Tile rectangles (x0, y0, x1, y1), inclusive, covering a bounding box.
+    A box crossing the antimeridian (west > east) is split in two.
+    """
+    if west > east:
+        return (bbox_tiles(south, west, north, 180.0, zoom) +
+                bbox_tiles(south, -180.0, north, east, zoom))
+    x0, y0 = tile_xy(north, west, zoom)
+    x1, y1 = tile_xy(south, east, zoom)
+    return [(x0, y0, x1, y1)]
+
+def cell_ranges(rects: List[Tuple[int, int, int, int]], zoom: int, max_ranges: int = 32) -> List[Tuple[int, int]]:
+    """
+    Inclusive ranges of stored cell values covering tile rectangles at zoom.
+
+    Quadtree nodes wholly inside a rectangle become one range each; nodes on its
+    edge are split a level further while the node count stays under max_ranges,
+    after which they are kept whole. The ranges can therefore cover a little
+    more than the rectangles, and callers filter the returned cells.
+    """
+    def overlap(level, x, y):
+        shift = zoom - level
+        nx0, ny0 = x << shift, y << shift
+        nx1, ny1 = ((x + 1) << shift) - 1, ((y + 1) << shift) - 1
+        inside = False
+        for x0, y0, x1, y1 in rects:
+            if nx0 > x1 or nx1 < x0 or ny0 > y1 or ny1 < y0:
+                continue
+            if nx0 >= x0 and nx1 <= x1 and ny0 >= y0 and ny1 <= y1:
+                return 'inside'
+            inside = 'partial'
+        return inside
+
+    done = []
+    frontier = [(0, 0, 0)]
+    while frontier:
+        children = []
+        for level, x, y in frontier:
+            if level == zoom:
+                done.append((level, x, y))
+                continue
+            for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                child = (level + 1, 2 * x + dx, 2 * y + dy)
+                state = overlap(*child)
+                if state == 'inside':
+                    done.append(child)
+                elif state == 'partial':
+                    children.append(child)
+        if len(done) + len(children) > max_ranges:
+            done.extend(frontier)
+            break
+        frontier = children
+
+    ranges = []
+    for level, x, y in done:
+        shift = cell_shift(level)
+        code = _spread(x) | (_spread(y) << 1)
+        ranges.append((code << shift, ((code + 1) << shift) - 1))
+    ranges.sort()
+    merged = []
+    for low, high in ranges:
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+import logging
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import geoip2.database
+
+logger = logging.getLogger(__name__)
+
+class SharedGeoIPReader:
+    """
+    Long-lived, memory-mapped GeoIP reader shared by every request.
+    The database file is re-checked (inode, mtime, size) at most once per
+    check_interval and a new reader is swapped in when it changes. Lookups
+    already holding the previous reader finish on it; it is released once
+    the last of them drops its reference. geoip2 is only imported when the
+    first reader is opened.
+    """
+
+    def __init__(self, db_path: str, check_interval: float = 10.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._reader: Optional['geoip2.database.Reader'] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Open a new reader if the database file appeared or was replaced."""
+        with self._lock:
+            now = time.monotonic()
+            if self._reader is not None and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            signature = self._file_signature()
+            if signature is None or signature == self._signature:
+                return
+            import geoip2.database
+            from maxminddb import MODE_AUTO
+            try:
+                # MODE_AUTO memory-maps the file, using the C extension when it is installed
+                reader = geoip2.database.Reader(self.db_path, mode=MODE_AUTO)
+            except Exception as e:
+                # Keep serving from the current reader, e.g. while a copy is still in progress
+                logger.warning(f"Could not open GeoIP database {self.db_path}: {str(e)}")
+                return
+            if self._reader is not None:
+                logger.info(f"GeoIP database {self.db_path} changed, reader swapped")
+            self._reader = reader
+            self._signature = signature
+            self.reloads += 1
+
+    def get_reader(self) -> Optional['geoip2.database.Reader']:
+        """Current reader, or None if the database file is not available."""
+        if self._reader is None or time.monotonic() - self._last_check >= self.check_interval:
+            self._refresh()
+        return self._reader
+
+    def city(self, ip_address: str):
+        """City lookup; raises FileNotFoundError when no database is available."""
+        reader = self.get_reader()
+        if reader is None:
+            raise FileNotFoundError(f"GeoIP database not found: {self.db_path}")
+        return reader.city(ip_address)
+
+    def stats(self) -> Dict:
+        """Database path, whether it is open, its build time and how often it was (re)opened."""
+        reader = self._reader
+        return {
+            'path': self.db_path,
+            'loaded': reader is not None,
+            'build_epoch': reader.metadata().build_epoch if reader is not None else None,
+            'reloads': self.reloads,
+        }
+
+    def reload(self):
+        """Force the file check on the next lookup, e.g. after an update notification."""
+        with self._lock:
+            # Not 0: the monotonic clock can itself be below check_interval shortly after boot
+            self._last_check = float('-inf')
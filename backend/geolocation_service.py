@@ -1,45 +1,77 @@
 import os
-import geoip2.database
-import geoip2.errors
-import requests
-import socket
+import ipaddress
 import logging
-from typing import Dict, Optional, Tuple
-from user_agents import parse
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from geoip_reader import SharedGeoIPReader
+from ttl_cache import TTLCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class GeolocationService:
+    """
+    IP geolocation and user agent parsing for login attempts. geoip2,
+    requests and user_agents are imported on first use: lookups only run on
+    the enrichment workers, and importing those libraries (the user agent
+    regexes above all) would otherwise be most of a cold start.
+    """
+
     def __init__(self):
         self.db_path = os.getenv('GEOIP_DB_PATH', 'GeoLite2-City.mmdb')
-        self.backup_ip_service = "http://ip-api.com/json/{}"
-        self.cache = {}  # Simple in-memory cache
+        self.geoip_reader = SharedGeoIPReader(
+            self.db_path,
+            check_interval=float(os.getenv('GEOIP_RELOAD_INTERVAL', 10))
+        )
+        self.backup_ip_service = os.getenv('IP_API_URL', "http://ip-api.com/json/{}")
+        # Location cache keyed on IP (or network prefix) only; user agents are parsed per call
+        self.cache = TTLCache(
+            max_size=int(os.getenv('GEO_CACHE_SIZE', 10000)),
+            ttl=float(os.getenv('GEO_CACHE_TTL', 86400))
+        )
+        # Failed lookups are cached briefly so floods of unknown IPs don't hit IP-API
+        self.negative_cache_ttl = float(os.getenv('GEO_NEGATIVE_CACHE_TTL', 300))
+        # Optionally share results across a /24 (IPv4) or /48 (IPv6) network
+        self.prefix_reuse = os.getenv('GEO_CACHE_PREFIX_REUSE', 'false').lower() in ('1', 'true', 'yes')
+        # Parsed user agents, independent of the IP cache so device info never follows an IP
+        self.user_agent_cache = TTLCache(
+            max_size=int(os.getenv('UA_CACHE_SIZE', 5000)),
+            ttl=float(os.getenv('UA_CACHE_TTL', 7 * 86400))
+        )
+        # Optional observe(source, seconds) for uncached lookups: maxmind, ip_api or failed
+        self.observe_lookup: Optional[Callable[[str, float], None]] = None
 
     def _is_valid_ip(self, ip_address: str) -> bool:
-        """Validate IP address format."""
+        """Validate IPv4 or IPv6 address format."""
         try:
-            socket.inet_aton(ip_address)
+            ipaddress.ip_address(ip_address)
             return True
-        except socket.error:
+        except ValueError:
             return False
 
+    def _cache_key(self, ip_address: str) -> str:
+        """Cache key for an IP: the address itself, or its network when prefix reuse is on."""
+        if not self.prefix_reuse:
+            return ip_address
+        prefix = 24 if ipaddress.ip_address(ip_address).version == 4 else 48
+        return str(ipaddress.ip_network(f"{ip_address}/{prefix}", strict=False))
+
     def _get_from_maxmind(self, ip_address: str) -> Optional[Dict]:
         """Get location data from MaxMind database."""
+        import geoip2.errors
         try:
-            with geoip2.database.Reader(self.db_path) as reader:
-                response = reader.city(ip_address)
-                return {
-                    'city': response.city.name or 'Unknown City',
-                    'country': response.country.name or 'Unknown Country',
-                    'latitude': float(response.location.latitude or 0.0),
-                    'longitude': float(response.location.longitude or 0.0),
-                    'accuracy_radius': response.location.accuracy_radius or 0,
-                    'timezone': str(response.location.time_zone or 'UTC'),
-                    'isp': '',  # MaxMind City database doesn't include ISP info
-                    'connection_type': ''
-                }
+            response = self.geoip_reader.city(ip_address)
+            return {
+                'city': response.city.name or 'Unknown City',
+                'country': response.country.name or 'Unknown Country',
+                'latitude': float(response.location.latitude or 0.0),
+                'longitude': float(response.location.longitude or 0.0),
+                'accuracy_radius': response.location.accuracy_radius or 0,
+                'timezone': str(response.location.time_zone or 'UTC'),
+                'isp': '',  # MaxMind City database doesn't include ISP info
+                'connection_type': ''
+            }
         except (geoip2.errors.AddressNotFoundError, FileNotFoundError) as e:
             logger.warning(f"MaxMind lookup failed for IP {ip_address}: {str(e)}")
             return None
@@ -49,26 +81,31 @@ class GeolocationService:
 
     def _get_from_ip_api(self, ip_address: str) -> Optional[Dict]:
         """Get location data from IP-API as backup."""
+        import requests
         try:
             response = requests.get(self.backup_ip_service.format(ip_address), timeout=5)
             if response.status_code == 200:
-                data = response.json()
-                if data.get('status') == 'success':
-                    return {
-                        'city': data.get('city', 'Unknown City'),
-                        'country': data.get('country', 'Unknown Country'),
-                        'latitude': float(data.get('lat', 0.0)),
-                        'longitude': float(data.get('lon', 0.0)),
-                        'accuracy_radius': 100,  # IP-API doesn't provide this
-                        'timezone': data.get('timezone', 'UTC'),
-                        'isp': data.get('isp', ''),
-                        'connection_type': ''
-                    }
+                return self._parse_ip_api(response.json())
             return None
         except Exception as e:
             logger.error(f"IP-API lookup failed for IP {ip_address}: {str(e)}")
             return None
 
+    def _parse_ip_api(self, data: Dict) -> Optional[Dict]:
+        """Location info from one IP-API result, None unless it succeeded."""
+        if not isinstance(data, dict) or data.get('status') != 'success':
+            return None
+        return {
+            'city': data.get('city', 'Unknown City'),
+            'country': data.get('country', 'Unknown Country'),
+            'latitude': float(data.get('lat', 0.0)),
+            'longitude': float(data.get('lon', 0.0)),
+            'accuracy_radius': 100,  # IP-API doesn't provide this
+            'timezone': data.get('timezone', 'UTC'),
+            'isp': data.get('isp', ''),
+            'connection_type': ''
+        }
+
     def _get_local_info(self) -> Dict:
         """Return default info for local/private IPs."""
         return {
@@ -83,7 +120,15 @@ class GeolocationService:
         }
 
     def parse_user_agent(self, user_agent_string: str) -> Tuple[str, str]:
-        """Parse user agent string to get device and browser info."""
+        """Parse user agent string to get device and browser info, memoized per string."""
+        parsed = self.user_agent_cache.get(user_agent_string)
+        if parsed is None:
+            parsed = self._parse_user_agent(user_agent_string)
+            self.user_agent_cache.set(user_agent_string, parsed)
+        return parsed
+
+    def _parse_user_agent(self, user_agent_string: str) -> Tuple[str, str]:
+        from user_agents import parse
         try:
             user_agent = parse(user_agent_string)
             device_info = f"{user_agent.device.brand} {user_agent.device.model}"
@@ -93,41 +138,39 @@ class GeolocationService:
             logger.error(f"Error parsing user agent: {str(e)}")
             return "Unknown Device", "Unknown Browser"
 
+    def warm_user_agent_cache(self, user_agent_strings: Iterable[str]) -> int:
+        """Pre-parse known user agents; this also compiles the parser's regexes up front."""
+        warmed = 0
+        for user_agent_string in user_agent_strings:
+            if user_agent_string and user_agent_string not in self.user_agent_cache:
+                self.user_agent_cache.set(user_agent_string, self._parse_user_agent(user_agent_string))
+                warmed += 1
+        return warmed
+
     def get_location_info(self, ip_address: str, user_agent: str = "") -> Dict:
         """
         Get comprehensive location information for an IP address.
         Includes fallback mechanisms and caching.
         """
-        if not ip_address or ip_address in ('127.0.0.1', 'localhost', '::1'):
-            return self._get_local_info()
+        local_info = self._local_result(ip_address)
+        if local_info is not None:
+            return local_info
 
         # Check cache first
-        if ip_address in self.cache:
-            return self.cache[ip_address]
-
-        if not self._is_valid_ip(ip_address):
-            logger.error(f"Invalid IP address format: {ip_address}")
-            return self._get_local_info()
+        cache_key = self._cache_key(ip_address)
+        location_info = self.cache.get(cache_key)
 
-        # Try MaxMind first
-        location_info = self._get_from_maxmind(ip_address)
+        if location_info is None:
+            location_info = self._lookup(ip_address)
+            if location_info is None:
+                # Both services failed: cache the default values briefly
+                location_info = self._get_unknown_info()
+                self.cache.set(cache_key, location_info, ttl=self.negative_cache_ttl)
+            else:
+                self.cache.set(cache_key, location_info)
 
-        # Fallback to IP-API if MaxMind fails
-        if not location_info:
-            location_info = self._get_from_ip_api(ip_address)
-
-        # If both services fail, return default values
-        if not location_info:
-            location_info = {
-                'city': 'Unknown',
-                'country': 'Unknown',
-                'latitude': 0.0,
-                'longitude': 0.0,
-                'accuracy_radius': 0,
-                'timezone': 'UTC',
-                'isp': 'Unknown',
-                'connection_type': 'Unknown'
-            }
+        # Copy so per-request fields never leak into the cached entry
+        location_info = dict(location_info)
 
         # Parse user agent if provided
         if user_agent:
@@ -135,6 +178,46 @@ class GeolocationService:
             location_info['device_info'] = device_info
             location_info['browser_info'] = browser_info
 
-        # Cache the result
-        self.cache[ip_address] = location_info
         return location_info
+
+    def _local_result(self, ip_address: str) -> Optional[Dict]:
+        """Default info for empty, loopback and malformed addresses, which are never looked up."""
+        if not ip_address or ip_address in ('127.0.0.1', 'localhost', '::1'):
+            return self._get_local_info()
+        if not self._is_valid_ip(ip_address):
+            logger.error(f"Invalid IP address format: {ip_address}")
+            return self._get_local_info()
+        return None
+
+    def _lookup(self, ip_address: str) -> Optional[Dict]:
+        """Resolve an IP through MaxMind, falling back to IP-API."""
+        start = time.perf_counter()
+        source = 'maxmind'
+        location_info = self._get_from_maxmind(ip_address)
+        if not location_info:
+            source = 'ip_api'
+            location_info = self._get_from_ip_api(ip_address)
+        if self.observe_lookup:
+            self.observe_lookup(source if location_info else 'failed', time.perf_counter() - start)
+        return location_info
+
+    def _get_unknown_info(self) -> Dict:
+        """Return default values when both services fail."""
+        return {
+            'city': 'Unknown',
+            'country': 'Unknown',
+            'latitude': 0.0,
+            'longitude': 0.0,
+            'accuracy_radius': 0,
+            'timezone': 'UTC',
+            'isp': 'Unknown',
+            'connection_type': 'Unknown'
+        }
+
+    def cache_stats(self) -> Dict:
+        """Location cache size, hit rate and eviction counts for monitoring."""
+        stats = self.cache.stats()
+        stats['prefix_reuse'] = self.prefix_reuse
+        stats['user_agents'] = self.user_agent_cache.stats()
+        stats['database'] = self.geoip_reader.stats()
+        return stats
@@ -0,0 +1,44 @@
+import threading
+from typing import Dict, NamedTuple, Optional
+from ttl_cache import TTLCache
+
+class Identity(NamedTuple):
+    """The parts of a user that authentication needs."""
+    id: int
+    is_admin: bool
+    version: int
+
+class IdentityCache:
+    """
+    Short-TTL, per-process cache of authenticated identities keyed by user id.
+    Every invalidation bumps a generation counter; identities loaded while an
+    invalidation happened are not cached, so a racing read can't resurrect
+    stale privileges.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 10000):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[Identity]:
+        return self._cache.get(user_id)
+
+    def put(self, identity: Identity):
+        """Cache an identity loaded at generation identity.version, unless invalidated since."""
+        with self._lock:
+            if identity.version == self.generation:
+                self._cache.set(identity.id, identity)
+
+    def invalidate(self, user_id: int):
+        """Drop a user's identity after it is created, deleted, promoted or re-keyed."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._cache.delete(user_id)
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        stats['invalidations'] = self.invalidations
+        return stats
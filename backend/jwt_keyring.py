@@ -0,0 +1,136 @@
+import os
+import math
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
+
+def previous_keys_needed(token_lifetime: float, rotation_interval: float) -> int:
+    """
+    Retired keys to keep so a token signed just before a rotation still
+    verifies until it expires: one per rotation in a token lifetime, plus one.
+    """
+    return math.ceil(token_lifetime / rotation_interval) + 1
+
+def key_id(secret: str) -> str:
+    """Stable, non-reversible identifier for a signing key, sent in the JWT 'kid' header."""
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+class JWTKeyring:
+    """
+    In-memory JWT signing keys, reloaded only when the key source changes.
+    SECRET_KEY signs new tokens. It and up to max_previous older keys (from
+    SECRET_KEY_PREVIOUS in the env file, plus keys this process has seen
+    rotated out) verify tokens, so rotations don't invalidate live sessions.
+    The env file is stat()ed at most once per check_interval and only parsed
+    when its inode, mtime or size changed. Tokens issued before key ids were
+    added carry no kid; they are checked against the current and newest
+    previous key only, and only for legacy_window seconds after startup.
+    """
+
+    def __init__(self, env_path: str, max_previous: int = 3, check_interval: float = 1.0,
+                 legacy_window: float = 0.0):
+        self.env_path = env_path
+        self.max_previous = max_previous
+        self.check_interval = check_interval
+        self._legacy_until = time.monotonic() + legacy_window
+        self._current: Optional[Tuple[str, str]] = None
+        self._previous: "OrderedDict[str, str]" = OrderedDict()
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.env_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _load(self) -> Tuple[Optional[str], List[str]]:
+        """Current and previous secrets from the env file, or the process environment."""
+        values = dotenv_values(self.env_path) if os.path.exists(self.env_path) else {}
+        current = values.get('SECRET_KEY') or os.getenv('SECRET_KEY')
+        previous = values.get('SECRET_KEY_PREVIOUS') or os.getenv('SECRET_KEY_PREVIOUS') or ''
+        return current, [secret for secret in previous.split(',') if secret]
+
+    def refresh(self, force: bool = False):
+        """Reload keys if the env file changed since the last check."""
+        now = time.monotonic()
+        if not force and self._current is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            signature = self._file_signature()
+            if self._current is not None and signature == self._signature:
+                return
+            current, previous = self._load()
+            self._signature = signature
+            if not current:
+                logger.error("SECRET_KEY is not set; tokens cannot be issued")
+                return
+
+            # Keys this process saw rotated out stay valid alongside the declared ones
+            retired = OrderedDict()
+            if self._current and self._current[1] != current:
+                retired[self._current[0]] = self._current[1]
+            retired.update(self._previous)
+            merged = OrderedDict((key_id(secret), secret) for secret in previous)
+            for kid, secret in retired.items():
+                merged.setdefault(kid, secret)
+            merged.pop(key_id(current), None)
+            while len(merged) > self.max_previous:
+                merged.popitem(last=True)
+
+            if self._current is not None and self._current[1] != current:
+                logger.info("JWT signing key rotated")
+            self._current = (key_id(current), current)
+            self._previous = merged
+            self.reloads += 1
+
+    def signing_key(self) -> Tuple[str, str]:
+        """(kid, secret) used to sign new tokens."""
+        self.refresh()
+        if self._current is None:
+            raise RuntimeError("SECRET_KEY is not set")
+        return self._current
+
+    def verification_key(self, kid: str) -> Optional[str]:
+        """Secret for a token's kid, re-checking the key source once if it is unknown."""
+        self.refresh()
+        secret = self._lookup(kid)
+        if secret is None:
+            self.refresh(force=True)
+            secret = self._lookup(kid)
+        return secret
+
+    def _lookup(self, kid: str) -> Optional[str]:
+        if self._current and self._current[0] == kid:
+            return self._current[1]
+        return self._previous.get(kid)
+
+    def legacy_verification_keys(self) -> List[str]:
+        """
+        Secrets to try for a token without a kid: the current and newest
+        previous key while the legacy window lasts, then none. Those tokens
+        were only ever verified against the current key, and trying every
+        retired key would cost one HMAC per key for any forged token.
+        """
+        if time.monotonic() >= self._legacy_until:
+            return []
+        self.refresh()
+        keys = [self._current[1]] if self._current else []
+        return keys + list(self._previous.values())[:1]
+
+    def stats(self) -> Dict:
+        return {
+            'current_kid': self._current[0] if self._current else None,
+            'previous_kids': list(self._previous),
+            'reloads': self.reloads
+        }
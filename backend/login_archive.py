@@ -0,0 +1,128 @@
+import os
+import csv
+import glob
+import gzip
+import tempfile
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'ip_address', 'user_agent', 'timestamp', 'success', 'location',
+                  'device_info', 'browser_info', 'latitude', 'longitude', 'accuracy_radius', 'city',
+                  'country', 'timezone', 'isp', 'connection_type', 'anomaly_score')
+_INT_FIELDS = ('id', 'user_id', 'accuracy_radius')
+_FLOAT_FIELDS = ('latitude', 'longitude', 'anomaly_score')
+
+class LoginArchive:
+    """
+    Gzip CSV archives of login attempts, one or more files per month.
+    A month can be archived in several parts (login_attempt-2026-01.csv.gz,
+    login_attempt-2026-01.2.csv.gz, ...) when a retention run is resumed;
+    rows are never written to two parts, so readers simply concatenate them.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _files(self, month: date) -> List[str]:
+        pattern = os.path.join(self.directory, f"login_attempt-{month:%Y-%m}*.csv.gz")
+        return sorted(glob.glob(pattern), key=lambda path: (len(path), path))
+
+    def months(self) -> List[date]:
+        """Archived months, oldest first."""
+        found = set()
+        for path in glob.glob(os.path.join(self.directory, "login_attempt-*.csv.gz")):
+            name = os.path.basename(path)[len("login_attempt-"):]
+            try:
+                found.add(datetime.strptime(name[:7], '%Y-%m').date())
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def write(self, month: date, rows: Iterable[Any]) -> int:
+        """
+        Write rows (objects or mappings with ARCHIVE_FIELDS) as a new part for
+        the month. The file only appears under its final name once complete.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self._files(month)
+        suffix = f".{len(existing) + 1}" if existing else ""
+        path = os.path.join(self.directory, f"login_attempt-{month:%Y-%m}{suffix}.csv.gz")
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        count = 0
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(ARCHIVE_FIELDS)
+                for row in rows:
+                    values = row if isinstance(row, dict) else row._mapping
+                    writer.writerow(_format(values[name]) for name in ARCHIVE_FIELDS)
+                    count += 1
+            if count == 0:
+                os.remove(tmp_path)
+                return 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return count
+
+    def max_id(self, month: date) -> Optional[int]:
+        """Highest attempt id already archived for the month."""
+        highest = None
+        for row in self._read_month(month):
+            if highest is None or row['id'] > highest:
+                highest = row['id']
+        return highest
+
+    def _read_month(self, month: date) -> Iterator[Dict[str, Any]]:
+        for path in self._files(month):
+            with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    yield _parse(row)
+
+    def read(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Archived attempts with since <= timestamp < until, month by month."""
+        for month in self.months():
+            if since and month < date(since.year, since.month, 1):
+                continue
+            if until and month > until.date():
+                continue
+            for row in self._read_month(month):
+                if since and row['timestamp'] < since:
+                    continue
+                if until and row['timestamp'] >= until:
+                    continue
+                yield row
+
+    def hourly_counts(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Counter:
+        """Attempt counts keyed like the hourly rollups: (hour start, success, country or '')."""
+        counts = Counter()
+        for row in self.read(since, until):
+            hour = row['timestamp'].replace(minute=0, second=0, microsecond=0)
+            counts[(hour, row['success'], (row['country'] or '')[:100])] += 1
+        return counts
+
+def _format(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+def _parse(row: Dict[str, str]) -> Dict[str, Any]:
+    # Parts written before a field was added have no column for it
+    parsed: Dict[str, Any] = {name: row.get(name) or None for name in ARCHIVE_FIELDS}
+    for name in _INT_FIELDS:
+        if parsed.get(name) is not None:
+            parsed[name] = int(parsed[name])
+    for name in _FLOAT_FIELDS:
+        if parsed.get(name) is not None:
+            parsed[name] = float(parsed[name])
+    parsed['timestamp'] = datetime.fromisoformat(parsed['timestamp'])
+    parsed['success'] = parsed['success'] == '1'
+    return parsed
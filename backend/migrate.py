@@ -0,0 +1,241 @@
+"""
+Versioned, non-destructive schema migrations.
+
+Applied versions are recorded in schema_migrations. Each migration checks the
+live schema before changing it, so running against a database created from
+database/init.sql or by an older update_schema.py is safe. On MySQL, columns
+and indexes are added with ALGORITHM=INPLACE, LOCK=NONE: the statement fails
+instead of silently blocking writes to login_attempt while it runs.
+
+Usage: python migrate.py [--status] [--to VERSION]
+"""
+import sys
+import argparse
+from datetime import datetime
+from sqlalchemy import (MetaData, Table, Column, Integer, String, DateTime, bindparam, func, inspect, select, text)
+from app import (app, db, User, LoginAttempt, LoginAttemptRollup, LoginThrottleRollup, pack_ip,
+                 placeholder_coordinates)
+import attempt_partitions
+import geo_cells
+
+IP_BACKFILL_CHUNK = 5000
+GEO_BACKFILL_CHUNK = 5000
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        return upgrade
+    return register
+
+def online(connection):
+    """Clause that keeps MySQL DDL from locking the table."""
+    return " ALGORITHM=INPLACE LOCK=NONE" if connection.dialect.name == 'mysql' else ""
+
+def has_column(connection, table, column):
+    return column in {col['name'] for col in inspect(connection).get_columns(table)}
+
+def has_index(connection, table, index):
+    return index in {idx['name'] for idx in inspect(connection).get_indexes(table)}
+
+def add_column(connection, table, column, ddl):
+    if has_column(connection, table, column):
+        return
+    clause = ", ALGORITHM=INPLACE, LOCK=NONE" if connection.dialect.name == 'mysql' else ""
+    connection.execute(text(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {ddl}{clause}"))
+    print(f"  added column {table}.{column}")
+
+def create_index(connection, table, index, columns):
+    if has_index(connection, table, index):
+        return
+    column_list = ', '.join(f"`{name}`" for name in columns)
+    connection.execute(text(f"CREATE INDEX `{index}` ON `{table}` ({column_list}){online(connection)}"))
+    print(f"  created index {index} on {table} ({', '.join(columns)})")
+
+def drop_index(connection, table, index):
+    if not has_index(connection, table, index):
+        return
+    if connection.dialect.name == 'mysql':
+        connection.execute(text(f"DROP INDEX `{index}` ON `{table}`{online(connection)}"))
+    else:
+        connection.execute(text(f"DROP INDEX `{index}`"))
+    print(f"  dropped index {index} on {table}")
+
+@migration(1, "Create user and login_attempt tables")
+def create_base_tables(connection):
+    db.metadata.create_all(connection, tables=[User.__table__, LoginAttempt.__table__])
+
+@migration(2, "Add login_attempt.user_agent")
+def add_user_agent(connection):
+    add_column(connection, 'login_attempt', 'user_agent', 'VARCHAR(512)')
+
+@migration(3, "Create login_attempt_rollup")
+def create_rollup_table(connection):
+    if inspect(connection).has_table('login_attempt_rollup'):
+        return
+    db.metadata.create_all(connection, tables=[LoginAttemptRollup.__table__])
+    print("  created login_attempt_rollup; fill it with: python rebuild_rollups.py")
+
+@migration(4, "Composite indexes for analytics, per-user history and enrichment")
+def add_composite_indexes(connection):
+    create_index(connection, 'login_attempt', 'idx_timestamp_success', ('timestamp', 'success', 'country'))
+    create_index(connection, 'login_attempt', 'idx_success_timestamp', ('success', 'timestamp'))
+    create_index(connection, 'login_attempt', 'idx_user_timestamp', ('user_id', 'timestamp'))
+    create_index(connection, 'login_attempt', 'idx_ip_country', ('ip_address', 'country'))
+    create_index(connection, 'login_attempt', 'idx_location', ('latitude', 'longitude'))
+    # Both are left-prefixes of the indexes above
+    drop_index(connection, 'login_attempt', 'idx_timestamp')
+    drop_index(connection, 'login_attempt', 'idx_ip_address')
+
+@migration(5, "Packed binary IP column")
+def add_ip_bin(connection):
+    add_column(connection, 'login_attempt', 'ip_bin', 'VARBINARY(16)')
+    table = LoginAttempt.__table__
+    last_id = 0
+    filled = 0
+    while True:
+        rows = connection.execute(
+            select(table.c.id, table.c.ip_address)
+            .where(table.c.id > last_id, table.c.ip_bin.is_(None))
+            .order_by(table.c.id).limit(IP_BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        updates = [{'attempt_id': row.id, 'ip_bin': pack_ip(row.ip_address)} for row in rows]
+        updates = [update for update in updates if update['ip_bin'] is not None]
+        if updates:
+            connection.execute(
+                table.update().where(table.c.id == bindparam('attempt_id')).values(ip_bin=bindparam('ip_bin')),
+                updates
+            )
+        # Keep each chunk its own short transaction on a live table
+        connection.commit()
+        filled += len(updates)
+        last_id = rows[-1].id
+    print(f"  packed {filled} IP addresses")
+    create_index(connection, 'login_attempt', 'idx_ip_bin', ('ip_bin',))
+
+@migration(6, "Monthly range partitions for login_attempt")
+def partition_login_attempt(connection):
+    if not attempt_partitions.is_supported(connection):
+        print(f"  {connection.dialect.name} has no range partitioning; retention.py deletes expired months instead")
+        return
+    if attempt_partitions.partitioned_months(connection):
+        return
+    # MySQL partitioning requires the partition column in every unique key, and
+    # partitioned InnoDB tables cannot have foreign keys. This rebuilds the table.
+    for foreign_key in inspect(connection).get_foreign_keys('login_attempt'):
+        connection.execute(text(f"ALTER TABLE login_attempt DROP FOREIGN KEY `{foreign_key['name']}`"))
+        print(f"  dropped foreign key {foreign_key['name']}")
+    connection.execute(text("UPDATE login_attempt SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL"))
+    connection.execute(text(
+        "ALTER TABLE login_attempt MODIFY timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"
+    ))
+    oldest = connection.execute(select(func.min(LoginAttempt.__table__.c.timestamp))).scalar()
+    this_month = attempt_partitions.month_start(datetime.utcnow())
+    first_month = attempt_partitions.month_start(oldest) if oldest else this_month
+    last_month = attempt_partitions.add_months(this_month, attempt_partitions.MONTHS_AHEAD)
+    months = attempt_partitions.partition_table(connection, first_month, last_month)
+    print(f"  partitioned login_attempt into {len(months)} monthly partitions")
+
+@migration(7, "Create login_throttle_rollup")
+def create_throttle_rollup_table(connection):
+    if inspect(connection).has_table('login_throttle_rollup'):
+        return
+    db.metadata.create_all(connection, tables=[LoginThrottleRollup.__table__])
+
+@migration(8, "Map cell column and index for geo clustering")
+def add_geo_cell(connection):
+    add_column(connection, 'login_attempt', 'geo_cell', 'BIGINT')
+    table = LoginAttempt.__table__
+    last_id = 0
+    filled = 0
+    while True:
+        rows = connection.execute(
+            select(table.c.id, table.c.latitude, table.c.longitude)
+            .where(table.c.id > last_id, table.c.geo_cell.is_(None), table.c.latitude.isnot(None),
+                   ~placeholder_coordinates(table.c))
+            .order_by(table.c.id).limit(GEO_BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        updates = [{'attempt_id': row.id, 'geo_cell': geo_cells.cell_for(row.latitude, row.longitude)}
+                   for row in rows]
+        updates = [update for update in updates if update['geo_cell'] is not None]
+        if updates:
+            connection.execute(
+                table.update().where(table.c.id == bindparam('attempt_id')).values(geo_cell=bindparam('geo_cell')),
+                updates
+            )
+        connection.commit()
+        filled += len(updates)
+        last_id = rows[-1].id
+    print(f"  assigned map cells to {filled} located attempts")
+    create_index(connection, 'login_attempt', 'idx_geo_cell', ('geo_cell', 'success', 'latitude', 'longitude'))
+    # Clusters read idx_geo_cell; nothing filters on raw coordinates
+    drop_index(connection, 'login_attempt', 'idx_location')
+
+@migration(9, "Login attempt anomaly score")
+def add_anomaly_score(connection):
+    add_column(connection, 'login_attempt', 'anomaly_score', 'FLOAT')
+
+@migration(10, "Clear map cells of placeholder locations")
+def clear_placeholder_cells(connection):
+    # Local and unresolvable IPs are stored at 0.0/0.0 and are not a place on the map
+    table = LoginAttempt.__table__
+    cleared = connection.execute(
+        table.update().where(table.c.geo_cell.isnot(None), placeholder_coordinates(table.c)).values(geo_cell=None)
+    ).rowcount
+    print(f"  cleared map cells of {cleared} placeholder locations")
+
+def applied_versions(connection):
+    migration_metadata.create_all(connection)
+    return {row.version: row for row in connection.execute(select(schema_migrations))}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--status', action='store_true', help="List applied and pending migrations")
+    parser.add_argument('--to', type=int, help="Stop after this version")
+    args = parser.parse_args()
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            applied = applied_versions(connection)
+            connection.commit()
+            pending = [m for m in sorted(MIGRATIONS) if m[0] not in applied and (args.to is None or m[0] <= args.to)]
+
+            if args.status:
+                for version, description, _ in sorted(MIGRATIONS):
+                    state = f"applied {applied[version].applied_at:%Y-%m-%d %H:%M}" if version in applied else "pending"
+                    print(f"{version:>4}  {state:<22} {description}")
+                return
+
+            if not pending:
+                print("Schema is up to date")
+                return
+            for version, description, upgrade in pending:
+                print(f"Applying {version}: {description}")
+                try:
+                    upgrade(connection)
+                    connection.execute(schema_migrations.insert().values(
+                        version=version, description=description, applied_at=datetime.utcnow()
+                    ))
+                    connection.commit()
+                except Exception as e:
+                    connection.rollback()
+                    print(f"Migration {version} failed: {e}")
+                    sys.exit(1)
+            print(f"Applied {len(pending)} migration(s)")
+
+if __name__ == "__main__":
+    main()
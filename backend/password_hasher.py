@@ -0,0 +1,112 @@
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue stays full for longer than the queue timeout."""
+
+def _timed_hash(method: str, password: str) -> Tuple[str, float, float]:
+    start = time.time()
+    return generate_password_hash(password, method=method), start, time.time()
+
+def _timed_check(pwhash: str, password: str) -> Tuple[bool, float, float]:
+    start = time.time()
+    return check_password_hash(pwhash, password), start, time.time()
+
+class PasswordHasher:
+    """
+    PBKDF2 hashing and verification in a bounded process pool.
+    Hashing is CPU-bound: on request threads a login burst runs one hash per
+    thread at once and starves every other route. Here at most `workers`
+    hashes run at a time, the calling thread blocks until its result is
+    back, at most max_pending calls are queued or running, and callers that
+    wait longer than queue_timeout for a slot get HasherBusy. With workers=0
+    hashing runs inline. observe(operation, queued, hashed) is called with
+    the seconds of each completed call, e.g. to feed metrics.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, iterations: int = DEFAULT_PBKDF2_ITERATIONS,
+                 queue_timeout: float = 5.0, observe: Optional[Callable[[str, float, float], None]] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.method = f"pbkdf2:sha256:{iterations}"
+        self.queue_timeout = queue_timeout
+        self.observe = observe
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs background threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _run(self, operation, fn, *args):
+        submitted = time.time()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            if self.workers > 0:
+                result, started, finished = self._pool().submit(fn, *args).result()
+            else:
+                result, started, finished = fn(*args)
+        finally:
+            self._slots.release()
+        queued = max(0.0, started - submitted)
+        with self._lock:
+            self.completed += 1
+            self.queue_seconds += queued
+            self.max_queue_seconds = max(self.max_queue_seconds, queued)
+            self.run_seconds += finished - started
+        if self.observe:
+            self.observe(operation, queued, finished - started)
+        return result
+
+    def hash(self, password: str) -> str:
+        return self._run('hash', _timed_hash, self.method, password)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run('verify', _timed_check, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """True when a stored hash was made with a different method or cost."""
+        return pwhash.split('$', 1)[0] != self.method
+
+    def record_rehash(self):
+        with self._lock:
+            self.rehashed += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'avg_queue_ms': round(self.queue_seconds * 1000 / max(1, self.completed), 2),
+                'max_queue_ms': round(self.max_queue_seconds * 1000, 2),
+                'avg_hash_ms': round(self.run_seconds * 1000 / max(1, self.completed), 2)
+            }
@@ -0,0 +1,175 @@
+import time
+import sqlite3
+import threading
+import logging
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MemoryWindowStore:
+    """
+    Per-key counts for the current and previous fixed window, in process
+    memory. Keys are kept in LRU order and the least recently used ones are
+    dropped beyond max_keys, so a flood of distinct IPs cannot exhaust memory.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def _shift(entry: Optional[Tuple[int, int, int]], window: int) -> Tuple[int, int]:
+        if entry is None:
+            return 0, 0
+        entry_window, previous, current = entry
+        if entry_window == window:
+            return previous, current
+        if entry_window == window - 1:
+            return current, 0
+        return 0, 0
+
+    def counts(self, key: str, window: int) -> Tuple[int, int]:
+        """(previous window, current window) counts for a key."""
+        with self._lock:
+            return self._shift(self._entries.get(key), window)
+
+    def increment(self, key: str, window: int):
+        with self._lock:
+            previous, current = self._shift(self._entries.pop(key, None), window)
+            self._entries[key] = (window, previous, current + 1)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'store': 'memory', 'keys': len(self._entries), 'max_keys': self.max_keys,
+                    'evictions': self.evictions}
+
+class SQLiteWindowStore:
+    """
+    Window counts in a local SQLite file shared by every worker process on
+    the host. Windows older than the previous one are pruned as they expire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pruned_window = None
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_windows ("
+                "key TEXT NOT NULL, window INTEGER NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (key, window)) WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def counts(self, key: str, window: int) -> Tuple[int, int]:
+        rows = dict(self._connection().execute(
+            "SELECT window, count FROM rate_windows WHERE key = ? AND window IN (?, ?)",
+            (key, window - 1, window)
+        ).fetchall())
+        return rows.get(window - 1, 0), rows.get(window, 0)
+
+    def increment(self, key: str, window: int):
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO rate_windows (key, window, count) VALUES (?, ?, 1) "
+            "ON CONFLICT (key, window) DO UPDATE SET count = count + 1",
+            (key, window)
+        )
+        if self._pruned_window != window:
+            self._pruned_window = window
+            connection.execute("DELETE FROM rate_windows WHERE window < ?", (window - 1,))
+
+    def stats(self) -> Dict:
+        keys = self._connection().execute("SELECT COUNT(DISTINCT key) FROM rate_windows").fetchone()[0]
+        return {'store': 'sqlite', 'path': self.path, 'keys': keys}
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: the estimate for the last `window` seconds is the
+    current fixed window's count plus the previous window's count weighted by
+    how much of it still overlaps. Two counters per key, O(1) per check.
+    """
+
+    def __init__(self, limit: int, window: float, store=None):
+        self.limit = limit
+        self.window = window
+        self.store = store or MemoryWindowStore()
+
+    def _position(self, now: Optional[float]) -> Tuple[int, float]:
+        now = time.time() if now is None else now
+        window = int(now // self.window)
+        return window, (now - window * self.window) / self.window
+
+    def retry_after(self, key: str, now: Optional[float] = None) -> float:
+        """Seconds until the key may try again; 0 when it is under the limit."""
+        window, elapsed = self._position(now)
+        previous, current = self.store.counts(key, window)
+        if previous * (1 - elapsed) + current < self.limit:
+            return 0.0
+        if current < self.limit:
+            # The previous window's weight decays below the remaining allowance within this window
+            return (1 - (self.limit - current) / previous - elapsed) * self.window
+        # Otherwise the current count becomes the previous window's and has to decay in turn
+        return (1 - elapsed) * self.window + (1 - self.limit / current) * self.window
+
+    def record(self, key: str, now: Optional[float] = None):
+        window, _ = self._position(now)
+        self.store.increment(key, window)
+
+class ThrottleCounter:
+    """
+    Counts rejected requests per minute in memory and hands them to
+    flush({minute_start: count}) every flush_interval seconds, so shedding a
+    flood costs no database write per request.
+    """
+
+    def __init__(self, flush: Callable[[Dict[datetime, int]], None], flush_interval: float = 5.0):
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.total = 0
+
+    def add(self, moment: Optional[datetime] = None):
+        moment = moment or datetime.utcnow()
+        with self._lock:
+            self._counts[moment.replace(second=0, microsecond=0)] += 1
+            self.total += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="throttle-counter", daemon=True)
+                self._thread.start()
+
+    def _flush_loop(self):
+        while not self._stopping.wait(self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return
+        try:
+            self.flush(dict(counts))
+        except Exception as e:
+            logger.error(f"Failed to record {sum(counts.values())} throttled login attempts: {str(e)}")
+
+    def stop(self):
+        self._stopping.set()
+        self._flush()
@@ -0,0 +1,59 @@
+import sys
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import app, db, LoginAttempt, attempt_archive, rebuild_rollups, truncate_to_bucket
+
+def parse_date(value):
+    """Parse YYYY-MM-DD or YYYY-MM-DDTHH into a datetime."""
+    for fmt in ('%Y-%m-%dT%H', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected YYYY-MM-DD or YYYY-MM-DDTHH")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill or reconcile login_attempt_rollup buckets from raw login_attempt rows."
+    )
+    parser.add_argument('--since', type=parse_date, help="Start of the range (default: oldest attempt)")
+    parser.add_argument('--until', type=parse_date, help="End of the range, exclusive (default: start of the current hour)")
+    parser.add_argument('--chunk-hours', type=int, default=24, help="Hours rebuilt per transaction (default: 24)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        since = args.since
+        if since is None:
+            oldest = db.session.query(func.min(LoginAttempt.timestamp)).scalar()
+            if oldest is None:
+                print("No login attempts found, nothing to rebuild")
+                return
+            since = oldest
+        since = truncate_to_bucket(since, 'hour')
+        until = truncate_to_bucket(args.until or datetime.utcnow(), 'hour')
+
+        if since >= until:
+            print("Empty range, nothing to rebuild")
+            sys.exit(1)
+
+        # Rebuild in short transactions so live inserts are never blocked for long
+        chunk = timedelta(hours=max(1, args.chunk_hours))
+        # Archived months are decompressed once for the whole range and bucketed per chunk
+        archived = defaultdict(Counter)
+        for key, count in attempt_archive.hourly_counts(since, until).items():
+            archived[since + (key[0] - since) // chunk * chunk][key] = count
+        start = since
+        total = 0
+        while start < until:
+            end = min(start + chunk, until)
+            count = rebuild_rollups(start, end, archived.pop(start, Counter()))
+            total += count
+            print(f"{datetime.now()}: Rebuilt {start:%Y-%m-%d %H:00} - {end:%Y-%m-%d %H:00} ({count} attempts)")
+            start = end
+
+        print(f"Rollups rebuilt for {total} attempts")
+
+if __name__ == "__main__":
+    main()
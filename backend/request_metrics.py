@@ -0,0 +1,277 @@
+import os
+import io
+import re
+import hmac
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class CounterMetric:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in the Prometheus exposition layout."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class MetricsRegistry:
+    """
+    Counters and histograms recorded in process, plus gauges read from
+    existing stats() dicts at scrape time, rendered as Prometheus text.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._gauges: List[Tuple[str, Callable[[], Dict]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> CounterMetric:
+        metric = CounterMetric(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, stats: Callable[[], Dict]):
+        """Expose every numeric value of stats() as a gauge named prefix_key."""
+        self._gauges.append((prefix, stats))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self._gauges:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"Could not collect {prefix} metrics: {str(e)}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+class _RequestStats:
+    __slots__ = ('start', 'status', 'queries', 'sql_seconds', 'statements', 'profiler')
+
+    def __init__(self, track_statements: bool):
+        self.start = time.perf_counter()
+        self.status = 500
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements: Optional[Counter] = Counter() if track_statements else None
+        self.profiler: Optional[cProfile.Profile] = None
+
+class RequestMetrics:
+    """
+    Flask and SQLAlchemy instrumentation: per-route latency, status and SQL
+    statement count/time per request, recorded into a MetricsRegistry.
+
+    SQL is counted through engine-wide cursor events and attributed to the
+    request running on the same thread; statements from background threads
+    are counted as 'background'. A request issuing more than query_warning
+    statements is logged with its most repeated statement, the usual sign of
+    an N+1 pattern. With profile_sample_rate > 0 that share of requests runs
+    under cProfile, and those slower than profile_slow_ms are saved to
+    profile_dir with their top functions logged.
+    """
+
+    def __init__(self, registry: MetricsRegistry, query_warning: int = 0, profile_sample_rate: float = 0.0,
+                 profile_slow_ms: float = 1000.0, profile_dir: str = 'profiles'):
+        self.registry = registry
+        self.query_warning = query_warning
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_dir = profile_dir
+        self._local = threading.local()
+        self.request_seconds = registry.histogram(
+            'http_request_duration_seconds', "Request latency by route", ('method', 'route'))
+        self.requests = registry.counter(
+            'http_requests_total', "Requests by route and status", ('method', 'route', 'status'))
+        self.request_queries = registry.histogram(
+            'http_request_sql_queries', "SQL statements per request", ('method', 'route'), QUERY_COUNT_BUCKETS)
+        self.request_sql_seconds = registry.histogram(
+            'http_request_sql_seconds', "SQL time per request", ('method', 'route'))
+        self.sql_queries = registry.counter(
+            'sql_queries_total', "SQL statements executed", ('context',))
+        self.sql_seconds = registry.counter(
+            'sql_seconds_total', "Time spent executing SQL statements", ('context',))
+        self.profiles = registry.counter(
+            'slow_request_profiles_total', "Slow sampled requests saved as profiles", ('route',))
+
+    def init_app(self, app):
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        stats = getattr(self._local, 'stats', None)
+        context_label = 'request' if stats is not None else 'background'
+        self.sql_queries.inc(context=context_label)
+        self.sql_seconds.inc(elapsed, context=context_label)
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += elapsed
+            if stats.statements is not None:
+                stats.statements[statement] += 1
+
+    def _before_request(self):
+        stats = _RequestStats(track_statements=self.query_warning > 0)
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+        self._local.stats = stats
+
+    def _after_request(self, response):
+        stats = getattr(self._local, 'stats', None)
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        stats = getattr(self._local, 'stats', None)
+        self._local.stats = None
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - stats.start
+        if stats.profiler is not None:
+            stats.profiler.disable()
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        self.request_seconds.observe(elapsed, method=method, route=route)
+        self.requests.inc(method=method, route=route, status=stats.status)
+        self.request_queries.observe(stats.queries, method=method, route=route)
+        self.request_sql_seconds.observe(stats.sql_seconds, method=method, route=route)
+
+        if self.query_warning and stats.queries > self.query_warning:
+            statement, repeats = stats.statements.most_common(1)[0]
+            logger.warning(
+                f"{method} {route} issued {stats.queries} SQL statements ({stats.sql_seconds * 1000:.1f} ms); "
+                f"most repeated ({repeats}x): {' '.join(statement.split())[:200]}"
+            )
+        if stats.profiler is not None and elapsed * 1000 >= self.profile_slow_ms:
+            self._save_profile(stats.profiler, method, route, elapsed)
+
+    def _save_profile(self, profiler: cProfile.Profile, method: str, route: str, elapsed: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^a-zA-Z0-9]+', '-', route).strip('-') or 'root'
+        path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{method}-{slug}.prof")
+        profiler.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(10)
+        self.profiles.inc(route=route)
+        logger.warning(f"Slow request {method} {route} took {elapsed * 1000:.0f} ms, profile saved to {path}\n"
+                       f"{summary.getvalue()}")
+
+def bearer_authorized(authorization: Optional[str], token: Optional[str]) -> bool:
+    """Whether a caller may use an operational endpoint: only with its token as bearer token, never when none is set."""
+    if not token:
+        return False
+    return hmac.compare_digest(authorization or '', f"Bearer {token}")
@@ -0,0 +1,130 @@
+"""
+Login attempt retention: archive expired months to gzip CSV and remove them.
+
+Each month older than the retention window is streamed to
+ATTEMPT_ARCHIVE_DIR/login_attempt-YYYY-MM.csv.gz, the archived row count is
+checked against the table, and then the month is removed. On MySQL this drops
+the month's partition, a metadata operation regardless of row count, and new
+monthly partitions are created ahead of time. Other databases fall back to
+deleting the month in chunks. Hourly rollups are kept, so dashboard totals
+still include archived attempts, and rebuild_rollups.py reads the archives.
+
+Re-running after an interruption is safe: rows already archived for a month
+(by id) are not archived again.
+
+Usage: python retention.py [--months N] [--archive-dir DIR] [--dry-run]
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, time
+from sqlalchemy import delete, func, select
+from app import app, db, LoginAttempt, attempt_archive
+from login_archive import ARCHIVE_FIELDS, LoginArchive
+import attempt_partitions
+from attempt_partitions import add_months, month_start
+
+DELETE_CHUNK = 5000
+EXPORT_YIELD_PER = 1000
+
+def month_bounds(month):
+    return datetime.combine(month, time()), datetime.combine(add_months(month, 1), time())
+
+def expired_months(connection, cutoff):
+    """Months before cutoff that still hold attempts, oldest first."""
+    partitions = attempt_partitions.partitioned_months(connection)
+    if partitions:
+        return [month for month in partitions if month < cutoff]
+    table = LoginAttempt.__table__
+    oldest = connection.execute(select(func.min(table.c.timestamp))).scalar()
+    months = []
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def archive_month(connection, archive, month):
+    """Stream the month's not yet archived rows into a new archive part; returns (archived, total)."""
+    table = LoginAttempt.__table__
+    start, end = month_bounds(month)
+    in_month = [table.c.timestamp >= start, table.c.timestamp < end]
+    archived_max_id = archive.max_id(month)
+    pending = list(in_month)
+    if archived_max_id is not None:
+        pending.append(table.c.id > archived_max_id)
+
+    expected = connection.execute(select(func.count()).select_from(table).where(*pending)).scalar()
+    rows = connection.execution_options(yield_per=EXPORT_YIELD_PER).execute(
+        select(*[table.c[name] for name in ARCHIVE_FIELDS]).where(*pending).order_by(table.c.id)
+    )
+    written = archive.write(month, rows)
+    if written != expected:
+        raise RuntimeError(f"Archived {written} rows for {month:%Y-%m} but expected {expected}")
+    total = connection.execute(select(func.count()).select_from(table).where(*in_month)).scalar()
+    return written, total
+
+def remove_month(connection, month, partitioned):
+    if partitioned:
+        attempt_partitions.drop_partition(connection, month)
+        connection.commit()
+        return
+    table = LoginAttempt.__table__
+    start, end = month_bounds(month)
+    # Core deletes skip the ORM rollup listeners: archived attempts keep their rollup counts
+    while True:
+        ids = connection.execute(
+            select(table.c.id).where(table.c.timestamp >= start, table.c.timestamp < end).limit(DELETE_CHUNK)
+        ).scalars().all()
+        if not ids:
+            break
+        connection.execute(delete(table).where(table.c.id.in_(ids)))
+        connection.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--months', type=int, default=int(os.getenv('ATTEMPT_RETENTION_MONTHS', 12)),
+                        help="Months of attempts kept in the database, including the current one (default: 12)")
+    parser.add_argument('--archive-dir', help="Archive directory (default: ATTEMPT_ARCHIVE_DIR or ./archive)")
+    parser.add_argument('--dry-run', action='store_true', help="Only list what would be archived")
+    args = parser.parse_args()
+    if args.months < 1:
+        parser.error("--months must be at least 1")
+
+    archive = LoginArchive(args.archive_dir) if args.archive_dir else attempt_archive
+    this_month = month_start(datetime.utcnow())
+    cutoff = add_months(this_month, -(args.months - 1))
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            partitioned = bool(attempt_partitions.partitioned_months(connection))
+            if partitioned and not args.dry_run:
+                added = attempt_partitions.add_partitions(
+                    connection, add_months(this_month, attempt_partitions.MONTHS_AHEAD)
+                )
+                connection.commit()
+                if added:
+                    print(f"Added partitions: {', '.join(attempt_partitions.partition_name(m) for m in added)}")
+
+            months = expired_months(connection, cutoff)
+            connection.commit()
+            if not months:
+                print(f"Nothing older than {cutoff:%Y-%m} to archive")
+                return
+
+            for month in months:
+                if args.dry_run:
+                    print(f"Would archive and remove {month:%Y-%m}")
+                    continue
+                try:
+                    written, total = archive_month(connection, archive, month)
+                    connection.commit()
+                except Exception as e:
+                    connection.rollback()
+                    print(f"Failed to archive {month:%Y-%m}, leaving it in place: {e}")
+                    sys.exit(1)
+                remove_month(connection, month, partitioned)
+                print(f"{month:%Y-%m}: archived {written} new rows ({total} in the month), removed from the database")
+
+if __name__ == "__main__":
+    main()
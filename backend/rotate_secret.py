@@ -6,6 +6,7 @@ import string
 from dotenv import load_dotenv
 from datetime import datetime
 import logging
+from jwt_keyring import previous_keys_needed
 
 # Configure logging
 logging.basicConfig(
@@ -14,43 +15,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ENV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '.env'))
+# Must match the app's JWT_ROTATION_MINUTES and JWT_TOKEN_LIFETIME_HOURS
+ROTATION_MINUTES = float(os.getenv('JWT_ROTATION_MINUTES', 3))
+TOKEN_LIFETIME_HOURS = float(os.getenv('JWT_TOKEN_LIFETIME_HOURS', 24))
+# Number of retired keys kept in SECRET_KEY_PREVIOUS so tokens stay valid until they expire
+PREVIOUS_KEYS = int(os.getenv('JWT_PREVIOUS_KEYS', 0)) or previous_keys_needed(
+    TOKEN_LIFETIME_HOURS * 3600, ROTATION_MINUTES * 60)
+
 def generate_secret_key(length=64):
     """Generate a cryptographically secure secret key."""
-    alphabet = string.ascii_letters + string.digits + string.punctuation
+    # URL-safe characters only: no quotes, '#' or ',' that would break .env parsing
+    alphabet = string.ascii_letters + string.digits + '-_'
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-def update_secret_key():
+def update_secret_key(env_path=ENV_PATH, previous_keys=PREVIOUS_KEYS):
     try:
         # Generate new secret key
         new_secret = generate_secret_key()
         
-        # Get the absolute path to .env file
-        env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '.env'))
         logger.info(f'Updating secret key in: {env_path}')
         
         # Read all lines from the file
         with open(env_path, 'r', encoding='utf-8') as file:
             lines = file.readlines()
         
-        # Flag to check if we found and updated the SECRET_KEY
-        updated = False
-        
-        # Update the SECRET_KEY line
-        for i, line in enumerate(lines):
+        # Find the current key and the already retired ones
+        current_secret = None
+        previous_secrets = []
+        for line in lines:
             if line.strip().startswith('SECRET_KEY='):
-                lines[i] = f'SECRET_KEY={new_secret}\n'
-                updated = True
-                break
-        
-        # If SECRET_KEY wasn't found, append it
-        if not updated:
-            lines.append(f'SECRET_KEY={new_secret}\n')
+                current_secret = line.strip()[len('SECRET_KEY='):]
+            elif line.strip().startswith('SECRET_KEY_PREVIOUS='):
+                previous_secrets = [key for key in line.strip()[len('SECRET_KEY_PREVIOUS='):].split(',') if key]
+
+        # Retire the current key, keeping the newest previous_keys
+        if current_secret:
+            previous_secrets.insert(0, current_secret)
+        previous_line = f'SECRET_KEY_PREVIOUS={",".join(previous_secrets[:previous_keys])}\n'
+
+        lines = [line for line in lines if not line.strip().startswith(('SECRET_KEY=', 'SECRET_KEY_PREVIOUS='))]
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        lines.append(f'SECRET_KEY={new_secret}\n')
+        lines.append(previous_line)
         
-        # Write back to env file
-        with open(env_path, 'w', encoding='utf-8') as file:
+        # Write to a temporary file and rename it over .env so readers never see a partial file
+        tmp_path = f'{env_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
             file.writelines(lines)
+        os.replace(tmp_path, env_path)
             
-        logger.info(f'Successfully updated secret key to: {new_secret}')
+        logger.info('Successfully updated secret key')
         
         logger.info(f'Secret key rotated successfully at {datetime.now()}')
     except Exception as e:
@@ -59,8 +75,8 @@ def update_secret_key():
 def main():
     logger.info('Starting secret key rotation service...')
     
-    # Schedule the job to run every 3 minutes
-    schedule.every(3).minutes.do(update_secret_key)
+    # Schedule the job to run every JWT_ROTATION_MINUTES
+    schedule.every(ROTATION_MINUTES).minutes.do(update_secret_key)
     
     # Run immediately on start
     update_secret_key()
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Offline stand-ins and fixtures shared with the benchmarks
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+# Tests that import app run it on an in-memory database, never the one in .env
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+@pytest.fixture(scope='session')
+def database():
+    """The app's tables, created once; background writers are flushed before they are dropped."""
+    from app import app, db, attempt_writer, enrichment_queue, throttle_counter
+    with app.app_context():
+        db.create_all()
+    yield db
+    attempt_writer.stop()
+    enrichment_queue.stop()
+    throttle_counter.stop()
+    with app.app_context():
+        db.drop_all()
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+
+@pytest.fixture(scope='module')
+def analytics_client(database):
+    from app import app, db, User, LoginAttempt, create_token
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', password='x', is_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        now = datetime.utcnow()
+        # Attempts spread over 40 days, so every range has closed rollup hours and raw rows
+        db.session.add_all(
+            LoginAttempt(user_id=admin.id, ip_address='198.51.100.7', timestamp=now - timedelta(hours=hours),
+                         success=hours % 3 == 0, country='Japan' if hours % 2 else None)
+            for hours in range(0, 40 * 24, 5)
+        )
+        db.session.commit()
+        token = create_token(admin.id)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    return client
+
+def count_statements(client, query_string):
+    """(response, SQL statements executed) for one uncached analytics request."""
+    from app import app, db, analytics_cache
+    analytics_cache.invalidate()
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/api/auth/analytics', query_string=query_string)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return response, len(statements)
+
+def test_statement_count_does_not_depend_on_range(analytics_client):
+    # Warm the identity cache so every measured request authenticates the same way
+    assert analytics_client.get('/api/auth/analytics').status_code == 200
+
+    counts = {}
+    for query_string in ({'range': '24h'}, {'range': '7d'}, {'range': '30d', 'bucket': 'day'}):
+        response, counts[query_string['range']] = count_statements(analytics_client, query_string)
+        assert response.status_code == 200
+        assert response.headers['X-Cache'] == 'MISS'
+        assert len(response.get_json()['hourly_attempts']) > 1
+
+    assert len(set(counts.values())) == 1, counts
+    assert counts['24h'] <= 5
+
+def test_hour_labels_carry_the_date_past_24_hours(analytics_client):
+    day = analytics_client.get('/api/auth/analytics', query_string={'range': '24h'}).get_json()['hourly_attempts']
+    week = analytics_client.get('/api/auth/analytics', query_string={'range': '7d'}).get_json()['hourly_attempts']
+    assert len(day[-1]['hour']) == len('23:00')
+    # Each hour of day appears seven times in a week, so the label must say which day
+    assert len({item['hour'] for item in week}) == len(week)
+    assert week[-1]['hour'] == f"{week[-1]['bucket_start'][5:10]} {week[-1]['bucket_start'][11:13]}:00"
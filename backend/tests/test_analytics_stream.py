@@ -0,0 +1,61 @@
+from datetime import datetime
+import pytest
+
+STREAM_HEADERS = {'Accept': 'text/event-stream'}
+
+@pytest.fixture(scope='module')
+def admin_token(database):
+    from app import app, db, User, create_token
+    with app.app_context():
+        admin = User(username='stream-admin', email='stream-admin@example.com', password='x', is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        return create_token(admin.id)
+
+@pytest.fixture
+def client(database):
+    from app import app
+    return app.test_client()
+
+def open_stream(client, query_string):
+    response = client.get('/api/auth/analytics/stream', query_string=query_string, headers=STREAM_HEADERS)
+    response.close()
+    return response.status_code
+
+def test_stream_opens_with_a_ticket_only(client, admin_token):
+    response = client.post('/api/auth/analytics/stream/ticket', headers={'Authorization': f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    ticket = response.get_json()['ticket']
+
+    assert open_stream(client, {'ticket': ticket}) == 200
+    # The session JWT never goes in the URL, under either parameter
+    assert open_stream(client, {'access_token': admin_token}) == 401
+    assert open_stream(client, {'ticket': admin_token}) == 401
+    # A ticket is not a session token
+    assert client.get('/api/auth/analytics', headers={'Authorization': f"Bearer {ticket}"}).status_code == 401
+
+def test_enrichment_and_throttled_counts_are_published(database):
+    from app import app, event_publisher, write_enrichment_updates, write_throttled_counts
+    subscription = event_publisher.subscribe()
+    try:
+        with app.app_context():
+            write_enrichment_updates([], {})
+        write_throttled_counts({datetime(2024, 1, 2, 3, 4): 7})
+        with app.app_context():
+            write_enrichment_updates([{
+                'attempt_id': 12345, 'location': 'Osaka, Japan', 'latitude': 34.69, 'longitude': 135.5,
+                'geo_cell': None, 'accuracy_radius': None, 'city': 'Osaka', 'country': 'Japan', 'timezone': None,
+                'isp': '', 'connection_type': None, 'device_info': 'Desktop', 'browser_info': None,
+                'anomaly_score': None
+            }], {})
+
+        throttled = subscription.get(timeout=1)
+        assert throttled.type == 'throttled'
+        assert throttled.data == {'counts': [{'bucket_start': '2024-01-02T03:04:00', 'count': 7}]}
+        enrichment = subscription.get(timeout=1)
+        assert enrichment.type == 'enrichment'
+        assert enrichment.data['attempts'] == [{
+            'id': 12345, 'location': 'Osaka, Japan', 'device_info': 'Desktop', 'latitude': 34.69, 'longitude': 135.5
+        }]
+    finally:
+        event_publisher.unsubscribe(subscription)
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from fake_ip_api import FakeIPAPIServer
+
+@pytest.fixture
+def ip_api(tmp_path, monkeypatch):
+    server = FakeIPAPIServer().start()
+    # No MaxMind database, so every lookup goes to the stand-in
+    monkeypatch.setenv('GEOIP_DB_PATH', str(tmp_path / 'missing.mmdb'))
+    monkeypatch.setenv('IP_API_URL', server.url_template)
+    monkeypatch.setenv('IP_API_BATCH_URL', server.batch_url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def lookup_many(service, ip_addresses):
+    async def run():
+        try:
+            return await service.lookup_many(ip_addresses)
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+def test_failed_batch_is_none_and_not_cached(ip_api):
+    from async_geolocation import AsyncGeolocationService
+    service = AsyncGeolocationService(hedge_delay=0, rate_limit_retries=0)
+    ip_api.rate_limit, ip_api.rate_window = 0, 0.2
+    results = lookup_many(service, ['10.0.0.1', '10.0.0.2'])
+    assert results == {'10.0.0.1': None, '10.0.0.2': None}
+    assert service.stats()['failed_batches'] == 1
+
+    ip_api.rate_limit = None
+    results = lookup_many(service, ['10.0.0.1', '10.0.0.2'])
+    assert all(info and info['country'] != 'Unknown' for info in results.values())
+
+def test_rate_limit_is_waited_out(ip_api):
+    from async_geolocation import AsyncGeolocationService
+    ip_api.rate_limit, ip_api.rate_window = 2, 0.3
+    service = AsyncGeolocationService(max_concurrency=2, batch_size=1, hedge_delay=0)
+    ips = [f"10.0.1.{i}" for i in range(6)]
+    results = lookup_many(service, ips)
+    assert all(results[ip_address] is not None for ip_address in ips)
+    assert service.stats()['failed_batches'] == 0
+
+def test_no_hedging_when_rate_limit_is_nearly_spent(ip_api):
+    from async_geolocation import AsyncGeolocationService
+    ip_api.rate_limit = 3
+    service = AsyncGeolocationService(max_concurrency=2, hedge_delay=0.01)
+    lookup_many(service, ['10.0.2.1'])
+    assert service.stats()['rate_limit_remaining'] == 2
+
+    ip_api.latency = 0.2
+    assert lookup_many(service, ['10.0.2.2'])['10.0.2.2'] is not None
+    assert service.stats()['hedged'] == 0
+    assert ip_api.rate_limited == 0
@@ -0,0 +1,58 @@
+import threading
+from attempt_writer import BufferedAttemptWriter
+
+class FlakyWriter:
+    """write_batch that raises for the first `failures` calls, then stores the rows."""
+
+    def __init__(self, failures=1, bad_ip=None):
+        self.failures = failures
+        self.bad_ip = bad_ip
+        self.rows = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, rows):
+        with self._lock:
+            self.calls += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("Deadlock found when trying to get lock")
+            if any(row['ip_address'] == self.bad_ip for row in rows):
+                raise ValueError("Data too long for column")
+            self.rows.extend(rows)
+
+def make_rows(count):
+    return [{'user_id': i, 'ip_address': f"198.51.100.{i}", 'success': False} for i in range(count)]
+
+def test_batch_survives_a_single_failure():
+    store = FlakyWriter(failures=1)
+    writer = BufferedAttemptWriter(store, batch_size=50, flush_interval=0.05, retry_backoff=0.01)
+    for row in make_rows(50):
+        writer.submit(row)
+    writer.stop()
+
+    assert sorted(row['user_id'] for row in store.rows) == list(range(50))
+    stats = writer.stats()
+    assert stats['written'] == 50
+    assert stats['failed'] == 0
+    assert stats['retries'] == 1
+
+def test_synchronous_write_is_retried():
+    store = FlakyWriter(failures=1)
+    writer = BufferedAttemptWriter(store, max_pending=0, retry_backoff=0.01)
+    assert writer.submit(make_rows(1)[0]) is False
+    assert len(store.rows) == 1
+    assert writer.stats()['failed'] == 0
+
+def test_only_bad_rows_are_dropped_after_retries():
+    store = FlakyWriter(failures=0, bad_ip='198.51.100.3')
+    writer = BufferedAttemptWriter(store, batch_size=10, flush_interval=0.05, max_retries=2, retry_backoff=0.01)
+    for row in make_rows(10):
+        writer.submit(row)
+    writer.stop()
+
+    assert sorted(row['user_id'] for row in store.rows) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    stats = writer.stats()
+    assert stats['written'] == 9
+    assert stats['failed'] == 1
+    assert stats['retries'] == 2
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime
+import pytest
+
+class StubLookup:
+    """lookup_many stand-in whose failed IPs map to None, like a failed ip-api batch."""
+    def __init__(self, failed_ips):
+        self.failed_ips = set(failed_ips)
+
+    async def lookup_many(self, ips):
+        return {
+            ip: None if ip in self.failed_ips else
+            {'city': 'Osaka', 'country': 'Japan', 'latitude': 34.69, 'longitude': 135.5}
+            for ip in ips
+        }
+
+@pytest.fixture
+def attempt_ids(database):
+    from app import app, db, User, LoginAttempt
+    ips = ['192.0.2.1', '192.0.2.2', '192.0.2.3', '192.0.2.2', '192.0.2.4']
+    with app.app_context():
+        user = User(username='backfill', email='backfill@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        user_id = user.id
+        attempts = [LoginAttempt(user_id=user_id, ip_address=ip, timestamp=datetime.utcnow(), success=False)
+                    for ip in ips]
+        db.session.add_all(attempts)
+        db.session.commit()
+        ids = [attempt.id for attempt in attempts]
+    yield ids
+    with app.app_context():
+        LoginAttempt.query.filter(LoginAttempt.id.in_(ids)).delete(synchronize_session=False)
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+def test_failed_lookups_are_not_written_or_checkpointed_past(attempt_ids):
+    from app import app, db, LoginAttempt
+    from backfill_geolocation import backfill_chunk
+    loop = asyncio.new_event_loop()
+    try:
+        with app.app_context():
+            scanned, updated, unique_ips, failed, next_last_id = backfill_chunk(
+                loop, StubLookup({'192.0.2.2'}), attempt_ids[0] - 1, attempt_ids[-1], 100
+            )
+            latitudes = dict(db.session.query(LoginAttempt.id, LoginAttempt.latitude).filter(
+                LoginAttempt.id.in_(attempt_ids)
+            ).all())
+    finally:
+        loop.close()
+
+    assert (scanned, updated, unique_ips, failed) == (1, 3, 4, 1)
+    # The checkpoint stops before the first row of the failed IP
+    assert next_last_id == attempt_ids[0]
+    assert latitudes[attempt_ids[1]] is None and latitudes[attempt_ids[3]] is None
+    assert latitudes[attempt_ids[0]] == latitudes[attempt_ids[2]] == latitudes[attempt_ids[4]] == 34.69
+
+def test_checkpoint_advances_when_every_lookup_succeeds(attempt_ids):
+    from app import app
+    from backfill_geolocation import backfill_chunk
+    loop = asyncio.new_event_loop()
+    try:
+        with app.app_context():
+            scanned, updated, _, failed, next_last_id = backfill_chunk(
+                loop, StubLookup(()), attempt_ids[0] - 1, attempt_ids[-1], 100
+            )
+    finally:
+        loop.close()
+
+    assert (scanned, updated, failed) == (5, 5, 0)
+    assert next_last_id == attempt_ids[-1]
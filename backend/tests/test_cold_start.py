@@ -0,0 +1,12 @@
+import os
+import bench_cold_start
+
+def test_startup_does_not_import_lazy_modules(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'cold_start.db'}")
+    env.setdefault('SECRET_KEY', 'cold-start-test')
+    bench_cold_start.prepare_database(env)
+
+    # A fresh interpreter, as a new serverless instance or worker starts
+    result = bench_cold_start.run_trial(env, eager=False)
+    assert result['lazy_modules_loaded'] == []
+    assert result['status'] == 401
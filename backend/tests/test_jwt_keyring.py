@@ -0,0 +1,60 @@
+import jwt
+from jwt_keyring import JWTKeyring, previous_keys_needed
+import rotate_secret
+
+def test_token_verifies_for_its_whole_lifetime(tmp_path):
+    env_path = str(tmp_path / '.env')
+    with open(env_path, 'w') as f:
+        f.write("SECRET_KEY=initial-secret-key-long-enough-for-hs256\n")
+    # Default schedule: a 24 hour token and a rotation every 3 minutes
+    rotations = 24 * 60 // 3
+    previous_keys = previous_keys_needed(24 * 3600, 3 * 60)
+    keyring = JWTKeyring(env_path, max_previous=previous_keys, check_interval=0)
+
+    kid, secret = keyring.signing_key()
+    token = jwt.encode({'user_id': 1}, secret, algorithm='HS256', headers={'kid': kid})
+    for _ in range(rotations):
+        rotate_secret.update_secret_key(env_path, previous_keys)
+    assert keyring.signing_key()[0] != kid
+    assert jwt.decode(token, keyring.verification_key(kid), algorithms=['HS256'])['user_id'] == 1
+
+    # Once every key from its lifetime has been rotated out, the token's key is gone
+    rotate_secret.update_secret_key(env_path, previous_keys)
+    rotate_secret.update_secret_key(env_path, previous_keys)
+    assert keyring.verification_key(kid) is None
+
+def test_previous_keys_needed():
+    assert previous_keys_needed(24 * 3600, 3 * 60) == 481
+    assert previous_keys_needed(3600, 7 * 24 * 3600) == 2
+
+def write_keys(env_path, current, previous):
+    with open(env_path, 'w') as f:
+        f.write(f"SECRET_KEY={current}\nSECRET_KEY_PREVIOUS={','.join(previous)}\n")
+
+def test_garbage_kidless_token_tries_at_most_two_keys(tmp_path, monkeypatch):
+    import app
+    env_path = str(tmp_path / '.env')
+    previous = [f"retired-secret-{n:03d}-long-enough-for-hs256" for n in range(481)]
+    write_keys(env_path, 'current-secret-key-long-enough-for-hs256', previous)
+    keyring = JWTKeyring(env_path, max_previous=481, check_interval=0, legacy_window=3600)
+    monkeypatch.setattr(app, 'keyring', keyring)
+    decodes = []
+    real_decode = jwt.decode
+    def counting_decode(*args, **kwargs):
+        decodes.append(args)
+        return real_decode(*args, **kwargs)
+    monkeypatch.setattr(app.jwt, 'decode', counting_decode)
+
+    garbage = jwt.encode({'user_id': 1}, 'attacker-chosen-secret-long-enough-hs256', algorithm='HS256')
+    assert app.verify_token(garbage) is None
+    assert len(decodes) <= 2
+
+    # A legacy token signed with the newest retired key still verifies in the window
+    legacy = jwt.encode({'user_id': 1}, previous[0], algorithm='HS256')
+    assert app.verify_token(legacy)['user_id'] == 1
+
+def test_kidless_tokens_rejected_after_legacy_window(tmp_path):
+    env_path = str(tmp_path / '.env')
+    write_keys(env_path, 'current-secret-key-long-enough-for-hs256', ['retired-secret-long-enough-for-hs256'])
+    assert len(JWTKeyring(env_path, legacy_window=3600).legacy_verification_keys()) == 2
+    assert JWTKeyring(env_path, legacy_window=0).legacy_verification_keys() == []
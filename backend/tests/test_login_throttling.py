@@ -0,0 +1,37 @@
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+@pytest.fixture(scope='module')
+def client(database):
+    from app import app
+    return app.test_client()
+
+def failed_logins(client, remote_addr, forwarded_for):
+    """Status codes of failed logins, each for a new email and with its own X-Forwarded-For."""
+    from app import login_ip_limiter
+    statuses = []
+    for i in range(login_ip_limiter.limit + 1):
+        response = client.post('/api/auth/login', json={'email': f"{remote_addr}-{i}@example.com", 'password': 'x'},
+                               headers={'X-Forwarded-For': forwarded_for(i)},
+                               environ_base={'REMOTE_ADDR': remote_addr})
+        statuses.append(response.status_code)
+    return statuses
+
+def test_spoofed_forwarded_for_does_not_reset_ip_limit(client):
+    statuses = failed_logins(client, '192.0.2.10', lambda i: f"203.0.113.{i}")
+    assert statuses[-1] == 429
+    assert set(statuses[:-1]) == {401}
+
+def test_trusted_proxy_hop_is_the_client(client):
+    from app import app
+    wsgi_app = app.wsgi_app
+    app.wsgi_app = ProxyFix(wsgi_app, x_for=1)
+    try:
+        # The proxy appends the address it saw; entries left of it are client-supplied
+        statuses = failed_logins(client, '10.0.0.1', lambda i: f"203.0.113.{i}, 198.51.100.20")
+        assert statuses[-1] == 429
+        # A different client behind the same proxy is not throttled
+        other = failed_logins(client, '10.0.0.1', lambda i: "198.51.100.21")
+        assert other[0] == 401
+    finally:
+        app.wsgi_app = wsgi_app
@@ -0,0 +1,30 @@
+import pytest
+
+@pytest.fixture
+def client(database):
+    from app import app
+    return app.test_client()
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    assert client.get('/metrics').status_code == 403
+
+def test_metrics_require_bearer_token(client, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape-token')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert b'http_requests_total' in response.data
+
+def test_geoip_reload_refused_without_token(client, monkeypatch):
+    from app import geo_service
+    reloads = []
+    monkeypatch.setattr(geo_service.geoip_reader, 'reload', lambda: reloads.append(True))
+    monkeypatch.delenv('GEOIP_RELOAD_TOKEN', raising=False)
+    assert client.post('/api/geolocation/reload').status_code == 403
+
+    monkeypatch.setenv('GEOIP_RELOAD_TOKEN', 'reload-token')
+    assert client.post('/api/geolocation/reload').status_code == 401
+    assert client.post('/api/geolocation/reload', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert reloads == []
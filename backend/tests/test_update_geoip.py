@@ -0,0 +1,93 @@
+import io
+import os
+import hashlib
+import tarfile
+import pytest
+import requests
+from fake_maxmind import FakeMaxMindServer, build_archive
+from geoip_reader import SharedGeoIPReader
+import update_geoip
+
+FIRST_BUILD = 1700000000
+SECOND_BUILD = 1700600000
+
+@pytest.fixture(scope='module')
+def archives():
+    return build_archive(build_epoch=FIRST_BUILD), build_archive(build_epoch=SECOND_BUILD)
+
+@pytest.fixture
+def server(archives):
+    server = FakeMaxMindServer(archives[0]).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def db_path(tmp_path, server):
+    """A database installed from the first release."""
+    path = str(tmp_path / 'GeoLite2-City.mmdb')
+    assert update_geoip.update_database(path, server.url)
+    return path
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def test_fresh_install_leaves_no_temporary_files(tmp_path, db_path):
+    assert sorted(os.listdir(tmp_path)) == ['GeoLite2-City.mmdb', 'GeoLite2-City.mmdb.update.json']
+    reader = SharedGeoIPReader(db_path)
+    assert reader.stats()['build_epoch'] is None
+    reader.get_reader()
+    assert reader.stats()['build_epoch'] == FIRST_BUILD
+
+def test_unchanged_release_is_not_downloaded(server, db_path):
+    requests_before = server.archive_requests
+    assert not update_geoip.update_database(db_path, server.url)
+    assert server.archive_requests == requests_before
+
+def test_dropped_download_resumes(archives, server, db_path):
+    second = archives[1]
+    server.set_archive(second)
+    server.drop_after = len(second) // 2
+    with pytest.raises(requests.RequestException):
+        update_geoip.update_database(db_path, server.url)
+    assert os.path.exists(f"{db_path}.tar.gz.part")
+
+    sent_before = server.bytes_sent
+    assert update_geoip.update_database(db_path, server.url)
+    assert server.bytes_sent - sent_before < len(second)
+    assert not os.path.exists(f"{db_path}.tar.gz.part")
+
+def test_notified_reader_swaps_to_new_release(archives, server, db_path):
+    # A running worker only re-checks the file when notified
+    reader = SharedGeoIPReader(db_path, check_interval=3600)
+    reader.get_reader()
+    server.on_notify = lambda payload: (reader.reload(), reader.get_reader())
+    server.set_archive(archives[1])
+
+    assert update_geoip.update_database(db_path, server.url, [server.notify_url])
+    assert len(server.notifications) == 1
+    assert server.notifications[0]['path'] == os.path.abspath(db_path)
+    assert reader.stats()['build_epoch'] == SECOND_BUILD
+
+def test_checksum_mismatch_keeps_live_database(archives, server, db_path):
+    live_digest = file_digest(db_path)
+    server.set_archive(archives[1], checksum='0' * 64)
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        update_geoip.update_database(db_path, server.url)
+    assert file_digest(db_path) == live_digest
+    assert not os.path.exists(f"{db_path}.tar.gz.part")
+
+def test_unreadable_database_is_not_installed(tmp_path, server, db_path):
+    live_digest = file_digest(db_path)
+    broken = io.BytesIO()
+    with tarfile.open(fileobj=broken, mode='w:gz') as tar:
+        data = b'not a database'
+        info = tarfile.TarInfo('GeoLite2-City_20240101/GeoLite2-City.mmdb')
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    server.set_archive(broken.getvalue())
+    with pytest.raises(Exception):
+        update_geoip.update_database(db_path, server.url)
+    assert file_digest(db_path) == live_digest
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
@@ -1,70 +1,225 @@
+"""
+GeoLite2 City database updater.
+
+The archive is streamed to GEOIP_DB_PATH.tar.gz.part in chunks, never held
+in memory, and an interrupted download resumes with a Range request on the
+next run. It is checked against MaxMind's published SHA-256 before anything
+is extracted. The .mmdb member is extracted to a temporary file next to the
+database, opened once to make sure it is readable, and renamed over the
+live file in one step, so workers never see a partial file: they keep the
+old one mapped and switch on their next check (GEOIP_RELOAD_INTERVAL), or
+at once when notified through --notify.
+
+Nothing is downloaded when the published checksum matches the installed
+database. The checksum, download validator and install time are kept in
+GEOIP_DB_PATH.update.json.
+
+Usage: python update_geoip.py [--schedule] [--force] [--notify URL ...]
+"""
 import os
 import sys
-import requests
-import tarfile
-import schedule
+import json
 import time
+import shutil
+import hashlib
+import tarfile
+import argparse
+import tempfile
 from datetime import datetime
+from typing import Dict, Iterable, Optional
+import requests
+import schedule
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def download_geoip_database():
-    """Download the GeoLite2 City database."""
-    license_key = os.getenv('MAXMIND_LICENSE_KEY')
-    db_path = os.getenv('GEOIP_DB_PATH', 'GeoLite2-City.mmdb')
-    
-    if not license_key:
-        print("Error: MAXMIND_LICENSE_KEY not set in environment")
-        sys.exit(1)
+DEFAULT_DOWNLOAD_URL = ("https://download.maxmind.com/app/geoip_download"
+                        "?edition_id=GeoLite2-City&license_key={license_key}&suffix=tar.gz")
+CHUNK_SIZE = 64 * 1024
+# (connect, read) seconds; the read timeout applies between chunks, not to the whole download
+REQUEST_TIMEOUT = (10, 60)
 
-    url = f"https://download.maxmind.com/app/geoip_download?edition_id=GeoLite2-City&license_key={license_key}&suffix=tar.gz"
-    
+def log(message):
+    print(f"{datetime.now()}: {message}", flush=True)
+
+def load_state(path: str) -> Dict:
     try:
-        print(f"{datetime.now()}: Downloading GeoLite2 City database...")
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            # Save the tar.gz file
-            with open('GeoLite2-City.tar.gz', 'wb') as f:
-                f.write(response.content)
-            
-            # Extract the database file
-            with tarfile.open('GeoLite2-City.tar.gz', 'r:gz') as tar:
-                for member in tar.getmembers():
-                    if member.name.endswith('.mmdb'):
-                        # Rename the file while extracting
-                        member.name = db_path
-                        tar.extract(member)
-            
-            # Clean up
-            os.remove('GeoLite2-City.tar.gz')
-            print(f"{datetime.now()}: Successfully updated GeoLite2 City database")
-            return True
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(path: str, state: Dict):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+def fetch_checksum(session: requests.Session, url: str) -> str:
+    """Published SHA-256 of the archive ('<hex>  <file name>')."""
+    response = session.get(f"{url}.sha256", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    checksum = response.text.split()[0].lower() if response.text.strip() else ''
+    if len(checksum) != 64:
+        raise ValueError(f"Unexpected checksum response: {response.text[:100]!r}")
+    return checksum
+
+def download_archive(session: requests.Session, url: str, part_path: str, state: Dict, state_path: str) -> str:
+    """
+    Stream the archive into part_path, resuming a previous partial download
+    when the server still has the same file (If-Range). Returns its SHA-256.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {}
+    if offset and state.get('partial_validator'):
+        headers = {'Range': f"bytes={offset}-", 'If-Range': state['partial_validator']}
+
+    digest = hashlib.sha256()
+    with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if headers and response.status_code in (206, 416):
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            if response.status_code == 416:
+                # The previous run got the whole file but stopped before installing it
+                return digest.hexdigest()
+            mode = 'ab'
+            log(f"Resuming download at {offset} bytes")
         else:
-            print(f"Error downloading database: HTTP {response.status_code}")
-            return False
-            
+            response.raise_for_status()
+            mode = 'wb'
+            offset = 0
+        # Recorded before the body so an interrupted download can be resumed
+        state['partial_validator'] = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        save_state(state_path, state)
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                offset += len(chunk)
+    log(f"Downloaded {offset} bytes")
+    return digest.hexdigest()
+
+def extract_database(archive_path: str, db_path: str) -> str:
+    """Extract the .mmdb member next to db_path, check that it opens, and return the temp path."""
+    import maxminddb
+    directory = os.path.dirname(os.path.abspath(db_path))
+    with tarfile.open(archive_path, 'r:gz') as tar:
+        member = next((m for m in tar if m.isfile() and m.name.endswith('.mmdb')), None)
+        if member is None:
+            raise ValueError("No .mmdb file in the archive")
+        temp = tempfile.NamedTemporaryFile(dir=directory, prefix=f".{os.path.basename(db_path)}.",
+                                           suffix='.tmp', delete=False)
+        try:
+            with temp:
+                shutil.copyfileobj(tar.extractfile(member), temp, CHUNK_SIZE)
+                temp.flush()
+                os.fsync(temp.fileno())
+            reader = maxminddb.open_database(temp.name)
+            database_type = reader.metadata().database_type
+            reader.close()
+            if 'City' not in database_type:
+                raise ValueError(f"Expected a City database, got {database_type}")
+        except Exception:
+            os.remove(temp.name)
+            raise
+    return temp.name
+
+def notify_workers(session: requests.Session, urls: Iterable[str], payload: Dict):
+    """POST the new database version to each worker's reload endpoint; failures are only logged."""
+    token = os.getenv('GEOIP_RELOAD_TOKEN')
+    if not token:
+        log("GEOIP_RELOAD_TOKEN is not set, workers will refuse the reload")
+    headers = {'Authorization': f"Bearer {token}"} if token else {}
+    for url in urls:
+        try:
+            response = session.post(url, json=payload, headers=headers, timeout=5)
+            response.raise_for_status()
+            log(f"Notified {url}")
+        except Exception as e:
+            log(f"Could not notify {url}: {e}")
+
+def update_database(db_path: str, url: str, notify_urls: Iterable[str] = (), force: bool = False,
+                    session: Optional[requests.Session] = None) -> bool:
+    """Install the published database if it changed; returns whether a new file was installed."""
+    session = session or requests.Session()
+    state_path = f"{db_path}.update.json"
+    part_path = f"{db_path}.tar.gz.part"
+    state = load_state(state_path)
+
+    checksum = fetch_checksum(session, url)
+    if not force and checksum == state.get('sha256') and os.path.exists(db_path):
+        log("GeoIP database is up to date")
+        return False
+    if state.get('partial_sha256') != checksum and os.path.exists(part_path):
+        # A newer release replaced the one being downloaded
+        os.remove(part_path)
+    state['partial_sha256'] = checksum
+
+    downloaded = download_archive(session, url, part_path, state, state_path)
+    if downloaded != checksum:
+        os.remove(part_path)
+        state.pop('partial_validator', None)
+        save_state(state_path, state)
+        raise ValueError(f"Checksum mismatch: expected {checksum}, got {downloaded}")
+
+    temp_path = extract_database(part_path, db_path)
+    os.replace(temp_path, db_path)
+    os.remove(part_path)
+    state = {'sha256': checksum, 'installed_at': datetime.utcnow().isoformat()}
+    save_state(state_path, state)
+    log(f"Installed new GeoIP database at {db_path}")
+    notify_workers(session, notify_urls, {'path': os.path.abspath(db_path), 'sha256': checksum})
+    return True
+
+def download_url() -> str:
+    url = os.getenv('GEOIP_DOWNLOAD_URL', DEFAULT_DOWNLOAD_URL)
+    if '{license_key}' in url:
+        license_key = os.getenv('MAXMIND_LICENSE_KEY')
+        if not license_key:
+            print("Error: MAXMIND_LICENSE_KEY not set in environment")
+            sys.exit(1)
+        url = url.format(license_key=license_key)
+    return url
+
+def download_geoip_database(notify_urls: Iterable[str] = (), force: bool = False) -> bool:
+    """Run one update; returns False when it failed."""
+    db_path = os.getenv('GEOIP_DB_PATH', 'GeoLite2-City.mmdb')
+    try:
+        update_database(db_path, download_url(), notify_urls, force)
+        return True
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"GeoIP update failed: {e}")
         return False
 
-def schedule_updates():
+def schedule_updates(notify_urls: Iterable[str] = ()):
     """Schedule weekly database updates."""
-    if download_geoip_database():
-        print("Initial database download successful")
+    if download_geoip_database(notify_urls):
+        print("Initial database check successful")
     else:
-        print("Initial database download failed")
-    
+        print("Initial database check failed")
+
     # Schedule weekly updates
-    schedule.every().wednesday.at("00:00").do(download_geoip_database)
-    
+    schedule.every().wednesday.at("00:00").do(download_geoip_database, notify_urls)
+
     while True:
         schedule.run_pending()
         time.sleep(3600)  # Check every hour
 
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--schedule', action='store_true', help="Check now and then every Wednesday")
+    parser.add_argument('--force', action='store_true', help="Download even if the checksum is unchanged")
+    parser.add_argument('--notify', action='append', default=[], metavar='URL',
+                        help="Worker reload endpoint to POST after an install, e.g. "
+                             "http://127.0.0.1:5000/api/geolocation/reload (repeatable)")
+    args = parser.parse_args()
+
+    if args.schedule:
+        schedule_updates(args.notify)
+    elif not download_geoip_database(args.notify, args.force):
+        sys.exit(1)
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "--schedule":
-        schedule_updates()
-    else:
-        download_geoip_database()
+    main()
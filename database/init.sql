@@ -14,10 +14,14 @@ CREATE TABLE IF NOT EXISTS user (
 );
 
 -- Create login_attempt table
+-- Existing databases are upgraded in place with: python backend/migrate.py
+-- migrate.py also converts this table to monthly partitions (see backend/retention.py)
 CREATE TABLE IF NOT EXISTS login_attempt (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
     ip_address VARCHAR(45) NOT NULL,
+    ip_bin VARBINARY(16),
+    user_agent VARCHAR(512),
     location VARCHAR(200),
     device_info VARCHAR(200),
     browser_info VARCHAR(200),
@@ -25,14 +29,36 @@ CREATE TABLE IF NOT EXISTS login_attempt (
     success BOOLEAN DEFAULT FALSE,
     latitude DECIMAL(10, 8),
     longitude DECIMAL(11, 8),
+    geo_cell BIGINT,
     accuracy_radius INT,
     city VARCHAR(100),
     country VARCHAR(100),
     timezone VARCHAR(50),
     isp VARCHAR(200),
     connection_type VARCHAR(50),
+    anomaly_score FLOAT,
     FOREIGN KEY (user_id) REFERENCES user(id),
-    INDEX idx_timestamp (timestamp),
-    INDEX idx_ip_address (ip_address),
-    INDEX idx_location (latitude, longitude)
+    INDEX idx_timestamp_success (timestamp, success, country),
+    INDEX idx_success_timestamp (success, timestamp),
+    INDEX idx_user_timestamp (user_id, timestamp),
+    INDEX idx_ip_country (ip_address, country),
+    INDEX idx_ip_bin (ip_bin),
+    INDEX idx_geo_cell (geo_cell, success, latitude, longitude)
+);
+
+-- Hourly login attempt counts, maintained by the backend on every insert.
+-- Rebuild or backfill with: python backend/rebuild_rollups.py
+CREATE TABLE IF NOT EXISTS login_attempt_rollup (
+    bucket_start DATETIME NOT NULL,
+    success BOOLEAN NOT NULL,
+    country VARCHAR(100) NOT NULL DEFAULT '',
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, success, country)
+);
+
+-- Per-minute counts of logins rejected by the failed-login rate limiter
+CREATE TABLE IF NOT EXISTS login_throttle_rollup (
+    bucket_start DATETIME NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start)
 );
@@ -14,6 +14,7 @@ interface User {
 
 const AdminDashboard: React.FC = () => {
   const [users, setUsers] = useState<User[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [error, setError] = useState<string>('');
   const [newAdmin, setNewAdmin] = useState({
     username: '',
@@ -26,10 +27,11 @@ const AdminDashboard: React.FC = () => {
     fetchUsers();
   }, []);
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor: string | null = null) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('http://localhost:5000/api/admin/users', {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`http://localhost:5000/api/admin/users${query}`, {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
@@ -44,7 +46,8 @@ const AdminDashboard: React.FC = () => {
       }
 
       const data = await response.json();
-      setUsers(data.users);
+      setUsers(previous => cursor ? [...previous, ...data.users] : data.users);
+      setNextCursor(data.next_cursor);
     } catch (err) {
       setError('Failed to load users');
       console.error(err);
@@ -143,6 +146,9 @@ const AdminDashboard: React.FC = () => {
             ))}
           </tbody>
         </table>
+        {nextCursor && (
+          <button type="button" onClick={() => fetchUsers(nextCursor)}>Load more</button>
+        )}
       </div>
 
       <div className="admin-section">
@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import React, { useState, useEffect, useRef } from 'react';
+import { MapContainer, TileLayer, CircleMarker, Popup, useMapEvents } from 'react-leaflet';
 import { Line } from 'react-chartjs-2';
 import {
   Chart as ChartJS,
@@ -26,6 +26,7 @@ ChartJS.register(
 );
 
 interface LoginAttempt {
+  id: number;
   ip_address: string;
   timestamp: string;
   success: boolean;
@@ -46,26 +47,228 @@ interface Analytics {
   total_attempts: number;
   successful_attempts: number;
   failed_attempts: number;
+  throttled_attempts: number;
   recent_attempts: LoginAttempt[];
   hourly_attempts: {
     hour: string;
+    bucket_start: string;
     successful: number;
     failed: number;
+    throttled: number;
   }[];
 }
 
+const RANGE_OPTIONS: { value: string; label: string; bucket: string }[] = [
+  { value: '24h', label: 'Last 24 hours', bucket: 'hour' },
+  { value: '7d', label: 'Last 7 days', bucket: 'hour' },
+  { value: '30d', label: 'Last 30 days', bucket: 'day' },
+];
+
+interface AttemptEnrichment {
+  id: number;
+  location: string;
+  device_info: string;
+  latitude: number | null;
+  longitude: number | null;
+}
+
+interface ThrottledCount {
+  bucket_start: string;
+  count: number;
+}
+
+const API_URL = 'http://localhost:5000';
+const FALLBACK_POLL_INTERVAL = 30000;
+const STREAM_RECONNECT_DELAY = 5000;
+
+// Start of the bucket containing a naive UTC ISO timestamp, matching the API's bucket_start
+const bucketStart = (timestamp: string, bucket: string): string => {
+  if (bucket === 'minute') return `${timestamp.slice(0, 16)}:00`;
+  if (bucket === 'day') return `${timestamp.slice(0, 10)}T00:00:00`;
+  return `${timestamp.slice(0, 13)}:00:00`;
+};
+
+// Apply a streamed attempt to the current analytics; null means a full reload is needed
+const applyAttempt = (current: Analytics, attempt: LoginAttempt, bucket: string): Analytics | null => {
+  const start = bucketStart(attempt.timestamp, bucket);
+  const series = current.hourly_attempts;
+  if (series.length && start > series[series.length - 1].bucket_start) {
+    return null;
+  }
+
+  return {
+    ...current,
+    total_attempts: current.total_attempts + 1,
+    successful_attempts: current.successful_attempts + (attempt.success ? 1 : 0),
+    failed_attempts: current.failed_attempts + (attempt.success ? 0 : 1),
+    recent_attempts: [attempt, ...current.recent_attempts].slice(0, 10),
+    hourly_attempts: series.map((item) => (
+      item.bucket_start === start
+        ? {
+            ...item,
+            successful: item.successful + (attempt.success ? 1 : 0),
+            failed: item.failed + (attempt.success ? 0 : 1),
+          }
+        : item
+    )),
+  };
+};
+
+// Fill in the location of attempts already shown once they have been enriched
+const applyEnrichment = (current: Analytics, enriched: AttemptEnrichment[]): Analytics => {
+  const byId = new Map<number, AttemptEnrichment>(enriched.map((item) => [item.id, item]));
+  if (!current.recent_attempts.some((attempt) => byId.has(attempt.id))) {
+    return current;
+  }
+  return {
+    ...current,
+    recent_attempts: current.recent_attempts.map((attempt) => {
+      const update = byId.get(attempt.id);
+      return update
+        ? {
+            ...attempt,
+            location: update.location,
+            device_info: update.device_info,
+            latitude: update.latitude ?? 0,
+            longitude: update.longitude ?? 0,
+          }
+        : attempt;
+    }),
+  };
+};
+
+// Add streamed per-minute throttled counts; null means a full reload is needed
+const applyThrottled = (current: Analytics, counts: ThrottledCount[], bucket: string): Analytics | null => {
+  const series = current.hourly_attempts;
+  const added = new Map<string, number>();
+  for (const item of counts) {
+    const start = bucketStart(item.bucket_start, bucket);
+    if (series.length && start > series[series.length - 1].bucket_start) {
+      return null;
+    }
+    added.set(start, (added.get(start) || 0) + item.count);
+  }
+
+  return {
+    ...current,
+    throttled_attempts: current.throttled_attempts + counts.reduce((sum, item) => sum + item.count, 0),
+    hourly_attempts: series.map((item) => (
+      added.has(item.bucket_start)
+        ? { ...item, throttled: item.throttled + (added.get(item.bucket_start) || 0) }
+        : item
+    )),
+  };
+};
+
+interface GeoCluster {
+  lat: number;
+  lng: number;
+  successful: number;
+  failed: number;
+}
+
+interface GeoClusters {
+  zoom: number;
+  world: boolean;
+  clusters: GeoCluster[];
+}
+
+// Server-side aggregated attempt counts for the visible map, refetched as it moves
+const ClusterLayer: React.FC = () => {
+  const [data, setData] = useState<GeoClusters | null>(null);
+  const dataRef = useRef<GeoClusters | null>(null);
+
+  const fetchClusters = async (zoom: number, bbox: string) => {
+    const current = dataRef.current;
+    // Whole-world responses already cover every pan at the same zoom
+    if (current && current.world && current.zoom === zoom) {
+      return;
+    }
+    try {
+      const params = new URLSearchParams({ zoom: String(zoom), bbox });
+      const response = await fetch(`${API_URL}/api/auth/analytics/clusters?${params}`, {
+        headers: {
+          'Authorization': `Bearer ${localStorage.getItem('token')}`,
+        },
+        credentials: 'include',
+      });
+      if (!response.ok) {
+        throw new Error('Failed to fetch map clusters');
+      }
+      const clusters: GeoClusters = await response.json();
+      dataRef.current = clusters;
+      setData(clusters);
+    } catch (err) {
+      console.error('Error fetching map clusters:', err);
+    }
+  };
+
+  const map = useMapEvents({
+    moveend: () => fetchClusters(map.getZoom(), map.getBounds().toBBoxString()),
+  });
+
+  useEffect(() => {
+    fetchClusters(map.getZoom(), map.getBounds().toBBoxString());
+  }, [map]);
+
+  if (!data) {
+    return null;
+  }
+  const largest = Math.max(1, ...data.clusters.map((cluster) => cluster.successful + cluster.failed));
+
+  return (
+    <>
+      {data.clusters.map((cluster) => {
+        const total = cluster.successful + cluster.failed;
+        return (
+          <CircleMarker
+            key={`${cluster.lat},${cluster.lng}`}
+            center={[cluster.lat, cluster.lng]}
+            radius={5 + 20 * Math.sqrt(total / largest)}
+            pathOptions={{
+              color: cluster.failed > cluster.successful ? 'rgb(255, 99, 132)' : 'rgb(75, 192, 192)',
+              fillOpacity: 0.5,
+            }}
+          >
+            <Popup>
+              <div>
+                <strong>Attempts:</strong> {total}<br />
+                <strong>Successful:</strong> {cluster.successful}<br />
+                <strong>Failed:</strong> {cluster.failed}
+              </div>
+            </Popup>
+          </CircleMarker>
+        );
+      })}
+    </>
+  );
+};
+
 const Analytics: React.FC = () => {
   const [analytics, setAnalytics] = useState<Analytics | null>(null);
   const [error, setError] = useState<string>('');
-  const [selectedMarker, setSelectedMarker] = useState<LoginAttempt | null>(null);
   const [mapCenter, setMapCenter] = useState<[number, number]>([0, 0]);
   const [mapZoom, setMapZoom] = useState(2);
+  const [range, setRange] = useState(RANGE_OPTIONS[0]);
+  const analyticsRef = useRef<Analytics | null>(null);
 
   useEffect(() => {
+    let cancelled = false;
+    let fallbackInterval: ReturnType<typeof setInterval> | null = null;
+    let reconnectTimeout: ReturnType<typeof setTimeout> | null = null;
+    let source: EventSource | null = null;
+    let lastEventId = '';
+    const token = localStorage.getItem('token');
+
+    const updateAnalytics = (data: Analytics) => {
+      analyticsRef.current = data;
+      setAnalytics(data);
+    };
+
     const fetchAnalytics = async () => {
       try {
-        const token = localStorage.getItem('token');
-        const response = await fetch('http://localhost:5000/api/auth/analytics', {
+        const params = new URLSearchParams({ range: range.value, bucket: range.bucket });
+        const response = await fetch(`${API_URL}/api/auth/analytics?${params}`, {
           headers: {
             'Authorization': `Bearer ${token}`,
           },
@@ -77,7 +280,10 @@ const Analytics: React.FC = () => {
         }
 
         const data: Analytics = await response.json();
-        setAnalytics(data);
+        if (cancelled) {
+          return;
+        }
+        updateAnalytics(data);
         const recentWithCoords = data.recent_attempts.find(
           (attempt: LoginAttempt) => attempt.latitude && attempt.longitude
         );
@@ -93,9 +299,96 @@ const Analytics: React.FC = () => {
     };
 
     fetchAnalytics();
-    const interval = setInterval(fetchAnalytics, 30000);
-    return () => clearInterval(interval);
-  }, []);
+
+    const startPolling = () => {
+      if (!fallbackInterval) {
+        fallbackInterval = setInterval(fetchAnalytics, FALLBACK_POLL_INTERVAL);
+      }
+    };
+
+    // Apply a streamed event through one of the apply* helpers, reloading when it returns null
+    const handle = <T,>(apply: (current: Analytics, payload: T) => Analytics | null) => (event: Event) => {
+      const message = event as MessageEvent;
+      lastEventId = message.lastEventId || lastEventId;
+      const current = analyticsRef.current;
+      if (!current) {
+        return;
+      }
+      const next = apply(current, JSON.parse(message.data));
+      if (next) {
+        updateAnalytics(next);
+      } else {
+        fetchAnalytics();
+      }
+    };
+
+    // The session token never goes in the stream URL, which ends up in access logs:
+    // each connection uses a short-lived ticket, and resumes after the last event seen
+    const openStream = async () => {
+      let ticket: string;
+      try {
+        const response = await fetch(`${API_URL}/api/auth/analytics/stream/ticket`, {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${token}`,
+          },
+          credentials: 'include',
+        });
+        if (!response.ok) {
+          throw new Error('Failed to get a stream ticket');
+        }
+        ticket = (await response.json()).ticket;
+      } catch (err) {
+        console.error('Error opening analytics stream:', err);
+        startPolling();
+        return;
+      }
+      if (cancelled) {
+        return;
+      }
+
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) {
+        params.set('last_event_id', lastEventId);
+      }
+      const stream = new EventSource(`${API_URL}/api/auth/analytics/stream?${params}`);
+      source = stream;
+      stream.addEventListener('attempt', handle<LoginAttempt>(
+        (current, attempt) => applyAttempt(current, attempt, range.bucket)
+      ));
+      stream.addEventListener('enrichment', handle<{ attempts: AttemptEnrichment[] }>(
+        (current, payload) => applyEnrichment(current, payload.attempts)
+      ));
+      stream.addEventListener('throttled', handle<{ counts: ThrottledCount[] }>(
+        (current, payload) => applyThrottled(current, payload.counts, range.bucket)
+      ));
+      stream.addEventListener('reset', (event) => {
+        lastEventId = (event as MessageEvent).lastEventId || lastEventId;
+        fetchAnalytics();
+      });
+      stream.onerror = () => {
+        // The browser's own reconnect reuses the expired ticket, so reopen with a fresh one
+        if (stream.readyState === EventSource.CLOSED && !cancelled) {
+          reconnectTimeout = setTimeout(openStream, STREAM_RECONNECT_DELAY);
+        }
+      };
+    };
+
+    openStream();
+
+    return () => {
+      cancelled = true;
+      if (source) {
+        source.close();
+      }
+      if (reconnectTimeout) {
+        clearTimeout(reconnectTimeout);
+      }
+      if (fallbackInterval) {
+        clearInterval(fallbackInterval);
+      }
+    };
+  }, [range]);
 
   if (error) {
     return <div className="error-message">{error}</div>;
@@ -158,9 +451,21 @@ const Analytics: React.FC = () => {
           <h3>Failed Attempts</h3>
           <p>{analytics.failed_attempts}</p>
         </div>
+        <div className="stat-card">
+          <h3>Throttled Attempts</h3>
+          <p>{analytics.throttled_attempts}</p>
+        </div>
       </div>
 
       <div className="chart-container">
+        <select
+          value={range.value}
+          onChange={(e) => setRange(RANGE_OPTIONS.find((option) => option.value === e.target.value) || RANGE_OPTIONS[0])}
+        >
+          {RANGE_OPTIONS.map((option) => (
+            <option key={option.value} value={option.value}>{option.label}</option>
+          ))}
+        </select>
         <Line data={chartData} options={chartOptions} />
       </div>
 
@@ -174,26 +479,7 @@ const Analytics: React.FC = () => {
             url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
             attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
           />
-          {analytics.recent_attempts.map((attempt, index) => (
-            attempt.latitude && attempt.longitude ? (
-              <Marker
-                key={index}
-                position={[attempt.latitude, attempt.longitude]}
-                eventHandlers={{
-                  click: () => setSelectedMarker(attempt),
-                }}
-              >
-                <Popup>
-                  <div>
-                    <strong>IP:</strong> {attempt.ip_address}<br />
-                    <strong>Time:</strong> {new Date(attempt.timestamp).toLocaleString()}<br />
-                    <strong>Status:</strong> {attempt.success ? 'Success' : 'Failed'}<br />
-                    <strong>Device:</strong> {attempt.device_info}
-                  </div>
-                </Popup>
-              </Marker>
-            ) : null
-          ))}
+          <ClusterLayer />
         </MapContainer>
       </div>
 